@@ -2,27 +2,72 @@ from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import Config
+from database import ensure_indexes
 from routes.auth_routes import auth_bp
 from routes.income_routes import income_bp
 from routes.expense_routes import expense_bp
 from routes.dashboard_routes import dashboard_bp
+from routes.export_routes import export_bp
+from routes.transaction_routes import transactions_bp
+from routes.sync_routes import sync_bp
+from routes.recurring_routes import recurring_bp
+from routes.budget_routes import budget_bp
+from routes.report_routes import report_bp
+from commands import register_commands
+from services import metrics, compression
+from services.serialization import OrjsonProvider
+from services.cache import summary_cache
+from services.hashing import hasher
+from services.profiles import profile_cache
+from services.reports import report_runner
+from services.fx import rates
 
 app = Flask(__name__)
 app.config.from_object(Config)
+# orjson encodes ObjectIds and datetimes without per-field conversion
+app.json = OrjsonProvider(app)
 
 # Initialize extensions
 CORS(app)
 jwt = JWTManager(app)
 
+# Per-route latency, response size and MongoDB command metrics at /metrics
+metrics.init_app(app, slow_request_ms=Config.SLOW_REQUEST_MS)
+metrics.registry.add_source('summary_cache', summary_cache.stats,
+                            counters=('hits', 'misses', 'evictions', 'expirations'))
+metrics.registry.add_source('password_hashing', hasher.stats,
+                            counters=('completed', 'rejected', 'timed_out', 'restarts'))
+metrics.registry.add_source('profile_cache', profile_cache.stats,
+                            counters=('hits', 'misses', 'stateless', 'db_reads_saved', 'evictions', 'expirations'))
+metrics.registry.add_source('reports', report_runner.stats,
+                            counters=('submitted', 'completed', 'failed', 'restarts'))
+metrics.registry.add_source('fx_rates', rates.stats, counters=('loads',))
+
+# Registered after metrics so /metrics sizes count the bytes actually sent
+if Config.COMPRESS_RESPONSES:
+    compression.init_app(app, min_size=Config.COMPRESS_MIN_SIZE, level=Config.COMPRESS_LEVEL,
+                         quality=Config.COMPRESS_BROTLI_QUALITY)
+
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(income_bp, url_prefix='/api/income')
 app.register_blueprint(expense_bp, url_prefix='/api/expense')
 app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+app.register_blueprint(export_bp, url_prefix='/api/export')
+app.register_blueprint(transactions_bp, url_prefix='/api/transactions')
+app.register_blueprint(sync_bp, url_prefix='/api/sync')
+app.register_blueprint(recurring_bp, url_prefix='/api/recurring')
+app.register_blueprint(budget_bp, url_prefix='/api/budgets')
+app.register_blueprint(report_bp, url_prefix='/api/reports')
+
+# Maintenance commands (flask --app app <command>)
+register_commands(app)
 
 @app.route('/')
 def home():
     return {'message': 'Finance Tracker API is running'}
 
 if __name__ == '__main__':
+    # Production deployments run `flask --app app indexes ensure` once per release instead
+    ensure_indexes()
     app.run(debug=True, port=5000)
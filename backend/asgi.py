@@ -0,0 +1,9 @@
+"""ASGI entry point: async handlers on the Motor driver.
+
+    hypercorn asgi:app --bind 0.0.0.0:5000 --workers 2
+
+app.py remains the WSGI/dev-server entry point and serves the same API.
+"""
+from async_app import create_app
+
+app = create_app()
@@ -0,0 +1,35 @@
+from quart import Quart
+from quart_cors import cors
+from config import Config
+from async_app import database
+from async_app.auth_routes import auth_bp
+from async_app.transaction_routes import income_bp, expense_bp
+from async_app.dashboard_routes import dashboard_bp
+
+
+def create_app():
+    """ASGI counterpart of app.py serving the same auth, income, expense and
+    dashboard routes with async handlers on the Motor driver."""
+    app = Quart(__name__)
+    app.config.from_object(Config)
+    app = cors(app, allow_origin='*')
+
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(income_bp, url_prefix='/api/income')
+    app.register_blueprint(expense_bp, url_prefix='/api/expense')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+
+    # Motor clients are bound to an event loop, so connect once serving starts
+    @app.before_serving
+    async def connect():
+        database.init_client()
+
+    @app.after_serving
+    async def disconnect():
+        database.close_client()
+
+    @app.route('/')
+    async def home():
+        return {'message': 'Finance Tracker API is running (async)'}
+
+    return app
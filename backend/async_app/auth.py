@@ -0,0 +1,60 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+import jwt
+from quart import g, request, jsonify
+from config import Config
+
+# Tokens match what flask_jwt_extended issues, so either serving mode accepts them
+ALGORITHM = 'HS256'
+
+
+def create_access_token(identity, additional_claims=None):
+    now = datetime.now(timezone.utc)
+    claims = {
+        **(additional_claims or {}),
+        'fresh': False,
+        'iat': now,
+        'jti': str(uuid.uuid4()),
+        'type': 'access',
+        'sub': identity,
+        'nbf': now,
+        'exp': now + timedelta(seconds=Config.JWT_ACCESS_TOKEN_EXPIRES)
+    }
+    return jwt.encode(claims, Config.JWT_SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token):
+    claims = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[ALGORITHM])
+    if claims.get('type') != 'access':
+        raise jwt.InvalidTokenError('Only access tokens are allowed')
+    return claims
+
+
+def jwt_required():
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            header = request.headers.get('Authorization', '')
+            if not header:
+                return jsonify({'msg': 'Missing Authorization Header'}), 401
+            scheme, _, token = header.partition(' ')
+            if scheme != 'Bearer' or not token:
+                return jsonify({'msg': "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}), 422
+            try:
+                g.jwt_claims = decode_token(token)
+            except jwt.ExpiredSignatureError:
+                return jsonify({'msg': 'Token has expired'}), 401
+            except jwt.InvalidTokenError as e:
+                return jsonify({'msg': str(e)}), 422
+            return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_jwt_identity():
+    return g.jwt_claims['sub']
+
+
+def get_jwt():
+    return g.jwt_claims
@@ -0,0 +1,267 @@
+import asyncio
+import os
+from bson import ObjectId
+from quart import Blueprint, request, jsonify, send_from_directory, abort, current_app
+from async_app.auth import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from async_app.database import get_collection
+from models.user import User
+from services.hashing import HasherBusy, hasher
+from services.avatars import AVATAR_SIZES, AVATAR_DIGEST, DEFAULT_SIZE, avatar_filename
+from services.profiles import (PROFILE_PROJECTION, profile_cache, profile_claims, claims_profile, verify_mode,
+                               public_user, signup_profile, profile_update)
+from services.metrics import check_token
+from config import Config
+
+auth_bp = Blueprint('auth', __name__)
+
+UPLOAD_FOLDER = Config.UPLOAD_FOLDER
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+
+def users():
+    return get_collection('users')
+
+
+async def load_profile(user_id):
+    """Async twin of services.profiles.load_profile."""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        profile = await users().find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+        profile_cache.set(user_id, profile)
+    return profile
+
+
+def busy_response():
+    return jsonify({'error': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
+
+
+@auth_bp.route('/signup', methods=['POST'])
+async def signup():
+    try:
+        data = await request.get_json()
+        
+        if not all(key in data for key in ['email', 'password', 'name']):
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        if await users().find_one({'email': data['email']}, {'_id': 1}):
+            return jsonify({'error': 'Email already registered'}), 400
+        
+        # Image decoding is CPU-bound; keep it off the event loop
+        try:
+            profile = await asyncio.to_thread(signup_profile, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        hashed_password = await hasher.hash_async(data['password'])
+        user = User(data['email'], None, data['name'], profile['profile_picture'], profile['phone_number'],
+                    hashed_password=hashed_password, base_currency=profile['base_currency'])
+        result = await users().insert_one(user.to_dict())
+        
+        return jsonify({
+            'message': 'User created successfully. Please login to continue.',
+            'user_id': str(result.inserted_id)
+        }), 201
+        
+    except HasherBusy:
+        return busy_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/login', methods=['POST'])
+async def login():
+    try:
+        data = await request.get_json()
+        
+        if not all(key in data for key in ['email', 'password']):
+            return jsonify({'error': 'Missing email or password'}), 400
+        
+        user = await users().find_one({'email': data['email']})
+        
+        if not user:
+            return jsonify({'error': 'Invalid credentials'}), 401
+        
+        if not await hasher.verify_async(data['password'], user['password']):
+            return jsonify({'error': 'Invalid credentials'}), 401
+        
+        if hasher.needs_rehash(user['password']):
+            try:
+                await users().update_one(
+                    {'_id': user['_id'], 'password': user['password']},
+                    {'$set': {'password': await hasher.hash_async(data['password'])}}
+                )
+            except HasherBusy:
+                pass
+        
+        return jsonify({
+            'message': 'Login successful',
+            'token': create_access_token(str(user['_id']), profile_claims(user)),
+            'user': public_user(user, request.host_url)
+        }), 200
+        
+    except HasherBusy:
+        return busy_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/verify', methods=['GET'])
+@jwt_required()
+async def verify():
+    try:
+        user_id = get_jwt_identity()
+        
+        user = None
+        if verify_mode() == 'stateless':
+            user = claims_profile(user_id, get_jwt())
+            if user is not None:
+                profile_cache.answered_from_claims()
+        if user is None:
+            user = await load_profile(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        return jsonify({'user': public_user(user, request.host_url)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/forgot-password', methods=['POST'])
+async def forgot_password():
+    try:
+        data = await request.get_json()
+        
+        if 'email' not in data:
+            return jsonify({'error': 'Email is required'}), 400
+        
+        message = 'If an account exists with this email, password reset instructions have been sent.'
+        if not await users().find_one({'email': data['email']}, {'_id': 1}):
+            return jsonify({'message': message}), 200
+        
+        return jsonify({'message': message, 'user_found': True, 'email': data['email']}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/reset-password', methods=['POST'])
+async def reset_password():
+    try:
+        data = await request.get_json()
+        
+        if not all(key in data for key in ['email', 'new_password']):
+            return jsonify({'error': 'Email and new password are required'}), 400
+        
+        user = await users().find_one({'email': data['email']}, {'_id': 1})
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        await users().update_one(
+            {'email': data['email']},
+            {'$set': {'password': await hasher.hash_async(data['new_password'])}}
+        )
+        profile_cache.invalidate(user['_id'])
+        
+        return jsonify({'message': 'Password reset successfully'}), 200
+        
+    except HasherBusy:
+        return busy_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/update-profile', methods=['PUT'])
+@jwt_required()
+async def update_profile():
+    try:
+        user_id = get_jwt_identity()
+        data = await request.get_json()
+        
+        # Image decoding is CPU-bound; keep it off the event loop
+        try:
+            update_fields = await asyncio.to_thread(profile_update, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        result = await users().update_one({'_id': ObjectId(user_id)}, {'$set': update_fields})
+        
+        if result.modified_count == 0:
+            return jsonify({'error': 'No changes made'}), 400
+        
+        profile_cache.invalidate(user_id)
+        updated_user = await users().find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+        profile_cache.set(user_id, updated_user)
+        
+        return jsonify({
+            'message': 'Profile updated successfully',
+            'user': public_user(updated_user, request.host_url, details=True),
+            'token': create_access_token(user_id, profile_claims(updated_user))
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/change-password', methods=['PUT'])
+@jwt_required()
+async def change_password():
+    try:
+        user_id = get_jwt_identity()
+        data = await request.get_json()
+        
+        if not all(key in data for key in ['current_password', 'new_password']):
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        user = await users().find_one({'_id': ObjectId(user_id)}, {'password': 1})
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if not await hasher.verify_async(data['current_password'], user['password']):
+            return jsonify({'error': 'Current password is incorrect'}), 401
+        
+        await users().update_one(
+            {'_id': ObjectId(user_id)},
+            {'$set': {'password': await hasher.hash_async(data['new_password'])}}
+        )
+        profile_cache.invalidate(user_id)
+        
+        return jsonify({'message': 'Password changed successfully'}), 200
+        
+    except HasherBusy:
+        return busy_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@auth_bp.route('/avatar/<digest>', methods=['GET'])
+async def get_avatar(digest):
+    size = request.args.get('size', DEFAULT_SIZE)
+    if not AVATAR_DIGEST.match(digest) or size not in AVATAR_SIZES:
+        abort(404)
+    
+    response = await send_from_directory(UPLOAD_FOLDER, avatar_filename(digest, size))
+    response.cache_control.max_age = 31536000
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@auth_bp.route('/hashing-stats', methods=['GET'])
+async def get_hashing_stats():
+    # Process-wide stats, so they need the /metrics token rather than a login
+    denied = check_token(current_app.config, request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({'hashing': hasher.stats()}), 200
+
+
+@auth_bp.route('/cache-stats', methods=['GET'])
+async def get_profile_cache_stats():
+    # Process-wide stats, so they need the /metrics token rather than a login
+    denied = check_token(current_app.config, request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({'profile_cache': profile_cache.stats()}), 200
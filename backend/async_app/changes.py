@@ -0,0 +1,96 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from services.rollups import month_key
+from services.cache import VERSION_INCREMENT
+from services.changes import change_operations
+from services.sync import allocation, first_allocated, apply_stamps, tombstone_documents
+from services.budgets import COUNTER_PROJECTION, category_counters, category_status
+from services.archive import (MAX_RETRIES, bucket_key, bucket_write, archived_query, archived_projection,
+                              unpack, dropping)
+from async_app.database import get_collection
+from async_app.fx import user_converter
+
+
+async def record_changes(kind, user_id, removed=(), added=()):
+    """Async twin of services.changes.record_changes."""
+    for name, operations in change_operations(kind, user_id, removed, added):
+        await get_collection(name).bulk_write(operations, ordered=False)
+    await bump_summary_version(user_id)
+
+
+async def bump_summary_version(user_id):
+    """Async twin of summary_cache.bump."""
+    await get_collection('summary_versions').update_one({'_id': user_id}, VERSION_INCREMENT, upsert=True)
+
+
+async def allocate(user_id, count=1):
+    counter = await get_collection('sync_counters').find_one_and_update(
+        {'_id': user_id}, allocation(count),
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return first_allocated(counter, count)
+
+
+async def stamp(user_id, documents):
+    """Async twin of services.sync.stamp."""
+    if documents:
+        apply_stamps(documents, await allocate(user_id, len(documents)))
+    return documents
+
+
+async def record_deletes(kind, user_id, ids):
+    if ids:
+        first = await allocate(user_id, len(ids))
+        await get_collection('tombstones').insert_many(tombstone_documents(kind, user_id, ids, first))
+
+
+async def check_budget(user_id, document):
+    """Async twin of services.budgets.check_budget."""
+    budget = await get_collection('budgets').find_one(
+        {'user_id': user_id, 'category': document['category']}, {'amount': 1}
+    )
+    if budget is None:
+        return None
+    month = month_key(document['date'])
+    counters = await get_collection('monthly_rollups').find(
+        category_counters(user_id, month, document['category']), COUNTER_PROJECTION
+    ).to_list(None)
+    return category_status(document['category'], month, budget['amount'], counters,
+                           await user_converter(user_id))
+
+
+async def write_bucket(user_id, kind, month, merge):
+    """Async twin of services.archive.write_bucket."""
+    buckets = get_collection('transaction_buckets')
+    for _ in range(MAX_RETRIES):
+        write = bucket_write(await buckets.find_one(bucket_key(user_id, kind, month)), user_id, kind, month, merge)
+        if write is None:
+            return True
+        if write[0] == 'insert':
+            try:
+                await buckets.insert_one(write[1])
+                return True
+            except DuplicateKeyError:
+                continue
+        if write[0] == 'delete':
+            if (await buckets.delete_one(write[1])).deleted_count:
+                return True
+        elif (await buckets.replace_one(write[1], write[2])).matched_count:
+            return True
+    return False
+
+
+async def restore(user_id, kind, collection_name, doc_id):
+    """Async twin of services.archive.restore_archived."""
+    bucket = await get_collection('transaction_buckets').find_one(
+        archived_query(user_id, kind, doc_id), archived_projection(doc_id)
+    )
+    if bucket is None:
+        return False
+    try:
+        await get_collection(collection_name).insert_one(unpack(bucket['entries'][0], user_id))
+    except DuplicateKeyError:
+        pass
+    await write_bucket(user_id, kind, bucket['month'], dropping([doc_id]))
+    await bump_summary_version(user_id)
+    return True
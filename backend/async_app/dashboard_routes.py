@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from quart import Blueprint, request, jsonify, current_app
+from async_app.auth import jwt_required, get_jwt_identity
+from async_app.database import get_collection
+from services.summary import summary_pipeline, assemble_summary, BUCKET_PROJECTION, EMPTY_FACET
+from services.cache import summary_cache, version_of, VERSION_PROJECTION
+from services.serialization import dumps
+from services.rollups import month_range, build_trends, in_base_currency
+from services.analytics import analytics_pipeline, archived_pipeline, merge_groups, build_analytics
+from services.schedule import upcoming
+from services.metrics import check_token
+from async_app.fx import user_converter
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+
+async def summarize_collection(name, user_id, base):
+    result = await get_collection(name, for_reads=True).aggregate(summary_pipeline(user_id, base)).to_list(1)
+    return result[0] if result else dict(EMPTY_FACET)
+
+
+async def archived_buckets(user_id):
+    cursor = get_collection('transaction_buckets', for_reads=True).find({'user_id': user_id}, BUCKET_PROJECTION)
+    return await cursor.to_list(None)
+
+
+async def summary_version(user_id):
+    """Async twin of summary_cache.version."""
+    if summary_cache.backend is None:
+        return 0
+    return version_of(await get_collection('summary_versions').find_one({'_id': user_id}, VERSION_PROJECTION))
+
+
+@dashboard_bp.route('/summary', methods=['GET'])
+@jwt_required()
+async def get_summary():
+    try:
+        user_id = get_jwt_identity()
+        
+        convert = await user_converter(user_id)
+        base = convert.base
+        version = await summary_version(user_id)
+        cached = summary_cache.get(user_id, version, convert.key)
+        
+        if cached is None:
+            # The two collections are independent, so query them concurrently
+            income_facet, expense_facet, buckets = await asyncio.gather(
+                summarize_collection('incomes', user_id, base),
+                summarize_collection('expenses', user_id, base),
+                archived_buckets(user_id)
+            )
+            body = dumps(assemble_summary(income_facet, expense_facet, buckets, user_id, convert))
+            etag = hashlib.sha1(body).hexdigest()
+            summary_cache.set(user_id, version, etag, body, convert.key)
+        else:
+            etag, body = cached
+        
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return await response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/trends', methods=['GET'])
+@jwt_required()
+async def get_trends():
+    try:
+        user_id = get_jwt_identity()
+        
+        months = request.args.get('months', 12, type=int)
+        if months < 1 or months > 120:
+            return jsonify({'error': 'months must be between 1 and 120'}), 400
+        
+        window = month_range(months)
+        rows = await get_collection('monthly_rollups', for_reads=True).find({
+            'user_id': user_id,
+            'month': {'$gte': window[0], '$lte': window[-1]}
+        }).to_list(None)
+        convert = await user_converter(user_id)
+        rows, missing = in_base_currency(rows, convert)
+        
+        return jsonify({'trends': build_trends(rows, window), 'currency': convert.base,
+                        'missing_rates': missing}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/analytics', methods=['GET'])
+@jwt_required()
+async def get_analytics():
+    try:
+        user_id = get_jwt_identity()
+        
+        months = request.args.get('months', 12, type=int)
+        if months < 1 or months > 120:
+            return jsonify({'error': 'months must be between 1 and 120'}), 400
+        
+        buckets = get_collection('transaction_buckets', for_reads=True)
+        expenses, incomes, archived_expenses, archived_incomes = await asyncio.gather(
+            get_collection('expenses', for_reads=True).aggregate(analytics_pipeline(user_id)).to_list(None),
+            get_collection('incomes', for_reads=True).aggregate(analytics_pipeline(user_id)).to_list(None),
+            buckets.aggregate(archived_pipeline(user_id, 'expense')).to_list(None),
+            buckets.aggregate(archived_pipeline(user_id, 'income')).to_list(None)
+        )
+        expense_groups = merge_groups(expenses, archived_expenses)
+        income_groups = merge_groups(incomes, archived_incomes)
+        
+        convert = await user_converter(user_id)
+        analytics = build_analytics(expense_groups, income_groups, months, convert=convert)
+        analytics['currency'] = convert.base
+        
+        return jsonify(analytics), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/upcoming', methods=['GET'])
+@jwt_required()
+async def get_upcoming():
+    try:
+        user_id = get_jwt_identity()
+        
+        days = request.args.get('days', 30, type=int)
+        if days < 1 or days > 366:
+            return jsonify({'error': 'days must be between 1 and 366'}), 400
+        
+        through = datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(days=days)
+        rules = await get_collection('recurring_rules').find({
+            'user_id': user_id,
+            'active': True,
+            'next_date': {'$ne': None, '$lte': through}
+        }).to_list(None)
+        
+        convert = await user_converter(user_id)
+        return jsonify(upcoming(rules, through, convert)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/cache-stats', methods=['GET'])
+async def get_cache_stats():
+    # Process-wide stats, so they need the /metrics token rather than a login
+    denied = check_token(current_app.config, request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({'summary_cache': summary_cache.stats()}), 200
@@ -0,0 +1,27 @@
+from config import Config
+from database import client_options, read_preference
+
+_client = None
+
+
+def init_client():
+    global _client
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if _client is None:
+        _client = AsyncIOMotorClient(Config.MONGODB_URI, **client_options())
+    return _client
+
+
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_collection(name, for_reads=False):
+    collection = init_client()[Config.DATABASE_NAME][name]
+    if for_reads:
+        collection = collection.with_options(read_preference=read_preference())
+    return collection
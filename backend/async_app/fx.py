@@ -0,0 +1,21 @@
+from services.fx import rates, latest_version, VERSION_PROJECTION, VERSION_SORT
+from services.profiles import profile_currency
+from async_app.auth_routes import load_profile
+from async_app.database import get_collection
+
+
+async def rate_table():
+    """Async twin of services.fx.rates.table()."""
+    table = rates.fresh()
+    if table is not None:
+        return table
+    collection = get_collection('fx_rates')
+    version = latest_version(await collection.find_one({}, VERSION_PROJECTION, sort=VERSION_SORT))
+    documents = None
+    if rates.stale(version):
+        documents = await collection.find({}, {'dates': 1, 'rates': 1}).to_list(None)
+    return rates.install(version, documents)
+
+
+async def user_converter(user_id):
+    return (await rate_table()).converter(profile_currency(await load_profile(user_id)))
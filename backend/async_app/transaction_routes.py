@@ -0,0 +1,257 @@
+import asyncio
+import tempfile
+from bson import ObjectId
+from quart import Blueprint, Response, current_app, request, jsonify
+from async_app.auth import jwt_required, get_jwt_identity
+from async_app.changes import record_changes, stamp, record_deletes, check_budget, restore
+from async_app.database import get_collection
+from config import Config
+from services.transactions import build_create, build_update
+from services.bulk_import import detect_format
+from services.listing import STREAM_BATCH_SIZE, PageEncoder, parse_list_args, find_page, page_body
+from services.export import sort_key
+from services.archive import entry_filter, bucket_query, project
+
+# Bodies larger than this are spooled to disk while a bulk upload is read
+SPOOL_SIZE = 8 * 1024 * 1024
+
+
+async def stream_page(key, cursor, limit=None, fmt='rows'):
+    """Async version of services.listing.stream_page for Motor cursors."""
+    rows = cursor.__aiter__()
+    if fmt == 'columns':
+        try:
+            docs = await take(rows, limit + 1 if limit else None)
+        finally:
+            await cursor.close()
+        return Response(page_body(key, docs, limit), mimetype='application/json')
+    try:
+        head = await take(rows, STREAM_BATCH_SIZE)
+    except Exception:
+        await cursor.close()
+        raise
+
+    async def generate():
+        page = PageEncoder(key, limit)
+        yield page.start()
+        try:
+            async for doc in chain_rows(head, rows):
+                chunk = page.add(doc)
+                if chunk is None:
+                    break
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            current_app.logger.exception('Streaming %s failed', key)
+            yield page.end(error=e)
+            return
+        finally:
+            await cursor.close()
+        yield page.end()
+
+    return Response(generate(), mimetype='application/json')
+
+
+async def take(rows, count=None):
+    docs = []
+    while count is None or len(docs) < count:
+        doc = await next_row(rows)
+        if doc is None:
+            break
+        docs.append(doc)
+    return docs
+
+
+async def chain_rows(head, rows):
+    for doc in head:
+        yield doc
+    async for doc in rows:
+        yield doc
+
+
+class ArchiveMerge:
+    """Async twin of services.archive.with_archive over a Motor cursor."""
+
+    def __init__(self, cursor, user_id, kind, options):
+        self.cursor = cursor
+        self.buckets = get_collection('transaction_buckets', for_reads=True).find(
+            bucket_query(user_id, kind, options), {'entries': 1}
+        ).sort('start', -1).batch_size(1)
+        self.user_id = user_id
+        self.options = options
+
+    async def hot(self):
+        async for row in self.cursor:
+            yield row
+
+    async def archived(self):
+        matches = entry_filter(self.options)
+        async for bucket in self.buckets:
+            for entry in bucket['entries']:
+                if matches(entry):
+                    yield project(entry, self.user_id, self.options.get('fields'))
+
+    async def __aiter__(self):
+        hot, archived = self.hot(), self.archived()
+        row, entry = await next_row(hot), await next_row(archived)
+        while row is not None or entry is not None:
+            if entry is None or (row is not None and sort_key(row) > sort_key(entry)):
+                yield row
+                row = await next_row(hot)
+            else:
+                yield entry
+                entry = await next_row(archived)
+
+    async def close(self):
+        await self.cursor.close()
+        await self.buckets.close()
+
+
+async def next_row(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def create_blueprint(kind, collection_name, plural):
+    """Income and expense handlers only differ by kind and collection."""
+    bp = Blueprint(kind, __name__)
+    label = kind.capitalize()
+
+    @bp.route('/', methods=['POST'])
+    @jwt_required()
+    async def create():
+        try:
+            user_id = get_jwt_identity()
+            data = await request.get_json()
+            
+            document = build_create(kind, user_id, data)
+            await stamp(user_id, [document])
+            result = await get_collection(collection_name).insert_one(document)
+            await record_changes(kind, user_id, added=[document])
+            
+            body = {
+                'message': '%s created successfully' % label,
+                '%s_id' % kind: str(result.inserted_id)
+            }
+            if kind == 'expense':
+                body['budget'] = await check_budget(user_id, document)
+            return jsonify(body), 201
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @bp.route('/bulk', methods=['POST'])
+    @jwt_required()
+    async def bulk_create():
+        try:
+            user_id = get_jwt_identity()
+            
+            batch_size = request.args.get('batch_size', Config.BULK_IMPORT_BATCH_SIZE, type=int)
+            if batch_size < 1 or batch_size > Config.BULK_IMPORT_MAX_BATCH_SIZE:
+                return jsonify({'error': 'batch_size must be between 1 and %d'
+                                % Config.BULK_IMPORT_MAX_BATCH_SIZE}), 400
+            fmt = detect_format(request.args.get('format'), request.content_type)
+            
+            # Spool the raw body (to disk past SPOOL_SIZE), then reuse the sync
+            # import pipeline on a worker thread
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+            async for chunk in request.body:
+                spool.write(chunk)
+            spool.seek(0)
+            
+            import database
+            from services.bulk_import import import_transactions
+            with spool:
+                report = await asyncio.to_thread(
+                    import_transactions, spool, fmt, kind, user_id,
+                    getattr(database, '%s_collection' % collection_name), batch_size
+                )
+            
+            # A fatal error still reports the rows that went in before it
+            return jsonify(report.to_dict()), 500 if report.fatal else 200
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @bp.route('/', methods=['GET'])
+    @jwt_required()
+    async def list_all():
+        try:
+            user_id = get_jwt_identity()
+            options = parse_list_args(request.args)
+            
+            # Motor cursors share pymongo's find/sort/limit API
+            cursor = ArchiveMerge(find_page(get_collection(collection_name, for_reads=True), user_id, options),
+                                  user_id, kind, options)
+            
+            return await stream_page(plural, cursor, options['limit'], options['format'])
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @bp.route('/<item_id>', methods=['DELETE'])
+    @jwt_required()
+    async def delete(item_id):
+        try:
+            user_id = get_jwt_identity()
+            
+            query = {'_id': ObjectId(item_id), 'user_id': user_id}
+            deleted = await get_collection(collection_name).find_one_and_delete(query)
+            # Rows in archived months move back before they change
+            if deleted is None and await restore(user_id, kind, collection_name, query['_id']):
+                deleted = await get_collection(collection_name).find_one_and_delete(query)
+            
+            if deleted is None:
+                return jsonify({'error': '%s not found' % label}), 404
+            
+            await record_changes(kind, user_id, removed=[deleted])
+            await record_deletes(kind, user_id, [deleted['_id']])
+            
+            return jsonify({'message': '%s deleted successfully' % label}), 200
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @bp.route('/<item_id>', methods=['PUT'])
+    @jwt_required()
+    async def update(item_id):
+        try:
+            user_id = get_jwt_identity()
+            data = await request.get_json()
+            
+            update_data = build_update(data)
+            await stamp(user_id, [update_data])
+            query = {'_id': ObjectId(item_id), 'user_id': user_id}
+            previous = await get_collection(collection_name).find_one_and_update(query, {'$set': update_data})
+            if previous is None and await restore(user_id, kind, collection_name, query['_id']):
+                previous = await get_collection(collection_name).find_one_and_update(query, {'$set': update_data})
+            
+            if previous is None:
+                return jsonify({'error': '%s not found' % label}), 404
+            
+            updated = {**previous, **update_data}
+            await record_changes(kind, user_id, removed=[previous], added=[updated])
+            
+            body = {'message': '%s updated successfully' % label}
+            if kind == 'expense':
+                body['budget'] = await check_budget(user_id, updated)
+            return jsonify(body), 200
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    return bp
+
+
+income_bp = create_blueprint('income', 'incomes', 'incomes')
+expense_bp = create_blueprint('expense', 'expenses', 'expenses')
@@ -0,0 +1,65 @@
+"""Time the vectorized analytics against the 50 ms budget.
+
+By default the arrays are built in memory in the shape analytics_pipeline
+returns, so only the NumPy work is measured. With --mongo the rows are
+seeded into the scratch database and the aggregation is timed as well.
+
+Usage (from backend/):
+    python -m benchmarks.bench_analytics --rows 100000
+    python -m benchmarks.bench_analytics --rows 100000 --mongo
+"""
+import json
+
+from benchmarks.common import (base_parser, connect, seed_user, timed, generate_transactions,
+                               INCOME_CATEGORIES, EXPENSE_CATEGORIES)
+from models.income import Income
+from models.expense import Expense
+from services.analytics import analytics_pipeline, build_analytics
+
+TARGET_MS = 50
+
+
+def grouped(model, categories, rows):
+    # Same documents analytics_pipeline produces: one per category with parallel arrays
+    groups = {}
+    for doc in generate_transactions(model, 'bench-user', categories, rows):
+        group = groups.setdefault(doc['category'], {'_id': doc['category'], 'amounts': [], 'timestamps': []})
+        group['amounts'].append(doc['amount'])
+        group['timestamps'].append(int(doc['date'].timestamp() * 1000))
+    return list(groups.values())
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(rows=100000)
+    parser.add_argument('--mongo', action='store_true', help='Include the aggregation against MongoDB')
+    args = parser.parse_args()
+
+    expense_groups = grouped(Expense, EXPENSE_CATEGORIES, args.rows)
+    income_groups = grouped(Income, INCOME_CATEGORIES, args.rows // 10)
+    compute = timed(lambda: build_analytics(expense_groups, income_groups), args.repeat)
+    report = {
+        'expense_rows': args.rows,
+        'compute': compute,
+        'target_ms': TARGET_MS,
+        'within_target': compute['p50_ms'] < TARGET_MS,
+    }
+
+    if args.mongo:
+        client, db = connect(args)
+        user_id = 'bench-analytics-user'
+        seed_user(db, user_id, args.rows)
+        incomes, expenses = db['incomes'], db['expenses']
+
+        def end_to_end():
+            build_analytics(list(expenses.aggregate(analytics_pipeline(user_id))),
+                            list(incomes.aggregate(analytics_pipeline(user_id))))
+
+        report['end_to_end'] = timed(end_to_end, args.repeat)
+        client.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""End-to-end API benchmark with a synthetic data set and a regression gate.
+
+Seeds `--users` users with `--rows` incomes and `--rows` expenses each
+(built with the Income/Expense models), then drives the real Flask app,
+through its test client or over HTTP, for signup/login, CRUD, list and
+dashboard summary requests. Reports throughput, p50/p95/p99 latency and
+peak RSS per scenario as JSON.
+
+`--backend mongomock` runs everything in memory (pip install -r
+requirements-bench.txt); the default seeds a scratch database on a local
+mongod. The summary cache is off unless `--summary-cache` is given, so
+every summary reaches the database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_api --rows 10000 --output baseline.json
+    python -m benchmarks.bench_api --rows 10000 --compare baseline.json --tolerance 0.2
+    python -m benchmarks.bench_api --backend mongomock --rows 2000 --transport http --concurrency 8
+"""
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from itertools import count
+
+from benchmarks.common import (INCOME_CATEGORIES, EXPENSE_CATEGORIES, base_parser, generate_transactions,
+                               peak_rss_mb, percentiles, use_bench_database)
+
+SCENARIOS = ('signup', 'login', 'create', 'update', 'delete', 'list', 'summary')
+# bcrypt dominates these, so they get their own, smaller request count
+AUTH_SCENARIOS = ('signup', 'login')
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+BENCH_PASSWORD = 'bench-password'
+
+
+class ClientTransport:
+    """Requests through Flask's test client: no sockets, just the WSGI app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers)
+        data = response.get_data()
+        return response.status_code, json.loads(data) if data and response.is_json else None
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """Keep-alive HTTP/1.1 connections, one per client thread, to a local server."""
+
+    def __init__(self, app, port):
+        from werkzeug.serving import make_server
+
+        self.port = port
+        self.server = make_server('127.0.0.1', port, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        payload = json.dumps(body) if body is not None else None
+        try:
+            connection.request(method, path, payload, {'Content-Type': 'application/json', **(headers or {})})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            raise
+        is_json = response.getheader('Content-Type', '').startswith('application/json')
+        return response.status, json.loads(data) if data and is_json else None
+
+    def close(self):
+        self.server.shutdown()
+
+
+def use_backend(args):
+    """Configure the app before it is imported: database, cache and hashing."""
+    use_bench_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret-key-not-for-production')
+    os.environ['BCRYPT_ROUNDS'] = str(args.bcrypt_rounds)
+    if not args.summary_cache:
+        os.environ['SUMMARY_CACHE_BACKEND'] = 'none'
+    if args.backend == 'mongomock':
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit('--backend mongomock requires pip install -r requirements-bench.txt')
+        import database
+
+        # The client is created on first use, so nothing has connected yet
+        database.MongoClient = mongomock.MongoClient
+
+
+def seed(args):
+    """Users plus their transactions, written straight to the collections the app reads."""
+    from bson import ObjectId
+    from database import get_db, ensure_indexes
+    from models.income import Income
+    from models.expense import Expense
+    from models.user import User
+
+    db = get_db()
+    # A scratch database: start every run from the same state
+    db.client.drop_database(db.name)
+    ensure_indexes()
+
+    hashed = User.hash_password(BENCH_PASSWORD)
+    users = []
+    for index in range(args.users):
+        user = User('bench-%d@example.com' % index, None, 'Bench %d' % index, hashed_password=hashed).to_dict()
+        user['_id'] = ObjectId()
+        users.append(user)
+    db['users'].insert_many(users)
+
+    for index, user in enumerate(users):
+        user_id = str(user['_id'])
+        for collection, model, categories in ((db['incomes'], Income, INCOME_CATEGORIES),
+                                              (db['expenses'], Expense, EXPENSE_CATEGORIES)):
+            batch = []
+            for document in generate_transactions(model, user_id, categories, args.rows, seed=index):
+                batch.append(document)
+                if len(batch) >= args.batch_size:
+                    collection.insert_many(batch, ordered=False)
+                    batch = []
+            if batch:
+                collection.insert_many(batch, ordered=False)
+    return users[0]['email']
+
+
+def login(transport, email):
+    status, body = transport.request('POST', '/api/auth/login', {'email': email, 'password': BENCH_PASSWORD})
+    if status != 200:
+        raise RuntimeError('login failed: %s %s' % (status, body))
+    return {'Authorization': 'Bearer %s' % body['token']}
+
+
+def scenario_requests(name, state):
+    """A function building the n-th request of a scenario as (method, path, body)."""
+    run_id = state['run_id']
+    if name == 'signup':
+        return lambda n: ('POST', '/api/auth/signup',
+                          {'email': 'signup-%s-%d@example.com' % (run_id, n), 'password': BENCH_PASSWORD,
+                           'name': 'Signup %d' % n})
+    if name == 'login':
+        return lambda n: ('POST', '/api/auth/login', {'email': state['email'], 'password': BENCH_PASSWORD})
+    if name == 'create':
+        return lambda n: ('POST', '/api/expense/',
+                          {'title': 'Bench %d' % n, 'amount': 10 + n % 90, 'category': 'Food',
+                           'date': '2024-05-%02d' % (n % 28 + 1)})
+    if name == 'update':
+        return lambda n: ('PUT', '/api/expense/%s' % state['created'][n % len(state['created'])],
+                          {'amount': 20 + n % 50})
+    if name == 'delete':
+        return lambda n: ('DELETE', '/api/expense/%s' % state['created'][n], None)
+    if name == 'list':
+        return lambda n: ('GET', '/api/income/?limit=%d' % state['page_size'], None)
+    if name == 'summary':
+        return lambda n: ('GET', '/api/dashboard/summary', None)
+    raise ValueError('Unknown scenario %s' % name)
+
+
+def run_scenario(transport, name, state, requests, concurrency, headers):
+    build = scenario_requests(name, state)
+    numbers = count()
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    created = []
+
+    def client():
+        samples, failed = [], 0
+        while True:
+            with lock:
+                n = next(numbers)
+            if n >= requests:
+                break
+            method, path, body = build(n)
+            start = time.perf_counter()
+            try:
+                status, reply = transport.request(method, path, body, headers)
+            except (OSError, http.client.HTTPException):
+                status, reply = None, None
+            elapsed = (time.perf_counter() - start) * 1000
+            if status is not None and status < 400:
+                samples.append(elapsed)
+                if name == 'create':
+                    with lock:
+                        created.append(reply['expense_id'])
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(samples)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if name == 'create':
+        state['created'] = created
+    result = {'requests': requests, 'ok': len(latencies), 'errors': errors[0], 'seconds': round(elapsed, 3),
+              'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None}
+    result.update(percentiles(latencies))
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def error_rate(result):
+    return result['errors'] / result['requests'] if result.get('requests') else 0.0
+
+
+def compare(report, baseline, metric='p95_ms', tolerance=0.2):
+    """Scenarios whose `metric` grew more than `tolerance` over the baseline,
+    that stopped producing it, or that fail more often than they did."""
+    regressions = []
+    for name, result in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name, {})
+        before = previous.get(metric)
+        after = result.get(metric)
+        if error_rate(result) > error_rate(previous):
+            regressions.append({'scenario': name, 'metric': 'error_rate', 'baseline': round(error_rate(previous), 4),
+                                'current': round(error_rate(result), 4), 'change_pct': None})
+        if before is None:
+            continue
+        if after is None:
+            # Every request failed: no latency to compare, which is worse than slow
+            regressions.append({'scenario': name, 'metric': metric, 'baseline': before, 'current': None,
+                                'change_pct': None})
+        elif after > before * (1 + tolerance):
+            regressions.append({'scenario': name, 'metric': metric, 'baseline': before, 'current': after,
+                                'change_pct': round((after / before - 1) * 100, 1) if before else None})
+    return regressions
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(rows=10000)
+    parser.add_argument('--backend', choices=['mongo', 'mongomock'], default='mongo')
+    parser.add_argument('--transport', choices=['client', 'http'], default='client')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--users', type=int, default=1, help='Seeded users; the first one is measured')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--auth-requests', type=int, default=20, help='Requests per signup/login scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='Client threads per scenario')
+    parser.add_argument('--page-size', type=int, default=50, help='?limit= for the list scenario')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--summary-cache', action='store_true', help='Keep the summary cache enabled')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Seed insert batch size')
+    parser.add_argument('--output', help='Also write the report to this file (e.g. a new baseline)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Exit 1 when a scenario is slower than this report')
+    parser.add_argument('--metric', choices=METRICS, default='p95_ms')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error('unknown scenarios: %s' % ', '.join(unknown))
+    if ('update' in scenarios or 'delete' in scenarios) and 'create' not in scenarios:
+        parser.error('update and delete need the create scenario')
+
+    use_backend(args)
+    email = seed(args)
+    from app import app
+
+    transport = HttpTransport(app, args.port) if args.transport == 'http' else ClientTransport(app)
+    try:
+        headers = login(transport, email)
+        state = {'run_id': '%x' % int(time.time() * 1000), 'email': email, 'page_size': args.page_size}
+        results = {}
+        for name in scenarios:
+            requests = args.auth_requests if name in AUTH_SCENARIOS else args.requests
+            if name in ('update', 'delete') and not state.get('created'):
+                raise SystemExit('%s needs rows from the create scenario, but every create failed' % name)
+            if name == 'delete':
+                requests = min(requests, len(state['created']))
+            results[name] = run_scenario(transport, name, state, requests, args.concurrency, headers)
+    finally:
+        transport.close()
+
+    report = {
+        'config': {key: getattr(args, key) for key in ('backend', 'transport', 'users', 'rows', 'requests',
+                                                       'auth_requests', 'concurrency', 'page_size',
+                                                       'bcrypt_rounds', 'summary_cache')},
+        'scenarios': results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    failed = False
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        # Latencies from a different data set or concurrency are not comparable
+        report['config_changes'] = {key: [value, report['config'].get(key)]
+                                    for key, value in baseline.get('config', {}).items()
+                                    if report['config'].get(key) != value}
+        report['regressions'] = compare(report, baseline, args.metric, args.tolerance)
+        failed = bool(report['regressions'])
+
+    body = json.dumps(report, indent=2)
+    print(body)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(body + '\n')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
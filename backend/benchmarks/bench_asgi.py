@@ -0,0 +1,167 @@
+"""Load-test the WSGI app against the ASGI app on the same data.
+
+Starts each serving mode in a subprocess (werkzeug's threaded server for
+app.py, hypercorn for asgi.py), drives it with `--concurrency` keep-alive
+clients and reports throughput and latency percentiles per endpoint. The
+summary cache is disabled so every request reaches MongoDB.
+
+Usage (from backend/, needs requirements-async.txt installed):
+    python -m benchmarks.bench_asgi --rows 5000 --concurrency 64 --requests 4000
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import base_parser, connect, percentiles, seed_user, use_bench_database
+
+ENDPOINTS = ['/api/dashboard/summary', '/api/income/?limit=20']
+BENCH_USER = {'email': 'bench-asgi@example.com', 'password': 'bench-password', 'name': 'Bench'}
+
+
+def serve(mode, port):
+    if mode == 'sync':
+        from werkzeug.serving import run_simple
+        from app import app
+
+        run_simple('127.0.0.1', port, app, threaded=True)
+    else:
+        import asyncio
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config as HypercornConfig
+        from asgi import app
+
+        config = HypercornConfig()
+        config.bind = ['127.0.0.1:%d' % port]
+        config.accesslog = None
+        asyncio.run(hypercorn_serve(app, config))
+
+
+def start_server(mode, args):
+    port = args.port
+    env = dict(os.environ, SUMMARY_CACHE_BACKEND='none')
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_asgi', '--serve', mode,
+         '--port', str(port), '--uri', args.uri, '--db', args.db],
+        cwd=backend_dir, env=env, stdout=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError('%s server exited with %s' % (mode, process.returncode))
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('%s server did not start on port %d' % (mode, port))
+
+
+def call(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    payload = json.dumps(body) if body is not None else None
+    connection.request(method, path, payload, {'Content-Type': 'application/json', **(headers or {})})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, json.loads(data) if data else None
+
+
+def login(port):
+    call(port, 'POST', '/api/auth/signup', BENCH_USER)
+    status, body = call(port, 'POST', '/api/auth/login',
+                        {'email': BENCH_USER['email'], 'password': BENCH_USER['password']})
+    if status != 200:
+        raise RuntimeError('login failed: %s %s' % (status, body))
+    return body['token'], body['user']['id']
+
+
+def load(port, path, token, concurrency, requests):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_client = max(1, requests // concurrency)
+    headers = {'Authorization': 'Bearer %s' % token}
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        samples = []
+        failed = 0
+        for _ in range(per_client):
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                ok = False
+            if ok:
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                failed += 1
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {'ok': len(latencies), 'errors': errors[0], 'seconds': round(elapsed, 2),
+              'requests_per_sec': round(len(latencies) / elapsed, 1)}
+    result.update(percentiles(latencies))
+    return result
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=4000, help='Requests per endpoint per mode')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    use_bench_database(args)
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    client, db = connect(args)
+    client.drop_database(args.db)
+    from database import ensure_indexes
+    ensure_indexes()
+    report = {'rows': args.rows, 'concurrency': args.concurrency}
+    seeded = False
+    for mode in args.modes.split(','):
+        process = start_server(mode, args)
+        try:
+            token, user_id = login(args.port)
+            if not seeded:
+                seed_user(db, user_id, args.rows)
+                seeded = True
+            report[mode] = {path: load(args.port, path, token, args.concurrency, args.requests)
+                            for path in ENDPOINTS}
+        finally:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
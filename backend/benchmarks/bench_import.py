@@ -0,0 +1,75 @@
+"""Measure bulk import throughput (rows/sec) for CSV and NDJSON uploads.
+
+Usage (from backend/):
+    python -m benchmarks.bench_import --rows 100000 --batch-size 1000
+"""
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import (base_parser, connect, use_bench_database, random_date,
+                               EXPENSE_CATEGORIES)
+
+
+def write_file(path, fmt, rows):
+    rng = random.Random(7)
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(handle)
+            writer.writerow(['title', 'amount', 'category', 'date', 'description'])
+        for i in range(rows):
+            row = ['Imported %d' % i, '%.2f' % rng.uniform(1, 5000),
+                   rng.choice(EXPENSE_CATEGORIES), random_date(rng), 'bank export']
+            if writer:
+                writer.writerow(row)
+            else:
+                handle.write(json.dumps(dict(zip(
+                    ('title', 'amount', 'category', 'date', 'description'), row))) + '\n')
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.set_defaults(rows=100000)
+    args = parser.parse_args()
+
+    use_bench_database(args)
+    from database import ensure_indexes
+    from services.bulk_import import import_transactions
+
+    client, db = connect(args)
+    ensure_indexes()
+    user_id = 'bench-import-user'
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in ('csv', 'ndjson'):
+            path = os.path.join(directory, 'import.' + fmt)
+            write_file(path, fmt, args.rows)
+            db['expenses'].delete_many({'user_id': user_id})
+            db['monthly_rollups'].delete_many({'user_id': user_id})
+
+            with open(path, 'rb') as stream:
+                start = time.perf_counter()
+                report = import_transactions(stream, fmt, 'expense', user_id, db['expenses'],
+                                             args.batch_size)
+                elapsed = time.perf_counter() - start
+
+            results[fmt] = {
+                'rows': args.rows,
+                'inserted': report.inserted,
+                'failed': report.failed,
+                'seconds': round(elapsed, 2),
+                'rows_per_sec': round(report.inserted / elapsed) if elapsed else None,
+            }
+
+    print(json.dumps({'batch_size': args.batch_size, 'results': results}, indent=2))
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Concurrent login load: inline bcrypt versus the bounded hashing pool.
+
+Simulates `--concurrency` request threads each verifying passwords, the
+way the login handler does, and reports throughput, latency percentiles
+and how many requests were shed with 503.
+
+Usage (from backend/):
+    python -m benchmarks.bench_login --concurrency 32 --logins 256 --rounds 12
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.common import percentiles
+from services.hashing import PasswordHasher, HasherBusy, _hash, _check
+
+
+def run(verify, concurrency, logins):
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    per_thread = logins // concurrency
+
+    def worker():
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            try:
+                verify()
+            except HasherBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {'ok': len(latencies), 'rejected': rejected[0], 'seconds': round(elapsed, 2),
+              'logins_per_sec': round(len(latencies) / elapsed, 1)}
+    result.update(percentiles(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=256)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-pending', type=int, default=None)
+    args = parser.parse_args()
+
+    stored = _hash('correct horse battery staple', args.rounds)
+    hasher = PasswordHasher(
+        workers=args.workers,
+        max_pending=args.max_pending or args.concurrency * 2,
+        timeout=60,
+        rounds=args.rounds
+    )
+    hasher.verify('warm up the pool', stored)
+
+    report = {
+        'concurrency': args.concurrency,
+        'rounds': args.rounds,
+        'inline': run(lambda: _check('correct horse battery staple', stored),
+                      args.concurrency, args.logins),
+        'pool': run(lambda: hasher.verify('correct horse battery staple', stored),
+                    args.concurrency, args.logins),
+        'pool_stats': hasher.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Typeahead latency of /api/transactions/search on one large user.
+
+Seeds `--rows` incomes and `--rows` expenses, builds their search entries
+and times the search service for progressively typed queries.
+
+Usage (from backend/):
+    python -m benchmarks.bench_search --rows 50000
+"""
+import json
+import time
+
+from benchmarks.common import base_parser, connect, seed_user, use_bench_database, percentiles
+
+TARGET_MS = 20
+# Each query is timed as it would be sent while typing it
+QUERIES = ('food', 'expense 4', 'synthetic', 'sal', 'income 123')
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(rows=50000)
+    args = parser.parse_args()
+
+    use_bench_database(args)
+    from database import ensure_indexes
+    from services.search import parse_search_args, reindex, search
+
+    client, db = connect(args)
+    ensure_indexes()
+    user_id = 'bench-search-user'
+    seed_user(db, user_id, args.rows)
+    db['search_index'].delete_many({'user_id': user_id})
+    reindex({'income': db['incomes'], 'expense': db['expenses']}, db['search_index'], user_id)
+
+    report = {'rows': args.rows * 2, 'target_ms': TARGET_MS, 'queries': {}}
+    samples = []
+    for query in QUERIES:
+        typed = [query[:length] for length in range(1, len(query) + 1) if query[length - 1] != ' ']
+        timings = []
+        for _ in range(args.repeat):
+            for prefix in typed:
+                options = parse_search_args({'q': prefix})
+                start = time.perf_counter()
+                search(db['search_index'], user_id, options)
+                timings.append((time.perf_counter() - start) * 1000)
+        report['queries'][query] = percentiles(timings)
+        samples.extend(timings)
+
+    report['overall'] = percentiles(samples)
+    report['within_target'] = report['overall']['p95_ms'] < TARGET_MS
+    print(json.dumps(report, indent=2))
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
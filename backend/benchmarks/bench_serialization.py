@@ -0,0 +1,81 @@
+"""Documents serialized per second: the old per-field conversion with the
+standard library encoder versus the orjson path, in rows and columns form.
+
+No database is needed; documents are generated in memory with ObjectIds and
+datetimes as MongoDB returns them.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --rows 100000
+"""
+import gzip
+import json
+import time
+
+from bson import ObjectId
+from benchmarks.common import base_parser, generate_transactions, INCOME_CATEGORIES
+from models.dates import format_date
+from models.income import Income
+from services.listing import serialize_document
+from services.serialization import dumps, to_columns
+
+
+def legacy_encode(docs):
+    # The list handlers before orjson: convert each field, then json.dumps per document
+    parts = []
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+        doc['date'] = format_date(doc['date'])
+        doc['created_at'] = doc['created_at'].isoformat()
+        parts.append(json.dumps(doc, sort_keys=True))
+    return ('{"incomes": [' + ','.join(parts) + '], "next_cursor": null}').encode('utf-8')
+
+
+def rows_encode(docs):
+    body = b','.join(dumps(serialize_document(doc)) for doc in docs)
+    return b'{"incomes":[' + body + b'],"next_cursor":null}'
+
+
+def columns_encode(docs):
+    columns, count = to_columns([serialize_document(doc) for doc in docs])
+    return dumps({'incomes': columns, 'count': count, 'next_cursor': None})
+
+
+def measure(encode, documents, repeat):
+    best = None
+    body = b''
+    for _ in range(repeat):
+        # Encoders mutate documents the way the handlers do, so start fresh each run
+        docs = [dict(doc) for doc in documents]
+        start = time.perf_counter()
+        body = encode(docs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'docs_per_sec': round(len(documents) / best),
+        'ms': round(best * 1000, 1),
+        'bytes': len(body),
+        'gzip_bytes': len(gzip.compress(body, 6)),
+    }
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(rows=100000, repeat=5)
+    args = parser.parse_args()
+
+    documents = []
+    for doc in generate_transactions(Income, 'bench-user', INCOME_CATEGORIES, args.rows):
+        doc['_id'] = ObjectId()
+        documents.append(doc)
+
+    report = {
+        'rows': args.rows,
+        'legacy_json': measure(legacy_encode, documents, args.repeat),
+        'orjson_rows': measure(rows_encode, documents, args.repeat),
+        'orjson_columns': measure(columns_encode, documents, args.repeat),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
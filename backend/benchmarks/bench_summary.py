@@ -0,0 +1,87 @@
+"""Compare the legacy in-Python dashboard summary with the aggregation pipeline.
+
+Usage (from backend/):
+    python -m benchmarks.bench_summary --rows 50000
+"""
+import json
+
+from benchmarks.common import base_parser, connect, seed_user, timed
+from services.summary import build_summary
+from services.fx import RateTable
+
+
+def legacy_summary(user_id, incomes_collection, expenses_collection):
+    # Verbatim copy of the original get_summary body, kept as the baseline
+    incomes = list(incomes_collection.find({'user_id': user_id}))
+    expenses = list(expenses_collection.find({'user_id': user_id}))
+
+    total_income = sum(income['amount'] for income in incomes)
+    total_expense = sum(expense['amount'] for expense in expenses)
+    balance = total_income - total_expense
+
+    recent_incomes = list(incomes_collection.find({'user_id': user_id}).sort('date', -1).limit(5))
+    recent_expenses = list(expenses_collection.find({'user_id': user_id}).sort('date', -1).limit(5))
+
+    for income in recent_incomes:
+        income['_id'] = str(income['_id'])
+        income['type'] = 'income'
+
+    for expense in recent_expenses:
+        expense['_id'] = str(expense['_id'])
+        expense['type'] = 'expense'
+
+    income_by_category = {}
+    for income in incomes:
+        category = income['category']
+        income_by_category[category] = income_by_category.get(category, 0) + income['amount']
+
+    expense_by_category = {}
+    for expense in expenses:
+        category = expense['category']
+        expense_by_category[category] = expense_by_category.get(category, 0) + expense['amount']
+
+    return {
+        'summary': {
+            'total_income': total_income,
+            'total_expense': total_expense,
+            'balance': balance,
+            'income_count': len(incomes),
+            'expense_count': len(expenses)
+        },
+        'recent_transactions': {
+            'incomes': recent_incomes,
+            'expenses': recent_expenses
+        },
+        'category_breakdown': {
+            'income': income_by_category,
+            'expense': expense_by_category
+        }
+    }
+
+
+def main():
+    args = base_parser(__doc__).parse_args()
+    client, db = connect(args)
+    user_id = 'bench-summary-user'
+
+    seed_user(db, user_id, args.rows)
+    incomes, expenses, buckets = db['incomes'], db['expenses'], db['transaction_buckets']
+    # Seeded rows carry no currency, so nothing needs rates
+    convert = RateTable([], 'EUR').converter('EUR')
+
+    legacy = legacy_summary(user_id, incomes, expenses)
+    pipeline = build_summary(user_id, incomes, expenses, buckets, convert)
+    for key in ('income_count', 'expense_count'):
+        assert legacy['summary'][key] == pipeline['summary'][key], key
+
+    report = {
+        'rows_per_collection': args.rows,
+        'legacy': timed(lambda: legacy_summary(user_id, incomes, expenses), args.repeat),
+        'aggregation': timed(lambda: build_summary(user_id, incomes, expenses, buckets, convert), args.repeat),
+    }
+    print(json.dumps(report, indent=2))
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+from datetime import date, timedelta
+
+# Allow `python benchmarks/<script>.py` as well as `python -m benchmarks.<script>`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.income import Income
+from models.expense import Expense
+
+INCOME_CATEGORIES = ['Salary', 'Freelance', 'Business', 'Investment', 'Gift', 'Other']
+EXPENSE_CATEGORIES = ['Food', 'Transportation', 'Shopping', 'Entertainment', 'Bills',
+                      'Healthcare', 'Education', 'Other']
+
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--uri', default=os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017'),
+                        help='MongoDB instance to seed (never point this at production)')
+    parser.add_argument('--db', default='finance_tracker_bench', help='Scratch database name')
+    parser.add_argument('--rows', type=int, default=20000, help='Transactions per collection')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed iterations per path')
+    return parser
+
+
+def use_bench_database(args):
+    """Point the app's own database module at the scratch database.
+
+    Must run before anything imports `database` (directly or via services).
+    """
+    os.environ['MONGODB_URI'] = args.uri
+    os.environ['DATABASE_NAME'] = args.db
+
+
+def connect(args):
+    from pymongo import MongoClient
+
+    client = MongoClient(args.uri)
+    return client, client[args.db]
+
+
+def random_date(rng, days=5 * 365):
+    return (date.today() - timedelta(days=rng.randrange(days))).isoformat()
+
+
+def generate_transactions(model, user_id, categories, rows, seed=42):
+    rng = random.Random(seed)
+    for i in range(rows):
+        yield model(
+            user_id=user_id,
+            title='%s %d' % (model.__name__, i),
+            amount=round(rng.uniform(1, 5000), 2),
+            category=rng.choice(categories),
+            date=random_date(rng),
+            description='synthetic'
+        ).to_dict()
+
+
+def seed_user(db, user_id, rows, batch_size=5000):
+    db['incomes'].delete_many({'user_id': user_id})
+    db['expenses'].delete_many({'user_id': user_id})
+    db['incomes'].create_index('user_id')
+    db['expenses'].create_index('user_id')
+
+    for collection, model, categories in (
+        (db['incomes'], Income, INCOME_CATEGORIES),
+        (db['expenses'], Expense, EXPENSE_CATEGORIES),
+    ):
+        batch = []
+        for doc in generate_transactions(model, user_id, categories, rows):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0], 2),
+        'p50_ms': round(samples[len(samples) // 2], 2),
+        'max_ms': round(samples[-1], 2),
+    }
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    samples = sorted(samples)
+
+    def pick(fraction):
+        return round(samples[min(len(samples) - 1, int(len(samples) * fraction))], 2)
+
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
@@ -0,0 +1,262 @@
+import click
+from pymongo import UpdateOne
+from database import (users_collection, incomes_collection, expenses_collection,
+                      monthly_rollups_collection, migrations_collection, search_index_collection,
+                      transaction_buckets_collection, ensure_indexes)
+from services.avatars import store_avatar
+from services.migrations import migrate_string_dates, pending_date_migrations
+from services.sync import compact_tombstones
+from services.recurring import materialize_due
+from services.budgets import parse_month
+from services.search import reindex
+from services.archive import compact as compact_archive
+from services.reports import prune as prune_reports
+from services.fx import read_rates, load_rates
+from models.dates import parse_date
+from datetime import datetime
+from config import Config
+from services.rollups import expected_rollups, add_archived, stored_rollups, find_drift, repair_operations
+
+
+def _expected(user_id):
+    expected = expected_rollups(incomes_collection, 'income', user_id)
+    expected.update(expected_rollups(expenses_collection, 'expense', user_id))
+    return add_archived(expected, transaction_buckets_collection, user_id=user_id)
+
+
+rollups_cli = click.Group('rollups', help='Maintain the monthly_rollups collection.')
+
+
+@rollups_cli.command('verify')
+@click.option('--user-id', default=None, help='Only check this user.')
+def verify_rollups(user_id):
+    """Compare stored rollups with the raw transactions and report drift."""
+    expected = _expected(user_id)
+    stored = stored_rollups(monthly_rollups_collection, user_id)
+
+    drift = list(find_drift(expected, stored))
+    for (uid, kind, month, category, currency), want, have in drift:
+        click.echo('%s %s %s %s %s: expected total=%.2f count=%d, stored total=%.2f count=%d'
+                   % (uid, kind, month, category, currency or '-', want[0], want[1], have[0], have[1]))
+
+    click.echo('%d rollups checked, %d drifted' % (len(set(expected) | set(stored)), len(drift)))
+    if drift:
+        raise SystemExit(1)
+
+
+@rollups_cli.command('rebuild')
+@click.option('--user-id', default=None, help='Only rebuild this user.')
+def rebuild_rollups(user_id):
+    """Recompute rollups from raw transactions and repair any drift."""
+    expected = _expected(user_id)
+    stored = stored_rollups(monthly_rollups_collection, user_id)
+
+    operations = repair_operations(expected, stored)
+    if operations:
+        monthly_rollups_collection.bulk_write(operations, ordered=False)
+    click.echo('%d rollups repaired' % len(operations))
+
+
+budgets_cli = click.Group('budgets', help='Budget maintenance.')
+
+
+@budgets_cli.command('reconcile')
+@click.option('--user-id', default=None, help='Only reconcile this user.')
+@click.option('--month', default=None, help='Only reconcile this month (YYYY-MM).')
+def reconcile_budgets(user_id, month):
+    """Rebuild the per-category spending counters budgets are checked against."""
+    month = parse_month(month) if month else None
+    expected = expected_rollups(expenses_collection, 'expense', user_id, month)
+    add_archived(expected, transaction_buckets_collection, 'expense', user_id, month)
+    stored = stored_rollups(monthly_rollups_collection, user_id, 'expense', month)
+
+    operations = repair_operations(expected, stored)
+    if operations:
+        monthly_rollups_collection.bulk_write(operations, ordered=False)
+    click.echo('%d counters checked, %d repaired' % (len(set(expected) | set(stored)), len(operations)))
+
+
+search_cli = click.Group('search', help='Transaction search index.')
+
+
+@search_cli.command('reindex')
+@click.option('--user-id', default=None, help='Only reindex this user.')
+@click.option('--batch-size', default=1000, show_default=True)
+def reindex_search(user_id, batch_size):
+    """Rebuild search entries from incomes/expenses (needed once for existing data)."""
+    def progress(kind, indexed):
+        click.echo('%s: %d indexed' % (kind, indexed))
+
+    indexed, pruned = reindex({'income': incomes_collection, 'expense': expenses_collection},
+                              search_index_collection, user_id, batch_size, progress,
+                              transaction_buckets_collection)
+    click.echo('Done: %d indexed, %d stale entries removed' % (indexed, pruned))
+
+
+avatars_cli = click.Group('avatars', help='Manage stored profile pictures.')
+
+
+@avatars_cli.command('migrate')
+@click.option('--batch-size', default=100, show_default=True)
+def migrate_avatars(batch_size):
+    """Move inline base64 profile pictures into the avatar store.
+
+    Safe to re-run: users that already hold a URL are not matched.
+    """
+    query = {'profile_picture': {'$regex': '^data:'}}
+    migrated = failed = 0
+    operations = []
+
+    cursor = users_collection.find(query, {'profile_picture': 1}).batch_size(batch_size)
+    for user in cursor:
+        try:
+            url = store_avatar(user['profile_picture'])
+        except ValueError as e:
+            failed += 1
+            click.echo('%s: %s' % (user['_id'], e))
+            continue
+        # Match on the old value so a concurrent profile update is not overwritten
+        operations.append(UpdateOne(
+            {'_id': user['_id'], 'profile_picture': user['profile_picture']},
+            {'$set': {'profile_picture': url}}
+        ))
+        if len(operations) >= batch_size:
+            users_collection.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+            operations = []
+            click.echo('%d migrated' % migrated)
+
+    if operations:
+        users_collection.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+    click.echo('Done: %d migrated, %d failed' % (migrated, failed))
+
+
+dates_cli = click.Group('dates', help='Transaction date maintenance.')
+
+
+@dates_cli.command('migrate')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to sleep between batches.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint.')
+def migrate_dates(batch_size, pause, restart):
+    """Convert legacy string dates to BSON dates (resumable)."""
+    def progress(name, done, total, converted, failed):
+        click.echo('%s: %d/%d scanned, %d converted, %d unparseable'
+                   % (name, done, total, converted, failed))
+
+    for collection in (incomes_collection, expenses_collection):
+        converted, failed = migrate_string_dates(
+            collection, migrations_collection, batch_size, pause, restart, progress
+        )
+        click.echo('%s done: %d converted, %d unparseable' % (collection.name, converted, failed))
+
+
+indexes_cli = click.Group('indexes', help='Database index management.')
+
+
+@indexes_cli.command('ensure')
+def ensure():
+    """Create missing indexes (run once per deploy, before serving)."""
+    for name in ensure_indexes():
+        click.echo(name)
+    # Rows with legacy string dates are missing from date filters and page
+    # cursors until `dates migrate` has finished
+    for name in pending_date_migrations((incomes_collection, expenses_collection), migrations_collection):
+        click.echo('Warning: %s still holds string dates; run `flask --app app dates migrate`' % name,
+                   err=True)
+
+
+sync_cli = click.Group('sync', help='Delta sync maintenance.')
+
+
+@sync_cli.command('compact')
+@click.option('--days', default=Config.SYNC_TOMBSTONE_DAYS, show_default=True,
+              help='Keep tombstones younger than this.')
+def compact(days):
+    """Delete old tombstones; clients with older tokens must reload."""
+    click.echo('Removed %d tombstones' % compact_tombstones(days))
+
+
+recurring_cli = click.Group('recurring', help='Recurring transactions.')
+
+
+@recurring_cli.command('materialize')
+@click.option('--through', default=None, help='Write occurrences up to this date (default today, UTC).')
+@click.option('--chunk-size', default=Config.RECURRING_CHUNK_SIZE, show_default=True)
+@click.option('--workers', default=Config.RECURRING_WORKERS, show_default=True,
+              help='Worker processes; 1 runs in this process.')
+@click.option('--max-catch-up', default=Config.RECURRING_MAX_CATCH_UP, show_default=True,
+              help='Occurrences one rule may catch up per run.')
+def materialize(through, chunk_size, workers, max_catch_up):
+    """Write due occurrences of every recurring rule (run from cron; safe to re-run)."""
+    through = parse_date(through) if through else datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+    def progress(totals):
+        click.echo('%d rules, %d created' % (totals['rules'], totals['created']))
+
+    totals = materialize_due(through, chunk_size, workers, max_catch_up, progress)
+    click.echo('Done: %d rules, %d created, %d already written, %d failed'
+               % (totals['rules'], totals['created'], totals['duplicates'], totals['failed']))
+
+
+archive_cli = click.Group('archive', help='Cold storage for old transactions.')
+
+
+@archive_cli.command('compact')
+@click.option('--months', default=Config.ARCHIVE_AFTER_MONTHS, show_default=True,
+              help='Keep this many full months before the current one hot.')
+@click.option('--max-entries', default=Config.ARCHIVE_MAX_BUCKET_ENTRIES, show_default=True,
+              help='Months with more rows than this stay hot.')
+@click.option('--user-id', default=None, help='Only compact this user.')
+def compact_buckets(months, max_entries, user_id):
+    """Move old rows into monthly buckets (run from cron; safe to re-run)."""
+    def progress(users, moved):
+        if users % 100 == 0:
+            click.echo('%d users, %d rows archived' % (users, moved))
+
+    users, moved = compact_archive(months, max_entries, user_id, progress)
+    click.echo('Done: %d users, %d rows archived' % (users, moved))
+
+
+reports_cli = click.Group('reports', help='Generated statements.')
+
+
+@reports_cli.command('prune')
+@click.option('--days', default=Config.REPORT_RETENTION_DAYS, show_default=True,
+              help='Keep finished reports younger than this.')
+def prune(days):
+    """Delete old report jobs and their files (run from cron)."""
+    click.echo('Removed %d reports' % prune_reports(days))
+
+
+fx_cli = click.Group('fx', help='Currency exchange rates.')
+
+
+@fx_cli.command('load')
+@click.argument('rates_file', type=click.File('r'))
+def load_fx(rates_file):
+    """Merge a date,currency,rate CSV into the FX rate table.
+
+    Rates are units of the currency per FX_PIVOT_CURRENCY; workers pick up
+    the new table within FX_REFRESH_SECONDS.
+    """
+    try:
+        currencies, count = load_rates(read_rates(rates_file))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo('Loaded %d rates for %d currencies' % (count, currencies))
+
+
+def register_commands(app):
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(recurring_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(fx_cli)
+    app.cli.add_command(sync_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(budgets_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(avatars_cli)
+    app.cli.add_command(dates_cli)
@@ -3,8 +3,98 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     MONGODB_URI = os.getenv('MONGODB_URI')
     DATABASE_NAME = os.getenv('DATABASE_NAME', 'finance_tracker')
+
+    # Connection pool, wire compression ('zstd,snappy,zlib') and read routing
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 100))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 10000))
+    MONGODB_COMPRESSORS = os.getenv('MONGODB_COMPRESSORS', '')
+    MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', 'primary')
+    MONGODB_MAX_STALENESS_SECONDS = int(os.getenv('MONGODB_MAX_STALENESS_SECONDS', -1))
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = 86400  # 24 hours
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+    BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', 1000))
+    BULK_IMPORT_MAX_BATCH_SIZE = 10000
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads', 'profile_pictures'))
+    MAX_AVATAR_BYTES = int(os.getenv('MAX_AVATAR_BYTES', 5 * 1024 * 1024))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))
+
+    # gzip/brotli for JSON and CSV responses; buffered bodies below the
+    # minimum size are sent uncompressed
+    COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 1000))
+    # Search ranks at most this many of the newest matches per query
+    SEARCH_CANDIDATES = int(os.getenv('SEARCH_CANDIDATES', 500))
+
+    # Delta sync: page size, how long writes settle before tokens pass them,
+    # and how long tombstones are kept
+    SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 1000))
+    SYNC_SETTLE_SECONDS = int(os.getenv('SYNC_SETTLE_SECONDS', 5))
+    SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+
+    # Recurring transactions: rules per chunk, pool size for the materializer
+    # and how many occurrences one rule may catch up per run
+    RECURRING_CHUNK_SIZE = int(os.getenv('RECURRING_CHUNK_SIZE', 1000))
+    RECURRING_WORKERS = int(os.getenv('RECURRING_WORKERS', os.cpu_count() or 2))
+    RECURRING_MAX_CATCH_UP = int(os.getenv('RECURRING_MAX_CATCH_UP', 400))
+
+    # Archive: months older than this are compacted into one bucket per
+    # (user, kind, month); months with more rows than fit a bucket stay hot
+    ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', 24))
+    ARCHIVE_MAX_BUCKET_ENTRIES = int(os.getenv('ARCHIVE_MAX_BUCKET_ENTRIES', 20000))
+
+    # Report jobs: pool size per web process ('process' or 'thread'), queued
+    # or running jobs allowed per user and in total, and how long a job may
+    # take before it is failed and its slot freed. PDF ledgers are capped
+    REPORT_FOLDER = os.getenv('REPORT_FOLDER', os.path.join(BASE_DIR, 'uploads', 'reports'))
+    REPORT_POOL = os.getenv('REPORT_POOL', 'process')
+    REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2))
+    REPORT_MAX_PER_USER = int(os.getenv('REPORT_MAX_PER_USER', 2))
+    REPORT_MAX_PENDING = int(os.getenv('REPORT_MAX_PENDING', 50))
+    REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', 900))
+    REPORT_PDF_MAX_ROWS = int(os.getenv('REPORT_PDF_MAX_ROWS', 2000))
+    REPORT_RETENTION_DAYS = int(os.getenv('REPORT_RETENTION_DAYS', 30))
+
+    # Currencies: users without a base currency see totals in BASE_CURRENCY.
+    # Stored FX rates are units of each currency per FX_PIVOT_CURRENCY; web
+    # workers pick up newly loaded rates within FX_REFRESH_SECONDS
+    BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'USD')
+    FX_PIVOT_CURRENCY = os.getenv('FX_PIVOT_CURRENCY', 'EUR')
+    FX_REFRESH_SECONDS = int(os.getenv('FX_REFRESH_SECONDS', 60))
+
+    # Observability: /metrics needs METRICS_TOKEN as a bearer token and is not
+    # served without one unless METRICS_PUBLIC is set; 0 disables the slow log
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'false').lower() in ('1', 'true', 'yes')
+    SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 0))
+
+    # Password hashing runs on a bounded pool ('process' or 'thread')
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    HASH_POOL = os.getenv('HASH_POOL', 'process')
+    HASH_WORKERS = int(os.getenv('HASH_WORKERS', os.cpu_count() or 2))
+    HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', (os.cpu_count() or 2) * 4))
+    HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10))
+
+    # Dashboard summary cache: 'memory', 'redis' or 'none'
+    SUMMARY_CACHE_BACKEND = os.getenv('SUMMARY_CACHE_BACKEND', 'memory')
+    SUMMARY_CACHE_SIZE = int(os.getenv('SUMMARY_CACHE_SIZE', 1024))
+    SUMMARY_CACHE_TTL = int(os.getenv('SUMMARY_CACHE_TTL', 300))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+    # Profile reads for /verify and the profile endpoints: per-process LRU
+    # (0 disables it). AUTH_VERIFY_MODE=stateless answers /verify from the
+    # token's claims without reading users at all
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 60))
+    AUTH_VERIFY_MODE = os.getenv('AUTH_VERIFY_MODE', 'cache')
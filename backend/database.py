@@ -1,15 +1,174 @@
-from pymongo import MongoClient
+import os
+from pymongo import MongoClient, read_preferences
 from config import Config
+from services.metrics import command_listener
+
+READ_PREFERENCES = {
+    'primary': read_preferences.Primary,
+    'primaryPreferred': read_preferences.PrimaryPreferred,
+    'secondary': read_preferences.Secondary,
+    'secondaryPreferred': read_preferences.SecondaryPreferred,
+    'nearest': read_preferences.Nearest,
+}
+
+_client = None
+_client_pid = None
+
+
+def client_options():
+    """Pool and wire settings shared by the sync and async clients."""
+    options = {
+        'maxPoolSize': Config.MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGODB_MIN_POOL_SIZE,
+        'waitQueueTimeoutMS': Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        'connectTimeoutMS': Config.MONGODB_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if Config.MONGODB_COMPRESSORS:
+        options['compressors'] = Config.MONGODB_COMPRESSORS
+    return options
+
+
+def read_preference():
+    """Read preference for dashboard and list reads (writes always go to the primary)."""
+    if Config.MONGODB_READ_PREFERENCE not in READ_PREFERENCES:
+        raise ValueError('Unknown MONGODB_READ_PREFERENCE %r' % Config.MONGODB_READ_PREFERENCE)
+    mode = READ_PREFERENCES[Config.MONGODB_READ_PREFERENCE]
+    if mode is read_preferences.Primary:
+        return mode()
+    return mode(max_staleness=Config.MONGODB_MAX_STALENESS_SECONDS)
+
+
+def get_client():
+    # Created on first use and again in each forked worker: a MongoClient's
+    # sockets and monitor threads must not be shared across a fork
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = MongoClient(Config.MONGODB_URI, event_listeners=[command_listener], **client_options())
+        _client_pid = os.getpid()
+    return _client
+
+
+def get_db():
+    return get_client()[Config.DATABASE_NAME]
+
+
+class LazyCollection:
+    """Stands in for a pymongo Collection until the first operation on it.
+
+    Route modules import these at module level; nothing touches the network
+    until a request actually runs a query.
+    """
+
+    def __init__(self, name, for_reads=False):
+        self.name = name
+        self.for_reads = for_reads
+        self._collection = None
+        self._client = None
+
+    def get(self):
+        client = get_client()
+        if self._client is not client:
+            collection = client[Config.DATABASE_NAME][self.name]
+            if self.for_reads:
+                collection = collection.with_options(read_preference=read_preference())
+            self._collection, self._client = collection, client
+        return self._collection
+
+    def reads(self):
+        """The same collection using the configured read preference."""
+        return LazyCollection(self.name, for_reads=True)
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __repr__(self):
+        return 'LazyCollection(%r)' % self.name
 
-client = MongoClient(Config.MONGODB_URI)
-db = client[Config.DATABASE_NAME]
 
 # Collections
-users_collection = db['users']
-incomes_collection = db['incomes']
-expenses_collection = db['expenses']
-
-# Create indexes
-users_collection.create_index('email', unique=True)
-incomes_collection.create_index('user_id')
-expenses_collection.create_index('user_id')
+users_collection = LazyCollection('users')
+incomes_collection = LazyCollection('incomes')
+expenses_collection = LazyCollection('expenses')
+monthly_rollups_collection = LazyCollection('monthly_rollups')
+migrations_collection = LazyCollection('migrations')
+tombstones_collection = LazyCollection('tombstones')
+sync_counters_collection = LazyCollection('sync_counters')
+recurring_rules_collection = LazyCollection('recurring_rules')
+budgets_collection = LazyCollection('budgets')
+search_index_collection = LazyCollection('search_index')
+transaction_buckets_collection = LazyCollection('transaction_buckets')
+month_revisions_collection = LazyCollection('month_revisions')
+report_jobs_collection = LazyCollection('report_jobs')
+fx_rates_collection = LazyCollection('fx_rates')
+summary_versions_collection = LazyCollection('summary_versions')
+
+# Dashboard and list reads may be served by secondaries (MONGODB_READ_PREFERENCE)
+incomes_reads = incomes_collection.reads()
+expenses_reads = expenses_collection.reads()
+monthly_rollups_reads = monthly_rollups_collection.reads()
+search_index_reads = search_index_collection.reads()
+transaction_buckets_reads = transaction_buckets_collection.reads()
+
+
+# Indexes superseded by ones in ensure_indexes, dropped once those exist
+REPLACED_INDEXES = (
+    # Rollups became per currency; the old key would reject a second currency
+    (monthly_rollups_collection, 'user_id_1_month_1_kind_1_category_1'),
+)
+
+
+def ensure_indexes():
+    """Create the indexes the queries rely on.
+
+    Runs as an explicit step (`flask --app app indexes ensure`, or on
+    `python app.py`) rather than on import, so workers start without
+    blocking on the database.
+    """
+    names = [
+        users_collection.create_index('email', unique=True),
+        # Serves per-user scans, date range scans and newest-first keyset pagination
+        incomes_collection.create_index([('user_id', 1), ('date', -1), ('_id', -1)]),
+        expenses_collection.create_index([('user_id', 1), ('date', -1), ('_id', -1)]),
+        monthly_rollups_collection.create_index(
+            [('user_id', 1), ('month', 1), ('kind', 1), ('category', 1), ('currency', 1)], unique=True
+        ),
+        # Delta sync reads everything after a client's sequence number
+        incomes_collection.create_index([('user_id', 1), ('seq', 1)]),
+        expenses_collection.create_index([('user_id', 1), ('seq', 1)]),
+        tombstones_collection.create_index([('user_id', 1), ('seq', 1)]),
+        tombstones_collection.create_index('updated_at'),
+        # One transaction per rule occurrence, however often the materializer runs
+        incomes_collection.create_index(
+            [('rule_id', 1), ('occurrence_date', 1)], unique=True,
+            partialFilterExpression={'rule_id': {'$exists': True}}
+        ),
+        expenses_collection.create_index(
+            [('rule_id', 1), ('occurrence_date', 1)], unique=True,
+            partialFilterExpression={'rule_id': {'$exists': True}}
+        ),
+        # The materializer scans due rules from this index alone
+        recurring_rules_collection.create_index([('active', 1), ('next_date', 1), ('_id', 1)]),
+        recurring_rules_collection.create_index('user_id'),
+        budgets_collection.create_index([('user_id', 1), ('category', 1)], unique=True),
+        # Multikey over word prefixes; newest matches come straight off the index
+        search_index_collection.create_index([('user_id', 1), ('terms', 1), ('date', -1), ('_id', -1)]),
+        # One archive bucket per (user, kind, month); reads walk a user's buckets by start
+        transaction_buckets_collection.create_index([('user_id', 1), ('kind', 1), ('month', 1)], unique=True),
+        transaction_buckets_collection.create_index([('user_id', 1), ('kind', 1), ('start', -1)]),
+        # Finds the bucket holding an archived row when it is edited or deleted
+        transaction_buckets_collection.create_index('entries._id'),
+        month_revisions_collection.create_index([('user_id', 1), ('month', 1)], unique=True),
+        # At most one queued or running job per report, data revision and rate table
+        report_jobs_collection.create_index(
+            [('user_id', 1), ('period', 1), ('format', 1), ('revision', 1), ('currency', 1), ('fx_version', 1)],
+            unique=True,
+            partialFilterExpression={'active': True}
+        ),
+        report_jobs_collection.create_index([('user_id', 1), ('created_at', -1)]),
+        report_jobs_collection.create_index([('active', 1), ('created_at', 1)]),
+    ]
+    for collection, name in REPLACED_INDEXES:
+        if name in collection.index_information():
+            collection.drop_index(name)
+    return names
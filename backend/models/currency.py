@@ -0,0 +1,17 @@
+import re
+
+CURRENCY_PATTERN = re.compile(r'^[A-Z]{3}$')
+
+
+def parse_currency(value):
+    """Normalize an ISO 4217 code like 'eur' to 'EUR'; None stays None.
+
+    Transactions without a currency are in their owner's base currency.
+    Raises ValueError for anything that is not a three-letter code.
+    """
+    if value is None or value == '':
+        return None
+    code = str(value).strip().upper()
+    if not CURRENCY_PATTERN.match(code):
+        raise ValueError('Invalid currency: %s (expected a 3-letter ISO 4217 code)' % value)
+    return code
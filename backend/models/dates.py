@@ -0,0 +1,56 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_date(value):
+    """Normalize a client-supplied transaction date to a naive UTC datetime.
+
+    Accepts 'YYYY-MM-DD', full ISO 8601 strings and date/datetime objects.
+    Raises ValueError for anything else.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        return datetime.combine(value, time())
+    elif isinstance(value, str):
+        text = value.strip()
+        try:
+            if len(text) == 10:
+                return datetime.strptime(text, DATE_FORMAT)
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('Invalid date: %s (expected YYYY-MM-DD)' % value)
+    else:
+        raise ValueError('Invalid date: %r' % (value,))
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def is_date_only(value):
+    return isinstance(value, str) and len(value.strip()) == 10
+
+
+def format_date(value):
+    """Render a stored date the way clients send it: 'YYYY-MM-DD' unless it has a time."""
+    if isinstance(value, datetime):
+        if value.time() == time():
+            return value.strftime(DATE_FORMAT)
+        return value.isoformat()
+    return value
+
+
+def date_range(date_from=None, date_to=None):
+    """Mongo range condition for ?from=&to= (both inclusive), or None."""
+    condition = {}
+    if date_from:
+        condition['$gte'] = parse_date(date_from)
+    if date_to:
+        if is_date_only(date_to):
+            # Include everything on the last day, whatever its time
+            condition['$lt'] = parse_date(date_to) + timedelta(days=1)
+        else:
+            condition['$lte'] = parse_date(date_to)
+    return condition or None
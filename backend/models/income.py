@@ -1,14 +1,19 @@
 from bson import ObjectId
 from datetime import datetime
+from models.dates import parse_date
+from models.currency import parse_currency
 
 class Income:
-    def __init__(self, user_id, title, amount, category, date, description=''):
+    REQUIRED_FIELDS = ('title', 'amount', 'category', 'date')
+    
+    def __init__(self, user_id, title, amount, category, date, description='', currency=None):
         self.user_id = user_id
         self.title = title
         self.amount = float(amount)
         self.category = category
-        self.date = date
+        self.date = parse_date(date)
         self.description = description
+        self.currency = parse_currency(currency)
         self.created_at = datetime.utcnow()
     
     def to_dict(self):
@@ -16,6 +21,7 @@ class Income:
             'user_id': self.user_id,
             'title': self.title,
             'amount': self.amount,
+            'currency': self.currency,
             'category': self.category,
             'date': self.date,
             'description': self.description,
@@ -0,0 +1,64 @@
+from datetime import datetime
+from models.dates import parse_date
+from models.currency import parse_currency
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+KINDS = ('income', 'expense')
+
+
+class RecurringRule:
+    """A schedule plus the income/expense template it produces.
+
+    `next_index`/`next_date` point at the first occurrence not yet written;
+    the materializer advances them and `next_date` becomes None once the
+    rule has run out (`until` passed or `count` reached).
+    """
+    REQUIRED_FIELDS = ('type', 'title', 'amount', 'category', 'frequency', 'start')
+    # Schedule changes need a new rule; these may be edited in place
+    EDITABLE_FIELDS = ('title', 'amount', 'currency', 'category', 'description', 'until', 'active')
+
+    def __init__(self, user_id, type, title, amount, category, frequency, start,
+                 interval=1, until=None, count=None, description='', currency=None):
+        if type not in KINDS:
+            raise ValueError('type must be income or expense')
+        if frequency not in FREQUENCIES:
+            raise ValueError('frequency must be one of: %s' % ', '.join(FREQUENCIES))
+        self.user_id = user_id
+        self.type = type
+        self.title = title
+        self.amount = float(amount)
+        self.currency = parse_currency(currency)
+        self.category = category
+        self.description = description
+        self.frequency = frequency
+        self.interval = int(interval)
+        if self.interval < 1:
+            raise ValueError('interval must be at least 1')
+        self.start = parse_date(start)
+        self.until = parse_date(until) if until else None
+        if self.until is not None and self.until < self.start:
+            raise ValueError('until must not be before start')
+        self.count = int(count) if count is not None else None
+        if self.count is not None and self.count < 1:
+            raise ValueError('count must be at least 1')
+        self.created_at = datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'type': self.type,
+            'title': self.title,
+            'amount': self.amount,
+            'currency': self.currency,
+            'category': self.category,
+            'description': self.description,
+            'frequency': self.frequency,
+            'interval': self.interval,
+            'start': self.start,
+            'until': self.until,
+            'count': self.count,
+            'active': True,
+            'next_index': 0,
+            'next_date': self.start,
+            'created_at': self.created_at
+        }
@@ -1,22 +1,36 @@
 from bson import ObjectId
 from datetime import datetime
-import bcrypt
+from models.currency import parse_currency
+from services.hashing import hasher
 
 class User:
-    def __init__(self, email, password, name, profile_picture=None, phone_number=None):
+    def __init__(self, email, password, name, profile_picture=None, phone_number=None, hashed_password=None,
+                 base_currency=None):
         self.email = email
-        self.password = self._hash_password(password)
+        # Async callers hash on the pool themselves and pass the result in
+        self.password = hashed_password or self._hash_password(password)
         self.name = name
         self.profile_picture = profile_picture
         self.phone_number = phone_number
+        # Summaries, statements and exports are converted into this currency
+        self.base_currency = parse_currency(base_currency)
         self.created_at = datetime.utcnow()
     
     def _hash_password(self, password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return User.hash_password(password)
+    
+    @staticmethod
+    def hash_password(password):
+        # Runs on the shared hashing pool; raises HasherBusy when saturated
+        return hasher.hash(password)
     
     @staticmethod
     def verify_password(password, hashed_password):
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        return hasher.verify(password, hashed_password)
+    
+    @staticmethod
+    def needs_rehash(hashed_password):
+        return hasher.needs_rehash(hashed_password)
     
     def to_dict(self):
         return {
@@ -25,5 +39,6 @@ class User:
             'name': self.name,
             'profile_picture': self.profile_picture,
             'phone_number': self.phone_number,
+            'base_currency': self.base_currency,
             'created_at': self.created_at
         }
@@ -1,17 +1,26 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, send_from_directory, abort, current_app
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from bson import ObjectId
 from database import users_collection
 from models.user import User
-import base64
+from services.hashing import HasherBusy, hasher
+from services.avatars import AVATAR_SIZES, AVATAR_DIGEST, DEFAULT_SIZE, avatar_filename
+from services.profiles import (PROFILE_PROJECTION, profile_cache, profile_claims, claims_profile,
+                               load_profile, verify_mode, public_user, signup_profile, profile_update)
+from services.metrics import check_token
+from config import Config
 import os
 
 auth_bp = Blueprint('auth', __name__)
 
 # Create uploads directory if it doesn't exist
-UPLOAD_FOLDER = 'uploads/profile_pictures'
+UPLOAD_FOLDER = Config.UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+def busy_response():
+    # Shed load rather than queueing more bcrypt work behind a full pool
+    return jsonify({'error': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     try:
@@ -25,12 +34,15 @@ def signup():
         if users_collection.find_one({'email': data['email']}):
             return jsonify({'error': 'Email already registered'}), 400
         
-        # Handle profile picture (base64 encoded)
-        profile_picture = data.get('profile_picture', None)
-        phone_number = data.get('phone_number', None)
+        # Handle profile picture (base64 encoded); only its URL is kept on the user
+        try:
+            profile = signup_profile(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Create new user
-        user = User(data['email'], data['password'], data['name'], profile_picture, phone_number)
+        user = User(data['email'], data['password'], data['name'], profile['profile_picture'],
+                    profile['phone_number'], base_currency=profile['base_currency'])
         result = users_collection.insert_one(user.to_dict())
         
         return jsonify({
@@ -38,6 +50,8 @@ def signup():
             'user_id': str(result.inserted_id)
         }), 201
         
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -60,20 +74,27 @@ def login():
         if not User.verify_password(data['password'], user['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        # Create access token
-        access_token = create_access_token(identity=str(user['_id']))
+        # Upgrade hashes made with an outdated cost factor while we know the password
+        if User.needs_rehash(user['password']):
+            try:
+                users_collection.update_one(
+                    {'_id': user['_id'], 'password': user['password']},
+                    {'$set': {'password': User.hash_password(data['password'])}}
+                )
+            except HasherBusy:
+                pass
+        
+        # Create access token; its profile claims let /verify skip the users read
+        access_token = create_access_token(identity=str(user['_id']), additional_claims=profile_claims(user))
         
         return jsonify({
             'message': 'Login successful',
             'token': access_token,
-            'user': {
-                'id': str(user['_id']),
-                'email': user['email'],
-                'name': user['name'],
-                'profile_picture': user.get('profile_picture')
-            }
+            'user': public_user(user, request.host_url)
         }), 200
         
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -82,19 +103,19 @@ def login():
 def verify():
     try:
         user_id = get_jwt_identity()
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        
+        user = None
+        if verify_mode() == 'stateless':
+            user = claims_profile(user_id, get_jwt())
+            if user is not None:
+                profile_cache.answered_from_claims()
+        if user is None:
+            user = load_profile(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({
-            'user': {
-                'id': str(user['_id']),
-                'email': user['email'],
-                'name': user['name'],
-                'profile_picture': user.get('profile_picture')
-            }
-        }), 200
+        return jsonify({'user': public_user(user, request.host_url)}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -139,22 +160,25 @@ def reset_password():
             return jsonify({'error': 'Email and new password are required'}), 400
         
         # Find user
-        user = users_collection.find_one({'email': data['email']})
+        user = users_collection.find_one({'email': data['email']}, {'_id': 1})
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Hash new password
-        new_hashed_password = User('temp@temp.com', data['new_password'], 'temp').password
+        new_hashed_password = User.hash_password(data['new_password'])
         
         # Update password
         users_collection.update_one(
             {'email': data['email']},
             {'$set': {'password': new_hashed_password}}
         )
+        profile_cache.invalidate(user['_id'])
         
         return jsonify({'message': 'Password reset successfully'}), 200
         
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -166,19 +190,10 @@ def update_profile():
         data = request.get_json()
         
         # Prepare update fields
-        update_fields = {}
-        
-        if 'name' in data and data['name']:
-            update_fields['name'] = data['name']
-        
-        if 'phone_number' in data:
-            update_fields['phone_number'] = data['phone_number']
-        
-        if 'profile_picture' in data:
-            update_fields['profile_picture'] = data['profile_picture']
-        
-        if not update_fields:
-            return jsonify({'error': 'No fields to update'}), 400
+        try:
+            update_fields = profile_update(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Update user
         result = users_collection.update_one(
@@ -189,19 +204,16 @@ def update_profile():
         if result.modified_count == 0:
             return jsonify({'error': 'No changes made'}), 400
         
-        # Get updated user
-        updated_user = users_collection.find_one({'_id': ObjectId(user_id)})
-        user_data = {
-            'id': str(updated_user['_id']),
-            'email': updated_user['email'],
-            'name': updated_user['name'],
-            'profile_picture': updated_user.get('profile_picture'),
-            'phone_number': updated_user.get('phone_number')
-        }
+        # Get updated user, refreshing this process's cached profile
+        profile_cache.invalidate(user_id)
+        updated_user = users_collection.find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+        profile_cache.set(user_id, updated_user)
         
+        # A new token carries the changed claims for stateless /verify
         return jsonify({
             'message': 'Profile updated successfully',
-            'user': user_data
+            'user': public_user(updated_user, request.host_url, details=True),
+            'token': create_access_token(identity=user_id, additional_claims=profile_claims(updated_user))
         }), 200
         
     except Exception as e:
@@ -218,26 +230,57 @@ def change_password():
         if not all(key in data for key in ['current_password', 'new_password']):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Find user
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        # Find user; only the hash is needed, and it is never cached
+        user = users_collection.find_one({'_id': ObjectId(user_id)}, {'password': 1})
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Verify current password
-        if not User.verify_password(user['password'], data['current_password']):
+        if not User.verify_password(data['current_password'], user['password']):
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         # Hash new password
-        new_hashed_password = User('temp@temp.com', data['new_password'], 'temp').password
+        new_hashed_password = User.hash_password(data['new_password'])
         
         # Update password
         users_collection.update_one(
             {'_id': ObjectId(user_id)},
             {'$set': {'password': new_hashed_password}}
         )
+        profile_cache.invalidate(user_id)
         
         return jsonify({'message': 'Password changed successfully'}), 200
         
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/avatar/<digest>', methods=['GET'])
+def get_avatar(digest):
+    size = request.args.get('size', DEFAULT_SIZE)
+    if not AVATAR_DIGEST.match(digest) or size not in AVATAR_SIZES:
+        abort(404)
+    
+    # File names are content hashes, so a URL never changes meaning
+    response = send_from_directory(UPLOAD_FOLDER, avatar_filename(digest, size), max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@auth_bp.route('/hashing-stats', methods=['GET'])
+def get_hashing_stats():
+    # Process-wide stats, so they need the /metrics token rather than a login
+    denied = check_token(current_app.config, request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({'hashing': hasher.stats()}), 200
+
+@auth_bp.route('/cache-stats', methods=['GET'])
+def get_profile_cache_stats():
+    # Process-wide stats, so they need the /metrics token rather than a login
+    denied = check_token(current_app.config, request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({'profile_cache': profile_cache.stats()}), 200
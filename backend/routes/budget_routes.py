@@ -0,0 +1,70 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from database import budgets_collection, monthly_rollups_reads
+from services.budgets import COUNTER_PROJECTION, parse_month, parse_amount, utilization
+from services.fx import user_converter
+from datetime import datetime
+
+budget_bp = Blueprint('budget', __name__)
+
+@budget_bp.route('', methods=['GET'])
+@jwt_required()
+def get_budgets():
+    try:
+        user_id = get_jwt_identity()
+        month = parse_month(request.args.get('month'))
+        
+        budgets = budgets_collection.find({'user_id': user_id}, {'category': 1, 'amount': 1})
+        # The month's expense counters, one prefix scan of the rollups index
+        counters = monthly_rollups_reads.find(
+            {'user_id': user_id, 'month': month, 'kind': 'expense'},
+            COUNTER_PROJECTION
+        )
+        
+        return jsonify(utilization(budgets, counters, month, user_converter(user_id))), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@budget_bp.route('/<category>', methods=['PUT'])
+@jwt_required()
+def set_budget(category):
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if 'amount' not in data:
+            return jsonify({'error': 'Missing required fields'}), 400
+        amount = parse_amount(data['amount'])
+        
+        now = datetime.utcnow()
+        budgets_collection.update_one(
+            {'user_id': user_id, 'category': category},
+            {'$set': {'amount': amount, 'updated_at': now}, '$setOnInsert': {'created_at': now}},
+            upsert=True
+        )
+        
+        return jsonify({'message': 'Budget saved successfully', 'category': category, 'amount': amount}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@budget_bp.route('/<category>', methods=['DELETE'])
+@jwt_required()
+def delete_budget(category):
+    try:
+        user_id = get_jwt_identity()
+        
+        result = budgets_collection.delete_one({'user_id': user_id, 'category': category})
+        
+        if result.deleted_count == 0:
+            return jsonify({'error': 'Budget not found'}), 404
+        
+        return jsonify({'message': 'Budget deleted successfully'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,7 +1,17 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from database import incomes_collection, expenses_collection
+from database import (incomes_reads, expenses_reads, monthly_rollups_reads, recurring_rules_collection,
+                      transaction_buckets_reads)
+from services.summary import build_summary
+from services.cache import summary_cache
+from services.fx import user_converter
+from services.serialization import dumps
+from services.rollups import month_range, build_trends, in_base_currency
+from services.analytics import analytics_pipeline, archived_pipeline, merge_groups, build_analytics
+from services.schedule import upcoming
+from services.metrics import check_token
 from datetime import datetime, timedelta
+import hashlib
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -11,56 +21,116 @@ def get_summary():
     try:
         user_id = get_jwt_identity()
         
-        # Get all incomes and expenses
-        incomes = list(incomes_collection.find({'user_id': user_id}))
-        expenses = list(expenses_collection.find({'user_id': user_id}))
-        
-        # Calculate totals
-        total_income = sum(income['amount'] for income in incomes)
-        total_expense = sum(expense['amount'] for expense in expenses)
-        balance = total_income - total_expense
-        
-        # Get recent transactions
-        recent_incomes = list(incomes_collection.find({'user_id': user_id}).sort('date', -1).limit(5))
-        recent_expenses = list(expenses_collection.find({'user_id': user_id}).sort('date', -1).limit(5))
-        
-        # Convert ObjectId to string
-        for income in recent_incomes:
-            income['_id'] = str(income['_id'])
-            income['type'] = 'income'
-        
-        for expense in recent_expenses:
-            expense['_id'] = str(expense['_id'])
-            expense['type'] = 'expense'
-        
-        # Get category-wise breakdown
-        income_by_category = {}
-        for income in incomes:
-            category = income['category']
-            income_by_category[category] = income_by_category.get(category, 0) + income['amount']
-        
-        expense_by_category = {}
-        for expense in expenses:
-            category = expense['category']
-            expense_by_category[category] = expense_by_category.get(category, 0) + expense['amount']
-        
-        return jsonify({
-            'summary': {
-                'total_income': total_income,
-                'total_expense': total_expense,
-                'balance': balance,
-                'income_count': len(incomes),
-                'expense_count': len(expenses)
-            },
-            'recent_transactions': {
-                'incomes': recent_incomes,
-                'expenses': recent_expenses
-            },
-            'category_breakdown': {
-                'income': income_by_category,
-                'expense': expense_by_category
-            }
-        }), 200
+        # Converted totals are memoized per base currency and rate table version
+        convert = user_converter(user_id)
+        
+        # Read the version first so a write landing mid-computation leaves
+        # this entry stored under an already stale version
+        version = summary_cache.version(user_id)
+        cached = summary_cache.get(user_id, version, convert.key)
+        
+        if cached is None:
+            summary = build_summary(user_id, incomes_reads, expenses_reads, transaction_buckets_reads, convert)
+            body = dumps(summary)
+            etag = hashlib.sha1(body).hexdigest()
+            summary_cache.set(user_id, version, etag, body, convert.key)
+        else:
+            etag, body = cached
+        
+        # Browsers revalidate every time and get an empty 304 when unchanged
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/trends', methods=['GET'])
+@jwt_required()
+def get_trends():
+    try:
+        user_id = get_jwt_identity()
+        
+        months = request.args.get('months', 12, type=int)
+        if months < 1 or months > 120:
+            return jsonify({'error': 'months must be between 1 and 120'}), 400
+        
+        # Read only the precomputed monthly rollups, never the raw transactions
+        window = month_range(months)
+        rows = monthly_rollups_reads.find({
+            'user_id': user_id,
+            'month': {'$gte': window[0], '$lte': window[-1]}
+        })
+        # Counters are per currency; each month converts at its closing rate
+        convert = user_converter(user_id)
+        rows, missing = in_base_currency(rows, convert)
+        
+        return jsonify({'trends': build_trends(rows, window), 'currency': convert.base,
+                        'missing_rates': missing}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/analytics', methods=['GET'])
+@jwt_required()
+def get_analytics():
+    try:
+        user_id = get_jwt_identity()
+        
+        months = request.args.get('months', 12, type=int)
+        if months < 1 or months > 120:
+            return jsonify({'error': 'months must be between 1 and 120'}), 400
+        
+        # Archived months come from the buckets, merged per category
+        expense_groups = merge_groups(
+            expenses_reads.aggregate(analytics_pipeline(user_id)),
+            transaction_buckets_reads.aggregate(archived_pipeline(user_id, 'expense'))
+        )
+        income_groups = merge_groups(
+            incomes_reads.aggregate(analytics_pipeline(user_id)),
+            transaction_buckets_reads.aggregate(archived_pipeline(user_id, 'income'))
+        )
+        
+        convert = user_converter(user_id)
+        analytics = build_analytics(expense_groups, income_groups, months, convert=convert)
+        analytics['currency'] = convert.base
+        
+        return jsonify(analytics), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/upcoming', methods=['GET'])
+@jwt_required()
+def get_upcoming():
+    try:
+        user_id = get_jwt_identity()
+        
+        days = request.args.get('days', 30, type=int)
+        if days < 1 or days > 366:
+            return jsonify({'error': 'days must be between 1 and 366'}), 400
+        
+        # Projected from the rules on the fly; nothing is written until the
+        # materializer reaches each date
+        through = datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(days=days)
+        rules = recurring_rules_collection.find({
+            'user_id': user_id,
+            'active': True,
+            'next_date': {'$ne': None, '$lte': through}
+        })
+        
+        convert = user_converter(user_id)
+        return jsonify(upcoming(rules, through, convert)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    # Process-wide stats, so they need the /metrics token rather than a login
+    denied = check_token(current_app.config, request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({'summary_cache': summary_cache.stats()}), 200
@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
-from database import expenses_collection
-from models.expense import Expense
+from database import expenses_collection, expenses_reads, transaction_buckets_reads
+from services.changes import record_changes
+from services.sync import stamp, record_deletes
+from services.budgets import check_budget
+from services.bulk_import import parse_import_request, import_transactions
+from services.listing import parse_list_args, find_page, stream_page
+from services.archive import with_archive, restore
+from services.transactions import build_create, build_update
 from datetime import datetime
 
 expense_bp = Blueprint('expense', __name__)
@@ -14,27 +20,37 @@ def create_expense():
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Validate required fields
-        if not all(key in data for key in ['title', 'amount', 'category', 'date']):
-            return jsonify({'error': 'Missing required fields'}), 400
-        
-        # Create expense
-        expense = Expense(
-            user_id=user_id,
-            title=data['title'],
-            amount=data['amount'],
-            category=data['category'],
-            date=data['date'],
-            description=data.get('description', '')
-        )
-        
-        result = expenses_collection.insert_one(expense.to_dict())
+        # Validated and coerced the same way by every write path
+        document = stamp(user_id, [build_create('expense', user_id, data)])[0]
+        result = expenses_collection.insert_one(document)
+        record_changes('expense', user_id, added=[document])
         
         return jsonify({
             'message': 'Expense created successfully',
-            'expense_id': str(result.inserted_id)
+            'expense_id': str(result.inserted_id),
+            'budget': check_budget(user_id, document)
         }), 201
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@expense_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_expenses():
+    try:
+        user_id = get_jwt_identity()
+        stream, fmt, batch_size = parse_import_request(request)
+        
+        # Rows that fail validation or insertion are reported, not fatal
+        report = import_transactions(stream, fmt, 'expense', user_id, expenses_collection, batch_size)
+        
+        # A fatal error still reports the rows that went in before it
+        return jsonify(report.to_dict()), 500 if report.fatal else 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -43,15 +59,17 @@ def create_expense():
 def get_expenses():
     try:
         user_id = get_jwt_identity()
-        expenses = list(expenses_collection.find({'user_id': user_id}).sort('date', -1))
+        options = parse_list_args(request.args)
         
-        # Convert ObjectId to string
-        for expense in expenses:
-            expense['_id'] = str(expense['_id'])
-            expense['created_at'] = expense['created_at'].isoformat()
+        # Newest first, one page at a time when ?limit= is given; rows in
+        # archived months are merged in from their buckets
+        cursor = with_archive(find_page(expenses_reads, user_id, options), transaction_buckets_reads,
+                              user_id, 'expense', options)
         
-        return jsonify({'expenses': expenses}), 200
+        return stream_page('expenses', cursor, options['limit'], options['format'])
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -61,14 +79,18 @@ def delete_expense(expense_id):
     try:
         user_id = get_jwt_identity()
         
-        result = expenses_collection.delete_one({
-            '_id': ObjectId(expense_id),
-            'user_id': user_id
-        })
+        query = {'_id': ObjectId(expense_id), 'user_id': user_id}
+        deleted = expenses_collection.find_one_and_delete(query)
+        # Rows in archived months move back to expenses before they change
+        if deleted is None and restore(user_id, 'expense', query['_id']):
+            deleted = expenses_collection.find_one_and_delete(query)
         
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({'error': 'Expense not found'}), 404
         
+        record_changes('expense', user_id, removed=[deleted])
+        record_deletes('expense', user_id, [deleted['_id']])
+        
         return jsonify({'message': 'Expense deleted successfully'}), 200
         
     except Exception as e:
@@ -81,27 +103,24 @@ def update_expense(expense_id):
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        update_data = {}
-        if 'title' in data:
-            update_data['title'] = data['title']
-        if 'amount' in data:
-            update_data['amount'] = float(data['amount'])
-        if 'category' in data:
-            update_data['category'] = data['category']
-        if 'date' in data:
-            update_data['date'] = data['date']
-        if 'description' in data:
-            update_data['description'] = data['description']
-        
-        result = expenses_collection.update_one(
-            {'_id': ObjectId(expense_id), 'user_id': user_id},
-            {'$set': update_data}
-        )
-        
-        if result.matched_count == 0:
+        update_data = stamp(user_id, [build_update(data)])[0]
+        
+        # The pre-update document is needed to move its amount out of the rollups
+        query = {'_id': ObjectId(expense_id), 'user_id': user_id}
+        previous = expenses_collection.find_one_and_update(query, {'$set': update_data})
+        if previous is None and restore(user_id, 'expense', query['_id']):
+            previous = expenses_collection.find_one_and_update(query, {'$set': update_data})
+        
+        if previous is None:
             return jsonify({'error': 'Expense not found'}), 404
         
-        return jsonify({'message': 'Expense updated successfully'}), 200
+        updated = {**previous, **update_data}
+        record_changes('expense', user_id, removed=[previous], added=[updated])
+        
+        return jsonify({'message': 'Expense updated successfully',
+                        'budget': check_budget(user_id, updated)}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
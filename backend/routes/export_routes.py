@@ -0,0 +1,56 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from database import incomes_collection, expenses_collection, transaction_buckets_collection
+from services.export import ENCODERS, transaction_stream, export_chunks
+from services.archive import archived_stream
+from services.fx import user_converter
+from models.dates import date_range
+
+export_bp = Blueprint('export', __name__)
+
+@export_bp.route('', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    try:
+        user_id = get_jwt_identity()
+        
+        fmt = request.args.get('format', 'csv')
+        if fmt not in ENCODERS:
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        
+        options = {'date_from': request.args.get('from'), 'date_to': request.args.get('to')}
+        # Validate before any cursor is read
+        date_range(options['date_from'], options['date_to'])
+        
+        # ?gzip=1 downloads a .gz file; otherwise gzip transparently when the client accepts it
+        as_file = request.args.get('gzip') in ('1', 'true')
+        as_encoding = not as_file and 'gzip' in request.accept_encodings
+        
+        # All cursors are merged lazily, so memory does not grow with history
+        # size; archived months are read one bucket at a time
+        streams = (
+            transaction_stream(incomes_collection, 'income', user_id, options),
+            transaction_stream(expenses_collection, 'expense', user_id, options),
+            archived_stream(transaction_buckets_collection, 'income', user_id, options),
+            archived_stream(transaction_buckets_collection, 'expense', user_id, options)
+        )
+        # base_amount is in the user's base currency, converted in batches
+        chunks = export_chunks(streams, fmt, compress=as_file or as_encoding, convert=user_converter(user_id))
+        
+        filename = 'transactions.%s' % fmt
+        mimetype = ENCODERS[fmt][1]
+        if as_file:
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+        response.headers['Content-Disposition'] = 'attachment; filename=%s' % filename
+        if as_encoding:
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+        return response
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
-from database import incomes_collection
-from models.income import Income
+from database import incomes_collection, incomes_reads, transaction_buckets_reads
+from services.changes import record_changes
+from services.sync import stamp, record_deletes
+from services.bulk_import import parse_import_request, import_transactions
+from services.listing import parse_list_args, find_page, stream_page
+from services.archive import with_archive, restore
+from services.transactions import build_create, build_update
 from datetime import datetime
 
 income_bp = Blueprint('income', __name__)
@@ -14,27 +19,36 @@ def create_income():
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Validate required fields
-        if not all(key in data for key in ['title', 'amount', 'category', 'date']):
-            return jsonify({'error': 'Missing required fields'}), 400
-        
-        # Create income
-        income = Income(
-            user_id=user_id,
-            title=data['title'],
-            amount=data['amount'],
-            category=data['category'],
-            date=data['date'],
-            description=data.get('description', '')
-        )
-        
-        result = incomes_collection.insert_one(income.to_dict())
+        # Validated and coerced the same way by every write path
+        document = stamp(user_id, [build_create('income', user_id, data)])[0]
+        result = incomes_collection.insert_one(document)
+        record_changes('income', user_id, added=[document])
         
         return jsonify({
             'message': 'Income created successfully',
             'income_id': str(result.inserted_id)
         }), 201
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@income_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_incomes():
+    try:
+        user_id = get_jwt_identity()
+        stream, fmt, batch_size = parse_import_request(request)
+        
+        # Rows that fail validation or insertion are reported, not fatal
+        report = import_transactions(stream, fmt, 'income', user_id, incomes_collection, batch_size)
+        
+        # A fatal error still reports the rows that went in before it
+        return jsonify(report.to_dict()), 500 if report.fatal else 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -43,15 +57,17 @@ def create_income():
 def get_incomes():
     try:
         user_id = get_jwt_identity()
-        incomes = list(incomes_collection.find({'user_id': user_id}).sort('date', -1))
+        options = parse_list_args(request.args)
         
-        # Convert ObjectId to string
-        for income in incomes:
-            income['_id'] = str(income['_id'])
-            income['created_at'] = income['created_at'].isoformat()
+        # Newest first, one page at a time when ?limit= is given; rows in
+        # archived months are merged in from their buckets
+        cursor = with_archive(find_page(incomes_reads, user_id, options), transaction_buckets_reads,
+                              user_id, 'income', options)
         
-        return jsonify({'incomes': incomes}), 200
+        return stream_page('incomes', cursor, options['limit'], options['format'])
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -61,14 +77,18 @@ def delete_income(income_id):
     try:
         user_id = get_jwt_identity()
         
-        result = incomes_collection.delete_one({
-            '_id': ObjectId(income_id),
-            'user_id': user_id
-        })
+        query = {'_id': ObjectId(income_id), 'user_id': user_id}
+        deleted = incomes_collection.find_one_and_delete(query)
+        # Rows in archived months move back to incomes before they change
+        if deleted is None and restore(user_id, 'income', query['_id']):
+            deleted = incomes_collection.find_one_and_delete(query)
         
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({'error': 'Income not found'}), 404
         
+        record_changes('income', user_id, removed=[deleted])
+        record_deletes('income', user_id, [deleted['_id']])
+        
         return jsonify({'message': 'Income deleted successfully'}), 200
         
     except Exception as e:
@@ -81,27 +101,22 @@ def update_income(income_id):
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        update_data = {}
-        if 'title' in data:
-            update_data['title'] = data['title']
-        if 'amount' in data:
-            update_data['amount'] = float(data['amount'])
-        if 'category' in data:
-            update_data['category'] = data['category']
-        if 'date' in data:
-            update_data['date'] = data['date']
-        if 'description' in data:
-            update_data['description'] = data['description']
-        
-        result = incomes_collection.update_one(
-            {'_id': ObjectId(income_id), 'user_id': user_id},
-            {'$set': update_data}
-        )
-        
-        if result.matched_count == 0:
+        update_data = stamp(user_id, [build_update(data)])[0]
+        
+        # The pre-update document is needed to move its amount out of the rollups
+        query = {'_id': ObjectId(income_id), 'user_id': user_id}
+        previous = incomes_collection.find_one_and_update(query, {'$set': update_data})
+        if previous is None and restore(user_id, 'income', query['_id']):
+            previous = incomes_collection.find_one_and_update(query, {'$set': update_data})
+        
+        if previous is None:
             return jsonify({'error': 'Income not found'}), 404
         
+        record_changes('income', user_id, removed=[previous], added=[{**previous, **update_data}])
+        
         return jsonify({'message': 'Income updated successfully'}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
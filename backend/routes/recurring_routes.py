@@ -0,0 +1,135 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database import recurring_rules_collection
+from services.schedule import next_occurrence, serialize_rule
+from models.recurring import RecurringRule
+from models.dates import parse_date
+from models.currency import parse_currency
+
+recurring_bp = Blueprint('recurring', __name__)
+
+@recurring_bp.route('', methods=['POST'])
+@jwt_required()
+def create_rule():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not all(key in data for key in RecurringRule.REQUIRED_FIELDS):
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        rule = RecurringRule(
+            user_id=user_id,
+            type=data['type'],
+            title=data['title'],
+            amount=data['amount'],
+            category=data['category'],
+            frequency=data['frequency'],
+            start=data['start'],
+            interval=data.get('interval', 1),
+            until=data.get('until'),
+            count=data.get('count'),
+            description=data.get('description', ''),
+            currency=data.get('currency')
+        )
+        
+        # Occurrences up to today are written by the next materializer run
+        result = recurring_rules_collection.insert_one(rule.to_dict())
+        
+        return jsonify({
+            'message': 'Recurring rule created successfully',
+            'rule_id': str(result.inserted_id)
+        }), 201
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recurring_bp.route('', methods=['GET'])
+@jwt_required()
+def get_rules():
+    try:
+        user_id = get_jwt_identity()
+        
+        rules = recurring_rules_collection.find({'user_id': user_id}).sort('created_at', -1)
+        
+        return jsonify({'rules': [serialize_rule(rule) for rule in rules]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recurring_bp.route('/<rule_id>', methods=['PUT'])
+@jwt_required()
+def update_rule(rule_id):
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        update_data = {key: data[key] for key in RecurringRule.EDITABLE_FIELDS if key in data}
+        if 'amount' in update_data:
+            update_data['amount'] = float(update_data['amount'])
+        if 'currency' in update_data:
+            update_data['currency'] = parse_currency(update_data['currency'])
+        if 'active' in update_data:
+            update_data['active'] = bool(update_data['active'])
+        if 'until' in update_data:
+            # null or '' clears the end date; anything else must be a date
+            until = update_data['until']
+            update_data['until'] = parse_date(until) if until not in (None, '') else None
+        if not update_data:
+            return jsonify({'error': 'Nothing to update'}), 400
+        
+        query = {'_id': ObjectId(rule_id), 'user_id': user_id}
+        if update_data.get('until') is not None:
+            # `start` never changes, so checking it in the filter is enough
+            query['start'] = {'$lte': update_data['until']}
+        rule = recurring_rules_collection.find_one_and_update(
+            query,
+            {'$set': update_data},
+            return_document=ReturnDocument.AFTER
+        )
+        
+        if rule is None:
+            if 'start' in query and recurring_rules_collection.count_documents(
+                    {'_id': query['_id'], 'user_id': user_id}, limit=1):
+                return jsonify({'error': 'until must not be before start'}), 400
+            return jsonify({'error': 'Recurring rule not found'}), 404
+        
+        if 'until' in update_data:
+            # Moving `until` can end the rule early or bring it back to life
+            next_date = next_occurrence(rule, rule['next_index'])
+            if next_date != rule['next_date']:
+                recurring_rules_collection.update_one(
+                    {'_id': rule['_id'], 'next_index': rule['next_index']},
+                    {'$set': {'next_date': next_date}}
+                )
+        
+        return jsonify({'message': 'Recurring rule updated successfully'}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recurring_bp.route('/<rule_id>', methods=['DELETE'])
+@jwt_required()
+def delete_rule(rule_id):
+    try:
+        user_id = get_jwt_identity()
+        
+        # Transactions it already produced are kept
+        result = recurring_rules_collection.delete_one({
+            '_id': ObjectId(rule_id),
+            'user_id': user_id
+        })
+        
+        if result.deleted_count == 0:
+            return jsonify({'error': 'Recurring rule not found'}), 404
+        
+        return jsonify({'message': 'Recurring rule deleted successfully'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,84 @@
+import os
+from bson import ObjectId
+from flask import Blueprint, request, jsonify, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.reports import (REPORT_FORMATS, ReportLimit, ReportsBusy, request_report, find_job, recent_jobs,
+                              job_response, report_path)
+
+report_bp = Blueprint('report', __name__)
+
+@report_bp.route('', methods=['POST'])
+@jwt_required()
+def create_report():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+
+        if 'period' not in data:
+            return jsonify({'error': 'Missing required fields'}), 400
+
+        job, created = request_report(user_id, data['period'], data.get('format', 'csv'))
+
+        # 200 for a report that is already built, 202 while it is queued or running
+        code = 200 if job['status'] == 'done' else 202
+        return jsonify({'report': job_response(job), 'created': created}), code
+
+    except ReportLimit as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    except ReportsBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@report_bp.route('', methods=['GET'])
+@jwt_required()
+def get_reports():
+    try:
+        user_id = get_jwt_identity()
+
+        reports = [job_response(job) for job in recent_jobs(user_id)]
+
+        return jsonify({'reports': reports}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@report_bp.route('/<report_id>', methods=['GET'])
+@jwt_required()
+def get_report(report_id):
+    try:
+        user_id = get_jwt_identity()
+
+        job = find_job(user_id, ObjectId(report_id))
+        if not job:
+            return jsonify({'error': 'Report not found'}), 404
+
+        return jsonify({'report': job_response(job)}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@report_bp.route('/<report_id>/download', methods=['GET'])
+@jwt_required()
+def download_report(report_id):
+    try:
+        user_id = get_jwt_identity()
+
+        job = find_job(user_id, ObjectId(report_id))
+        if not job:
+            return jsonify({'error': 'Report not found'}), 404
+        if job['status'] != 'done':
+            return jsonify({'error': 'Report is %s' % job['status'], 'report': job_response(job)}), 409
+
+        path = report_path(job)
+        if not os.path.exists(path):
+            return jsonify({'error': 'Report has expired, please request it again'}), 410
+
+        filename = 'statement-%s.%s' % (job['period'], job['format'])
+        return send_file(path, mimetype=REPORT_FORMATS[job['format']], as_attachment=True,
+                         download_name=filename)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,31 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.sync import TokenExpired, parse_token, current_token, sync_changes
+from config import Config
+
+sync_bp = Blueprint('sync', __name__)
+
+@sync_bp.route('', methods=['GET'])
+@jwt_required()
+def get_sync():
+    try:
+        user_id = get_jwt_identity()
+        
+        # Without a token, only hand out the starting position
+        if 'since' not in request.args:
+            return jsonify({'changes': [], 'deleted': [], 'has_more': False,
+                            'token': str(current_token(user_id))}), 200
+        
+        since = parse_token(request.args['since'])
+        limit = request.args.get('limit', Config.SYNC_PAGE_SIZE, type=int)
+        if limit < 1 or limit > Config.SYNC_PAGE_SIZE:
+            return jsonify({'error': 'limit must be between 1 and %d' % Config.SYNC_PAGE_SIZE}), 400
+        
+        return jsonify(sync_changes(user_id, since, limit)), 200
+        
+    except TokenExpired:
+        return jsonify({'error': 'Sync token expired, reload all transactions', 'reset': True}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
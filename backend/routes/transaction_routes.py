@@ -0,0 +1,62 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from database import incomes_reads, expenses_reads, search_index_reads, transaction_buckets_reads
+from services.batch import run_batch
+from services.feed import parse_feed_args, merged_page
+from services.listing import stream_page
+from services.search import parse_search_args, search
+
+transactions_bp = Blueprint('transactions', __name__)
+
+@transactions_bp.route('', methods=['GET'])
+@jwt_required()
+def get_transactions():
+    try:
+        user_id = get_jwt_identity()
+        options = parse_feed_args(request.args)
+        
+        # Incomes and expenses in one newest-first page, merged server side
+        rows = merged_page({'income': incomes_reads, 'expense': expenses_reads}, user_id, options,
+                           transaction_buckets_reads)
+        
+        return stream_page('transactions', rows, options['limit'], options['format'])
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@transactions_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_transactions():
+    try:
+        user_id = get_jwt_identity()
+        options = parse_search_args(request.args)
+        
+        # Every word matches as a prefix, so partial input works for typeahead
+        return jsonify(search(search_index_reads, user_id, options)), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@transactions_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_transactions():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True)
+        transaction = bool(isinstance(data, dict) and data.get('transaction'))
+        
+        # One bulk_write per collection instead of a request per row
+        ok, results = run_batch(data, user_id, transaction=transaction)
+        
+        # An aborted transaction applied nothing; the results say why
+        status = 409 if transaction and not ok else 200
+        return jsonify({'ok': ok, 'results': results}), status
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
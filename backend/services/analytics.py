@@ -0,0 +1,252 @@
+from datetime import date
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+ROLLING_WINDOW = 3
+ANOMALY_Z = 3.0
+# Categories with fewer transactions than this are too small to flag outliers in
+ANOMALY_MIN_COUNT = 8
+MAX_ANOMALIES = 20
+
+
+def analytics_pipeline(user_id):
+    """One document per category holding its amounts and dates as arrays.
+
+    Decoding a handful of large BSON arrays happens in the driver's C code,
+    which is far cheaper than materializing one dict per transaction.
+    """
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$group': {
+            '_id': '$category',
+            'amounts': {'$push': '$amount'},
+            # Milliseconds since the epoch; legacy string dates are parsed too
+            'timestamps': {'$push': {'$toLong': {'$toDate': '$date'}}},
+            # null for rows in the user's base currency
+            'currencies': {'$push': {'$ifNull': ['$currency', None]}},
+        }},
+    ]
+
+
+def archived_pipeline(user_id, kind):
+    """analytics_pipeline over the entries of a user's archive buckets."""
+    return [
+        {'$match': {'user_id': user_id, 'kind': kind}},
+        {'$unwind': '$entries'},
+        {'$group': {
+            '_id': '$entries.category',
+            'amounts': {'$push': '$entries.amount'},
+            'timestamps': {'$push': {'$toLong': '$entries.date'}},
+            'currencies': {'$push': {'$ifNull': ['$entries.currency', None]}},
+        }},
+    ]
+
+
+def merge_groups(*group_lists):
+    """Concatenate the per-category arrays of several pipeline results."""
+    merged = {}
+    for groups in group_lists:
+        for group in groups:
+            into = merged.get(group['_id'])
+            if into is None:
+                merged[group['_id']] = group
+            else:
+                into['currencies'] = group_currencies(into) + group_currencies(group)
+                into['amounts'] = into['amounts'] + group['amounts']
+                into['timestamps'] = into['timestamps'] + group['timestamps']
+    return list(merged.values())
+
+
+def group_currencies(group):
+    return group.get('currencies') or [None] * len(group['amounts'])
+
+
+class Transactions:
+    """Column arrays for one collection: amount, month index and category code.
+
+    With `convert`, amounts are converted to the base currency in one
+    vectorized pass; rows in currencies without rates are dropped.
+    """
+
+    def __init__(self, groups, convert=None):
+        groups = list(groups)
+        self.categories = [group['_id'] if group['_id'] is not None else 'Other' for group in groups]
+        counts = np.array([len(group['amounts']) for group in groups], dtype=np.int64)
+        if len(groups):
+            self.amounts = np.concatenate([np.asarray(group['amounts'], dtype=np.float64) for group in groups])
+            timestamps = np.concatenate([np.asarray(group['timestamps'], dtype=np.int64) for group in groups])
+        else:
+            self.amounts = np.empty(0, dtype=np.float64)
+            timestamps = np.empty(0, dtype=np.int64)
+        self.dates = timestamps.astype('datetime64[ms]')
+        # Groups are concatenated in order, so each category is one contiguous run
+        self.codes = np.repeat(np.arange(len(groups)), counts)
+        if convert is not None and len(groups):
+            currencies = [code for group in groups for code in group_currencies(group)]
+            self.amounts = convert(self.amounts, currencies, self.dates)
+            known = ~np.isnan(self.amounts)
+            if not known.all():
+                self.amounts, self.dates, self.codes = self.amounts[known], self.dates[known], self.codes[known]
+        # Months since 1970-01, the integer form of datetime64[M]
+        self.months = self.dates.astype('datetime64[M]').astype(np.int64)
+
+
+def month_index(today):
+    return (today.year - 1970) * 12 + today.month - 1
+
+
+def month_label(index):
+    return '%04d-%02d' % (1970 + index // 12, index % 12 + 1)
+
+
+def monthly_totals(data, first, last):
+    """Sum of amounts per month for months first..last inclusive."""
+    mask = (data.months >= first) & (data.months <= last)
+    return np.bincount(data.months[mask] - first, weights=data.amounts[mask], minlength=last - first + 1)
+
+
+def rolling_mean(values, window):
+    """Trailing mean; NaN until `window` values are available."""
+    result = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.insert(values, 0, 0.0))
+        result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def month_over_month(values):
+    change = np.full(values.shape, np.nan)
+    change_pct = np.full(values.shape, np.nan)
+    if len(values) > 1:
+        change[1:] = np.diff(values)
+        previous = values[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_pct[1:] = np.where(previous > 0, change[1:] / previous * 100, np.nan)
+    return change, change_pct
+
+
+def category_stats(data):
+    """Count, total, mean and percentiles per category from one sort."""
+    count = len(data.categories)
+    counts = np.bincount(data.codes, minlength=count)
+    totals = np.bincount(data.codes, weights=data.amounts, minlength=count)
+    stats = {'count': counts, 'total': totals}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['mean'] = totals / counts
+
+    # Each category is already a contiguous run, so sorting every run in
+    # place lets the percentiles be interpolated inside all runs at once
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ordered = np.concatenate([np.sort(run) for run in np.split(data.amounts, starts[1:])] or [data.amounts])
+    nonempty = counts > 0
+    for q in PERCENTILES:
+        position = starts + (counts - 1).clip(min=0) * (q / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        values = np.full(count, np.nan)
+        if nonempty.any():
+            low, high, position = low[nonempty], high[nonempty], position[nonempty]
+            values[nonempty] = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+        stats['p%d' % q] = values
+    return stats
+
+
+def anomalies(data, stats, first):
+    """Transactions in the window whose amount is a z-score outlier for its category."""
+    count = len(data.categories)
+    counts = stats['count']
+    squares = np.bincount(data.codes, weights=data.amounts ** 2, minlength=count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = squares / counts - stats['mean'] ** 2
+        std = np.sqrt(np.clip(variance, 0, None))
+        z = (data.amounts - stats['mean'][data.codes]) / std[data.codes]
+
+    flagged = ((np.abs(z) >= ANOMALY_Z) & (counts[data.codes] >= ANOMALY_MIN_COUNT)
+               & (std[data.codes] > 0) & (data.months >= first))
+    indexes = np.flatnonzero(flagged)
+    indexes = indexes[np.argsort(-np.abs(z[indexes]))][:MAX_ANOMALIES]
+    return [{
+        'date': str(data.dates[i].astype('datetime64[D]')),
+        'category': data.categories[data.codes[i]],
+        'amount': round(float(data.amounts[i]), 2),
+        'z_score': round(float(z[i]), 2),
+    } for i in indexes]
+
+
+def forecast(history, first, target):
+    """Linear trend over complete months, scaled by a seasonal factor when
+    there are at least two years of history.
+
+    `history` holds monthly totals for months first..target-2 (the month
+    before the current one); `target` is next month.
+    """
+    if len(history) < 2:
+        return {'month': month_label(target), 'expense': None, 'method': None}
+
+    recent = history[-12:]
+    x = np.arange(len(history) - len(recent), len(history))
+    slope, intercept = np.polyfit(x, recent, 1)
+    step = len(history) + 1  # target is two months after the last complete one
+    value = slope * step + intercept
+    method = 'linear'
+
+    if len(history) >= 24:
+        # Same calendar month in previous years relative to those years' average
+        same_month = np.arange(target - 12 - first, -1, -12)
+        same_month = same_month[same_month < len(history)]
+        sums = np.concatenate(([0.0], np.cumsum(history)))
+        starts = np.maximum(same_month - 11, 0)
+        yearly = (sums[same_month + 1] - sums[starts]) / (same_month + 1 - starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factors = history[same_month] / yearly
+        factors = factors[np.isfinite(factors)]
+        if len(factors):
+            value *= factors.mean()
+            method = 'linear+seasonal'
+
+    return {'month': month_label(target), 'expense': round(max(float(value), 0.0), 2), 'method': method}
+
+
+def rounded(values):
+    return [None if np.isnan(value) else round(float(value), 2) for value in values]
+
+
+def build_analytics(expense_groups, income_groups, months=12, today=None, convert=None):
+    """Spending statistics for the last `months` months from the grouped
+    arrays produced by analytics_pipeline, in convert.base when given."""
+    expenses = Transactions(expense_groups, convert)
+    incomes = Transactions(income_groups, convert)
+    current = month_index(today or date.today())
+    first = current - months + 1
+
+    expense_series = monthly_totals(expenses, first, current)
+    income_series = monthly_totals(incomes, first, current)
+    change, change_pct = month_over_month(expense_series)
+
+    stats = category_stats(expenses)
+    order = np.argsort(-stats['total'])
+    categories = [{
+        'category': expenses.categories[i],
+        'count': int(stats['count'][i]),
+        'total': round(float(stats['total'][i]), 2),
+        'mean': round(float(stats['mean'][i]), 2),
+        **{'p%d' % q: round(float(stats['p%d' % q][i]), 2) for q in PERCENTILES},
+    } for i in order if stats['count'][i]]
+
+    # The current month is still in progress, so the forecast fits complete months only
+    history_start = int(expenses.months.min()) if len(expenses.months) else current
+    history = monthly_totals(expenses, history_start, current - 1) if history_start < current else np.empty(0)
+
+    return {
+        'months': [month_label(index) for index in range(first, current + 1)],
+        'monthly': {
+            'expense': rounded(expense_series),
+            'income': rounded(income_series),
+            'rolling_average': rounded(rolling_mean(expense_series, ROLLING_WINDOW)),
+            'change': rounded(change),
+            'change_pct': rounded(change_pct),
+        },
+        'categories': categories,
+        'anomalies': anomalies(expenses, stats, first),
+        'forecast': forecast(history, history_start, current + 1),
+    }
@@ -0,0 +1,324 @@
+from datetime import datetime
+from pymongo import DeleteOne
+from pymongo.errors import DuplicateKeyError
+from config import Config
+from database import (users_collection, incomes_collection, expenses_collection, tombstones_collection,
+                      transaction_buckets_collection)
+from models.dates import date_range
+from services.rollups import month_key
+from services.export import merge_by_date
+from services.cache import summary_cache
+
+COLLECTIONS = {'income': incomes_collection, 'expense': expenses_collection}
+# Rewrites of a bucket that lost a race with another writer are retried this often
+MAX_RETRIES = 3
+
+# Closed months of old transactions live in one bucket document per
+# (user, kind, month): the rows themselves, newest first, with the month's
+# totals precomputed. Hot collections and their indexes then only grow with
+# recent activity, while reads merge both tiers.
+
+
+def month_bounds(month):
+    year, number = int(month[:4]), int(month[5:7])
+    return datetime(year, number, 1), datetime(year + number // 12, number % 12 + 1, 1)
+
+
+def archive_cutoff(months, today=None):
+    """First day of the oldest month that stays hot."""
+    today = today or datetime.utcnow()
+    index = today.year * 12 + today.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def entry_key(entry):
+    return entry['date'], entry['_id']
+
+
+def build_bucket(user_id, kind, month, entries, version=0):
+    entries = sorted(entries, key=entry_key, reverse=True)
+    categories = {}
+    daily = {}
+    for entry in entries:
+        key = (entry['category'], entry.get('currency'))
+        total, count = categories.get(key, (0, 0))
+        categories[key] = (total + entry['amount'], count + 1)
+        if key[1] is not None:
+            total, count = daily.get(key + (entry['date'],), (0, 0))
+            daily[key + (entry['date'],)] = (total + entry['amount'], count + 1)
+    start, end = month_bounds(month)
+    return {
+        'user_id': user_id,
+        'kind': kind,
+        'month': month,
+        'start': start,
+        'end': end,
+        'entries': entries,
+        'count': len(entries),
+        'total': sum(entry['amount'] for entry in entries),
+        # Split by currency; rows without one are in the owner's base currency
+        'by_category': [{'category': category, 'currency': currency, 'total': total, 'count': count}
+                        for (category, currency), (total, count) in categories.items()],
+        # Amounts with an explicit currency per day, to convert at that day's rate
+        'daily': [{'category': category, 'currency': currency, 'date': date, 'total': total, 'count': count}
+                  for (category, currency, date), (total, count) in daily.items()],
+        'version': version,
+        'archived_at': datetime.utcnow(),
+    }
+
+
+def bucket_key(user_id, kind, month):
+    return {'user_id': user_id, 'kind': kind, 'month': month}
+
+
+def next_bucket(bucket, user_id, kind, month, merge):
+    """The bucket after merge(entries_by_id) edits its entries, or None once empty."""
+    entries = {entry['_id']: entry for entry in bucket['entries']} if bucket else {}
+    merge(entries)
+    if not entries:
+        return None
+    return build_bucket(user_id, kind, month, entries.values(), bucket['version'] + 1 if bucket else 0)
+
+
+def unchanged(bucket):
+    # Every rewrite bumps the version, so this only matches what was read
+    return {'_id': bucket['_id'], 'version': bucket['version']}
+
+
+def bucket_write(bucket, user_id, kind, month, merge):
+    """The write that applies merge(entries_by_id) to `bucket` as read:
+    ('insert', document), ('replace', filter, document), ('delete', filter),
+    or None when there is nothing to write."""
+    document = next_bucket(bucket, user_id, kind, month, merge)
+    if bucket is None:
+        return ('insert', document) if document is not None else None
+    if document is None:
+        return 'delete', unchanged(bucket)
+    return 'replace', unchanged(bucket), document
+
+
+def write_bucket(buckets, user_id, kind, month, merge):
+    """Apply merge(entries_by_id) to a bucket with optimistic concurrency.
+
+    Returns False when another writer kept winning the race.
+    """
+    for _ in range(MAX_RETRIES):
+        write = bucket_write(buckets.find_one(bucket_key(user_id, kind, month)), user_id, kind, month, merge)
+        if write is None:
+            return True
+        if write[0] == 'insert':
+            try:
+                buckets.insert_one(write[1])
+                return True
+            except DuplicateKeyError:
+                continue
+        if write[0] == 'delete':
+            if buckets.delete_one(write[1]).deleted_count:
+                return True
+        elif buckets.replace_one(write[1], write[2]).matched_count:
+            return True
+    return False
+
+
+# Compaction
+
+def pack(row):
+    # The bucket already names the user
+    return {field: value for field, value in row.items() if field != 'user_id'}
+
+
+def archive_month(collection, buckets, user_id, kind, month, rows):
+    """Move one month of rows into its bucket; returns how many moved.
+
+    The bucket is written before the rows are deleted, so a crash in between
+    leaves rows in both tiers until the next run folds them in again. Rows
+    edited or deleted while the bucket was written are dropped from it.
+    Summaries cached while the rows were in both tiers are invalidated.
+    """
+    def add(entries):
+        for row in rows:
+            entries[row['_id']] = pack(row)
+
+    if not write_bucket(buckets, user_id, kind, month, add):
+        return 0
+
+    # Only delete the version that was archived; updates restamp updated_at
+    result = collection.bulk_write([DeleteOne({'_id': row['_id'], 'updated_at': row.get('updated_at')})
+                                    for row in rows], ordered=False)
+    if result.deleted_count < len(rows):
+        ids = [row['_id'] for row in rows]
+        edited = [row['_id'] for row in collection.find({'_id': {'$in': ids}}, {'_id': 1})]
+        deleted = [row['doc_id'] for row in tombstones_collection.find(
+            {'user_id': user_id, 'doc_id': {'$in': ids}}, {'doc_id': 1})]
+        write_bucket(buckets, user_id, kind, month, dropping(edited + deleted))
+    summary_cache.bump(user_id)
+    return result.deleted_count
+
+
+def compact_user(collection, buckets, user_id, kind, cutoff, max_entries):
+    """Archive every BSON-dated row of one user older than `cutoff`, month by month."""
+    moved = 0
+    condition = {'$lt': cutoff}
+    while True:
+        first = collection.find_one({'user_id': user_id, 'date': condition}, {'date': 1},
+                                    sort=[('date', 1)])
+        if first is None:
+            return moved
+        month = month_key(first['date'])
+        start, end = month_bounds(month)
+        condition = {'$gte': end, '$lt': cutoff}
+        query = {'user_id': user_id, 'date': {'$gte': start, '$lt': end}}
+        # Months too large for one document stay hot; counted before any row is read
+        if collection.count_documents(query, limit=max_entries + 1) > max_entries:
+            continue
+        rows = list(collection.find(query).sort([('date', 1), ('_id', 1)]))
+        if rows:
+            moved += archive_month(collection, buckets, user_id, kind, month, rows)
+
+
+def compact(months, max_entries, user_id=None, progress=None):
+    """Archive rows older than `months` full months for one user or all of them.
+
+    Safe to re-run and to run while serving; returns (users, rows moved).
+    """
+    cutoff = archive_cutoff(months)
+    if user_id:
+        user_ids = [user_id]
+    else:
+        user_ids = (str(user['_id']) for user in users_collection.find({}, {'_id': 1}))
+    users = moved = 0
+    for uid in user_ids:
+        for kind, collection in COLLECTIONS.items():
+            moved += compact_user(collection, transaction_buckets_collection, uid, kind, cutoff, max_entries)
+        users += 1
+        if progress:
+            progress(users, moved)
+    return users, moved
+
+
+# Reads
+
+def entry_filter(options):
+    """Python twin of services.listing.build_query for archived entries."""
+    condition = date_range(options.get('date_from'), options.get('date_to')) or {}
+    categories = set(options['categories']) if options.get('categories') else None
+    after = options.get('after')
+
+    def matches(entry):
+        date = entry['date']
+        if '$gte' in condition and date < condition['$gte']:
+            return False
+        if '$lt' in condition and date >= condition['$lt']:
+            return False
+        if '$lte' in condition and date > condition['$lte']:
+            return False
+        if categories is not None and entry.get('category') not in categories:
+            return False
+        if after and (date, entry['_id']) >= after:
+            return False
+        return True
+
+    return matches
+
+
+def bucket_query(user_id, kind, options):
+    query = {'user_id': user_id, 'kind': kind}
+    condition = date_range(options.get('date_from'), options.get('date_to')) or {}
+    if '$gte' in condition:
+        query['end'] = {'$gt': condition['$gte']}
+    upper = condition.get('$lt') or condition.get('$lte')
+    if options.get('after'):
+        upper = min(upper, options['after'][0]) if upper else options['after'][0]
+    if upper:
+        query['start'] = {'$lte': upper}
+    return query
+
+
+def project(entry, user_id, fields):
+    if fields:
+        entry = {field: entry[field] for field in ('_id', 'date', *fields) if field in entry}
+    else:
+        entry = dict(entry)
+    if not fields or 'user_id' in fields:
+        entry['user_id'] = user_id
+    return entry
+
+
+def archived_rows(buckets, user_id, kind, options, descending=True):
+    """Archived rows matching list options, one bucket at a time, in date order."""
+    matches = entry_filter(options)
+    cursor = buckets.find(bucket_query(user_id, kind, options), {'entries': 1}) \
+        .sort('start', -1 if descending else 1).batch_size(1)
+    try:
+        for bucket in cursor:
+            entries = bucket['entries'] if descending else reversed(bucket['entries'])
+            for entry in entries:
+                if matches(entry):
+                    yield project(entry, user_id, options.get('fields'))
+    finally:
+        cursor.close()
+
+
+def with_archive(cursor, buckets, user_id, kind, options):
+    """Hot rows from a find_page cursor merged with the archived ones, newest
+    first. Buckets are read lazily, so a page of recent rows reads at most the
+    newest matching bucket."""
+    archived = archived_rows(buckets, user_id, kind, options)
+    try:
+        yield from merge_by_date(cursor, archived, reverse=True)
+    finally:
+        cursor.close()
+        archived.close()
+
+
+def archived_stream(buckets, kind, user_id, options):
+    """Oldest-first archived rows tagged with their type, for exports."""
+    for entry in archived_rows(buckets, user_id, kind, options, descending=False):
+        entry['type'] = kind
+        yield entry
+
+
+# Writes to archived rows
+
+def archived_query(user_id, kind, doc_id):
+    return {'user_id': user_id, 'kind': kind, 'entries._id': doc_id}
+
+
+def archived_projection(doc_id):
+    # Just the one entry, not the whole month
+    return {'month': 1, 'entries': {'$elemMatch': {'_id': doc_id}}}
+
+
+def unpack(entry, user_id):
+    return {**entry, 'user_id': user_id}
+
+
+def dropping(ids):
+    def drop(entries):
+        for doc_id in ids:
+            entries.pop(doc_id, None)
+    return drop
+
+
+def restore_archived(buckets, collection, user_id, kind, doc_id):
+    """Move one archived row back to its hot collection so it can be changed.
+
+    Returns False when no bucket holds it. The row is inserted before it
+    leaves the bucket, so a crash in between only leaves it in both tiers
+    until the next compaction; the owner's cached summaries are invalidated
+    once it has left.
+    """
+    bucket = buckets.find_one(archived_query(user_id, kind, doc_id), archived_projection(doc_id))
+    if bucket is None:
+        return False
+    try:
+        collection.insert_one(unpack(bucket['entries'][0], user_id))
+    except DuplicateKeyError:
+        pass
+    write_bucket(buckets, user_id, kind, bucket['month'], dropping([doc_id]))
+    summary_cache.bump(user_id)
+    return True
+
+
+def restore(user_id, kind, doc_id):
+    return restore_archived(transaction_buckets_collection, COLLECTIONS[kind], user_id, kind, doc_id)
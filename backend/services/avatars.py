@@ -0,0 +1,120 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from PIL import Image, ImageOps
+from config import Config
+
+# Square thumbnails generated for every upload; the URL picks one with ?size=
+AVATAR_SIZES = {'sm': 64, 'md': 256}
+DEFAULT_SIZE = 'md'
+AVATAR_URL_PREFIX = '/api/auth/avatar/'
+AVATAR_DIGEST = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_inline_image(value):
+    return isinstance(value, str) and value.startswith('data:')
+
+
+def decode_image(value):
+    """Return the raw bytes of a base64 data URI (or bare base64 string)."""
+    if value.startswith('data:'):
+        header, _, value = value.partition(',')
+        if ';base64' not in header:
+            raise ValueError('Profile picture must be base64 encoded')
+    if len(value) > Config.MAX_AVATAR_BYTES * 4 // 3 + 4:
+        raise ValueError('Profile picture is too large')
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Profile picture is not valid base64')
+
+
+def avatar_filename(digest, size):
+    return '%s_%s.jpg' % (digest, size)
+
+
+def avatar_url(digest):
+    return AVATAR_URL_PREFIX + digest
+
+
+def _save(image, path):
+    # Write then rename so a concurrent reader never sees a partial file; the
+    # temp name is unique since concurrent uploads of one picture share `path`
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as tmp:
+        tmp_path = tmp.name
+        try:
+            image.save(tmp, 'JPEG', quality=85, optimize=True)
+        except Exception:
+            tmp.close()
+            os.remove(tmp_path)
+            raise
+    # Temp files are created owner-only; avatars are public
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def store_avatar(value):
+    """Decode an inline picture once, write its thumbnails and return its URL path.
+
+    Files are named after a hash of the original bytes, so re-uploading the
+    same picture is free and URLs can be cached forever.
+    """
+    raw = decode_image(value)
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+
+    paths = {size: os.path.join(Config.UPLOAD_FOLDER, avatar_filename(digest, size))
+             for size in AVATAR_SIZES}
+    if all(os.path.exists(path) for path in paths.values()):
+        return avatar_url(digest)
+
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except Exception:
+        raise ValueError('Profile picture is not a supported image')
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        # Flatten transparency onto white; JPEG has no alpha channel
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    for size, pixels in AVATAR_SIZES.items():
+        thumbnail = ImageOps.fit(image, (pixels, pixels), Image.LANCZOS)
+        _save(thumbnail, paths[size])
+
+    return avatar_url(digest)
+
+
+def normalize_picture(value):
+    """Map a submitted profile_picture to what is stored on the user document.
+
+    Inline images are converted to a URL; URLs we issued are stored as their
+    path once the digest they name is checked to have a stored file; empty
+    values clear the picture.
+    """
+    if not value:
+        return None
+    if is_inline_image(value):
+        return store_avatar(value)
+    if AVATAR_URL_PREFIX in value:
+        digest = re.split(r'[?#]', value[value.index(AVATAR_URL_PREFIX) + len(AVATAR_URL_PREFIX):])[0]
+        path = os.path.join(Config.UPLOAD_FOLDER, avatar_filename(digest, DEFAULT_SIZE))
+        if not AVATAR_DIGEST.match(digest) or not os.path.exists(path):
+            raise ValueError('Profile picture URL does not name an uploaded picture')
+        return avatar_url(digest)
+    raise ValueError('Profile picture must be an image data URI')
+
+
+def public_picture(value, host_url):
+    """Absolute URL for a stored picture path; legacy inline values pass through."""
+    if value and value.startswith(AVATAR_URL_PREFIX):
+        return host_url.rstrip('/') + value
+    return value
@@ -0,0 +1,260 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
+from database import incomes_collection, expenses_collection, tombstones_collection, get_client
+from services.changes import record_changes
+from services.sync import stamp, record_deletes
+from services.archive import restore
+from services.transactions import MODELS, build_create, build_update
+from config import Config
+
+COLLECTIONS = {'income': incomes_collection, 'expense': expenses_collection}
+OPERATIONS = ('create', 'update', 'delete')
+STATUSES = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+
+CONFLICT_ERROR = 'Changed by another request, reload and retry'
+
+
+class BatchAborted(Exception):
+    """Raised inside a transaction so nothing from the batch is committed."""
+
+
+def parse_operations(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get('operations'), list):
+        raise ValueError('Body must be {"operations": [...]}')
+    operations = payload['operations']
+    if not operations:
+        raise ValueError('operations must not be empty')
+    if len(operations) > Config.BATCH_MAX_OPERATIONS:
+        raise ValueError('At most %d operations per batch' % Config.BATCH_MAX_OPERATIONS)
+    return operations
+
+
+def plan_operations(operations, user_id):
+    """Validate each operation into a plan.
+
+    A plan is a dict with index/op/type plus `document` (create), `id` and
+    `update` (update) or `id` (delete); invalid entries carry an `error`
+    instead and are never sent to the database.
+    """
+    plans = []
+    seen = set()
+    for index, operation in enumerate(operations):
+        plan = {'index': index}
+        plans.append(plan)
+        try:
+            if not isinstance(operation, dict):
+                raise ValueError('Each operation must be an object')
+            plan['op'], plan['type'] = operation.get('op'), operation.get('type')
+            if plan['op'] not in OPERATIONS:
+                raise ValueError('op must be one of create, update, delete')
+            if plan['type'] not in MODELS:
+                raise ValueError('type must be income or expense')
+
+            if plan['op'] == 'create':
+                plan['document'] = build_create(plan['type'], user_id, operation.get('data'))
+                continue
+
+            try:
+                plan['id'] = ObjectId(operation.get('id'))
+            except (InvalidId, TypeError):
+                raise ValueError('Invalid id')
+            # Each row's before/after state is derived once for the rollups
+            if (plan['type'], plan['id']) in seen:
+                raise ValueError('Each transaction may appear only once per batch')
+            seen.add((plan['type'], plan['id']))
+            if plan['op'] == 'update':
+                plan['update'] = build_update(operation.get('data'))
+        except (TypeError, ValueError) as e:
+            plan['error'] = str(e)
+    return plans
+
+
+def load_existing(kind, user_id, plans, session=None):
+    """One query per collection for every row the batch updates or deletes."""
+    ids = [plan['id'] for plan in plans if 'id' in plan and 'error' not in plan]
+    if not ids:
+        return {}
+    cursor = COLLECTIONS[kind].find({'_id': {'$in': ids}, 'user_id': user_id}, session=session)
+    return {document['_id']: document for document in cursor}
+
+
+def guard(user_id, previous):
+    """Filter matching a row only while it is still the version that was loaded.
+
+    Every write stamps a new `seq`/`updated_at`, so a concurrent edit or
+    delete between loading and writing makes the filter match nothing.
+    Legacy rows without stamps match on the fields being absent.
+    """
+    return {'_id': previous['_id'], 'user_id': user_id,
+            'seq': previous.get('seq'), 'updated_at': previous.get('updated_at')}
+
+
+def conflicts(kind, user_id, written, result, session=None):
+    """Updates and deletes among `written` that matched nothing.
+
+    bulk_write only reports counts, so rows are re-read when the counts fall
+    short: an update applied if the row carries its stamp, a delete if the
+    row is gone and no other writer left a tombstone for it.
+    """
+    updates = [plan for plan in written if plan['op'] == 'update']
+    deletes = [plan for plan in written if plan['op'] == 'delete']
+    if result.matched_count == len(updates) and result.deleted_count == len(deletes):
+        return []
+
+    ids = [plan['id'] for plan in updates + deletes]
+    current = {document['_id']: document.get('seq')
+               for document in COLLECTIONS[kind].find({'_id': {'$in': ids}}, {'seq': 1}, session=session)}
+    missed = [plan for plan in updates if current.get(plan['id']) != plan['update']['seq']]
+    missed += [plan for plan in deletes if plan['id'] in current]
+    gone = [plan['id'] for plan in deletes if plan['id'] not in current]
+    if len(gone) > result.deleted_count:
+        foreign = {tombstone['doc_id'] for tombstone in tombstones_collection.find(
+            {'user_id': user_id, 'type': kind, 'doc_id': {'$in': gone}}, {'doc_id': 1}, session=session)}
+        missed += [plan for plan in deletes if plan['id'] in foreign]
+    return missed
+
+
+def restore_archived(kind, user_id, plans):
+    """Move archived rows the batch updates or deletes back to their collection.
+
+    Runs before any transaction starts, whose snapshot would not see them.
+    """
+    ids = [plan['id'] for plan in plans if 'id' in plan and 'error' not in plan]
+    if not ids:
+        return
+    hot = {document['_id'] for document in COLLECTIONS[kind].find({'_id': {'$in': ids}, 'user_id': user_id},
+                                                                   {'_id': 1})}
+    for doc_id in ids:
+        if doc_id not in hot:
+            restore(user_id, kind, doc_id)
+
+
+def write_collection(kind, user_id, plans, session=None):
+    """Run one bulk_write for this collection's valid plans and record the rollup changes."""
+    existing = load_existing(kind, user_id, plans, session)
+    requests, sent = [], []
+    for plan in plans:
+        if 'error' in plan:
+            continue
+        if plan['op'] == 'create':
+            requests.append(InsertOne(plan['document']))
+        elif plan['id'] not in existing:
+            plan['error'] = '%s not found' % kind.capitalize()
+            plan['not_found'] = True
+            continue
+        elif plan['op'] == 'update':
+            requests.append(UpdateOne(guard(user_id, existing[plan['id']]), {'$set': plan['update']}))
+        else:
+            requests.append(DeleteOne(guard(user_id, existing[plan['id']])))
+        sent.append(plan)
+
+    if session is not None and any('error' in plan for plan in plans):
+        raise BatchAborted()
+    if not requests:
+        return
+
+    # Stamped in place: the requests above hold these same dicts
+    stamp(user_id, [plan['document'] if plan['op'] == 'create' else plan['update']
+                    for plan in sent if plan['op'] != 'delete'], session)
+    failed = set()
+    try:
+        result = COLLECTIONS[kind].bulk_write(requests, ordered=False, session=session)
+    except BulkWriteError as e:
+        # Unordered writes keep going past a failure; map errors back to operations
+        for error in e.details.get('writeErrors', []):
+            failed.add(error['index'])
+            sent[error['index']]['error'] = error.get('errmsg', 'Write failed')
+        if session is not None:
+            raise BatchAborted()
+        result = BulkWriteResult(e.details, True)
+
+    written = [plan for position, plan in enumerate(sent) if position not in failed]
+    # Rows changed since they were loaded were left alone; whoever changed
+    # them recorded their own rollup, search and sync changes
+    for plan in conflicts(kind, user_id, written, result, session):
+        plan['error'] = CONFLICT_ERROR
+    if session is not None and any('error' in plan for plan in written):
+        raise BatchAborted()
+
+    removed, added, deleted = [], [], []
+    for plan in written:
+        if 'error' in plan:
+            continue
+        if plan['op'] == 'create':
+            added.append(plan['document'])
+        elif plan['op'] == 'update':
+            previous = existing[plan['id']]
+            removed.append(previous)
+            added.append({**previous, **plan['update']})
+        else:
+            removed.append(existing[plan['id']])
+            deleted.append(plan['id'])
+    record_changes(kind, user_id, removed=removed, added=added, session=session)
+    record_deletes(kind, user_id, deleted, session)
+
+
+def plan_result(plan, committed=True):
+    result = {'index': plan['index'], 'op': plan.get('op'), 'type': plan.get('type')}
+    if 'id' in plan:
+        result['id'] = str(plan['id'])
+    if 'error' in plan:
+        result['status'] = 'not_found' if plan.get('not_found') else 'error'
+        result['error'] = plan['error']
+    elif committed:
+        result['status'] = STATUSES[plan['op']]
+        if plan['op'] == 'create':
+            result['id'] = str(plan['document']['_id'])
+    else:
+        # Valid, but rolled back with the rest of a failed transaction
+        result['status'] = 'skipped'
+    return result
+
+
+def group_plans(plans):
+    return {kind: [plan for plan in plans if plan.get('type') == kind] for kind in MODELS}
+
+
+def run_batch(payload, user_id, transaction=False):
+    """Apply a mixed list of creates, updates and deletes with one bulk_write
+    per collection.
+
+    Without a transaction, valid operations are applied and failures are
+    reported per operation. With one, the batch commits only if every
+    operation succeeds (requires a replica set). Returns (ok, results).
+    """
+    operations = parse_operations(payload)
+    plans = plan_operations(operations, user_id)
+    by_kind = group_plans(plans)
+    for kind, kind_plans in by_kind.items():
+        restore_archived(kind, user_id, kind_plans)
+
+    if not transaction:
+        for kind, kind_plans in by_kind.items():
+            if kind_plans:
+                write_collection(kind, user_id, kind_plans)
+        return not any('error' in plan for plan in plans), [plan_result(plan) for plan in plans]
+
+    if any('error' in plan for plan in plans):
+        return False, [plan_result(plan, committed=False) for plan in plans]
+
+    attempt = {'plans': plans}
+
+    def apply(session):
+        # with_transaction retries this on transient errors; each attempt
+        # starts from fresh plans, not ones a failed attempt marked up
+        attempt['plans'] = plan_operations(operations, user_id)
+        for kind, kind_plans in group_plans(attempt['plans']).items():
+            if kind_plans:
+                write_collection(kind, user_id, kind_plans, session=session)
+
+    try:
+        with get_client().start_session() as session:
+            session.with_transaction(apply)
+    except BatchAborted:
+        return False, [plan_result(plan, committed=False) for plan in attempt['plans']]
+
+    return True, [plan_result(plan) for plan in attempt['plans']]
@@ -0,0 +1,99 @@
+import re
+from datetime import date
+from database import budgets_collection, monthly_rollups_collection
+from services.rollups import month_key, in_base_currency
+from services.fx import user_converter
+
+MONTH_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+# "Spent so far" is the expense rollup for (user, month, category): every
+# expense write already moves it with an atomic $inc, so a budget check is two
+# index reads and never touches the expenses collection. Counters are kept
+# per currency and converted into the user's base currency, the currency
+# budgets are set in.
+
+COUNTER_PROJECTION = {'month': 1, 'kind': 1, 'category': 1, 'currency': 1, 'total': 1, 'count': 1}
+
+
+def parse_month(value):
+    if value is None:
+        return month_key(date.today())
+    if not MONTH_PATTERN.match(value):
+        raise ValueError('month must be YYYY-MM')
+    return value
+
+
+def parse_amount(value):
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('amount must be a number')
+    if amount <= 0:
+        raise ValueError('amount must be greater than zero')
+    return amount
+
+
+def budget_status(category, month, limit, spent, currency=None):
+    spent = round(spent, 2)
+    return {
+        'category': category,
+        'month': month,
+        'currency': currency,
+        'budget': limit,
+        'spent': spent,
+        'remaining': round(limit - spent, 2) if limit is not None else None,
+        'utilization': round(spent / limit * 100, 1) if limit else None,
+        'over_budget': limit is not None and spent > limit,
+    }
+
+
+def category_counters(user_id, month, category):
+    """Query for a category's expense counters in `month`, one per currency."""
+    return {'user_id': user_id, 'month': month, 'kind': 'expense', 'category': category}
+
+
+def category_status(category, month, limit, counters, convert):
+    rows, missing = in_base_currency(counters, convert)
+    status = budget_status(category, month, limit, rows[0]['total'] if rows else 0.0, convert.base)
+    # Spending in these currencies could not be converted and is not included
+    status['missing_rates'] = missing
+    return status
+
+
+def check_budget(user_id, document):
+    """Budget status for the category and month an expense landed in, or None
+    when that category has no budget. Call after the rollups were updated."""
+    budget = budgets_collection.find_one({'user_id': user_id, 'category': document['category']},
+                                         {'amount': 1})
+    if budget is None:
+        return None
+    month = month_key(document['date'])
+    counters = monthly_rollups_collection.find(category_counters(user_id, month, document['category']),
+                                               COUNTER_PROJECTION)
+    return category_status(document['category'], month, budget['amount'], counters, user_converter(user_id))
+
+
+def utilization(budgets, counters, month, convert):
+    """Every category that has a budget or spending in `month`, budgets first,
+    then by utilization, in the base currency of `convert`."""
+    limits = {budget['category']: budget['amount'] for budget in budgets}
+    rows, missing = in_base_currency(counters, convert)
+    spent = {row['category']: row['total'] for row in rows if row['count'] > 0}
+
+    categories = [budget_status(category, month, limits.get(category), spent.get(category, 0.0), convert.base)
+                  for category in set(limits) | set(spent)]
+    categories.sort(key=lambda status: (status['budget'] is None, -(status['utilization'] or 0),
+                                        status['category']))
+
+    budgeted = [status for status in categories if status['budget'] is not None]
+    total_budget = sum(status['budget'] for status in budgeted)
+    total_spent = sum(status['spent'] for status in budgeted)
+    return {
+        'month': month,
+        'currency': convert.base,
+        'missing_rates': missing,
+        'categories': categories,
+        'total_budget': round(total_budget, 2),
+        'total_spent': round(total_spent, 2),
+        'over_budget': [status['category'] for status in budgeted if status['over_budget']],
+    }
@@ -0,0 +1,236 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from pymongo.errors import BulkWriteError
+from models.income import Income
+from models.expense import Expense
+from services.changes import record_changes
+from services.sync import stamp
+from config import Config
+
+MODELS = {'income': Income, 'expense': Expense}
+FORMATS = ('csv', 'ndjson')
+# Only the first errors are echoed back so the report stays small for huge files
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(requested, content_type):
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError('format must be csv or ndjson')
+        return requested
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    raise ValueError('Send text/csv or application/x-ndjson, or pass ?format=')
+
+
+def parse_import_request(request):
+    """Return (stream, format, batch_size) for a raw-body or multipart upload."""
+    batch_size = request.args.get('batch_size', Config.BULK_IMPORT_BATCH_SIZE, type=int)
+    if batch_size < 1 or batch_size > Config.BULK_IMPORT_MAX_BATCH_SIZE:
+        raise ValueError('batch_size must be between 1 and %d' % Config.BULK_IMPORT_MAX_BATCH_SIZE)
+
+    upload = request.files.get('file')
+    if upload is not None:
+        filename = (upload.filename or '').lower()
+        requested = request.args.get('format')
+        if not requested and filename.endswith('.csv'):
+            requested = 'csv'
+        elif not requested and filename.endswith(('.ndjson', '.jsonl')):
+            requested = 'ndjson'
+        return upload.stream, detect_format(requested, upload.content_type), batch_size
+
+    return request.stream, detect_format(request.args.get('format'), request.content_type), batch_size
+
+
+class DecodedLines:
+    """Text lines of a binary stream, decoded one line at a time.
+
+    A line that is not valid UTF-8 is passed on with replacement characters
+    and the problem kept in `error`, so the row it belongs to fails on its
+    own instead of aborting the rest of the upload.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.error = None
+
+    def __iter__(self):
+        first = True
+        for raw in self.stream:
+            if first and raw.startswith(codecs.BOM_UTF8):
+                raw = raw[len(codecs.BOM_UTF8):]
+            first = False
+            try:
+                yield raw.decode('utf-8')
+            except UnicodeDecodeError as e:
+                self.error = 'Invalid UTF-8 at byte %d of the line' % e.start
+                yield raw.decode('utf-8', 'replace')
+
+    def take_error(self):
+        error, self.error = self.error, None
+        return error
+
+
+def read_csv(lines):
+    """Like csv.DictReader, but a malformed row is yielded as an error and
+    reading carries on with the next one."""
+    reader = csv.reader(lines)
+    try:
+        header = next(reader, None)
+    except csv.Error as e:
+        raise ValueError('Invalid CSV header: %s' % e)
+    if lines.take_error():
+        raise ValueError('Invalid CSV header: not UTF-8')
+    if header is None:
+        return
+
+    number = 0
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            values = ValueError('Invalid CSV: %s' % e)
+        error = lines.take_error()
+        if values == [] and error is None:
+            continue
+        number += 1
+        if error is not None:
+            yield number, ValueError(error)
+        elif isinstance(values, Exception):
+            yield number, values
+        else:
+            yield number, dict(zip(header, values))
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, row_or_error) lazily from a binary stream."""
+    lines = DecodedLines(stream)
+    if fmt == 'csv':
+        yield from read_csv(lines)
+        return
+
+    number = 0
+    for line in lines:
+        error = lines.take_error()
+        if not line.strip():
+            continue
+        number += 1
+        if error is not None:
+            yield number, ValueError(error)
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError('Invalid JSON: %s' % e)
+            continue
+        if not isinstance(row, dict):
+            yield number, ValueError('Each line must be a JSON object')
+            continue
+        yield number, row
+
+
+def build_documents(rows, kind, user_id, report):
+    """Apply the same required-field rules as the single-row endpoints."""
+    model = MODELS[kind]
+    for number, row in rows:
+        if isinstance(row, Exception):
+            report.error(number, str(row))
+            continue
+
+        # A blank CSV cell is as good as a missing field
+        missing = [key for key in model.REQUIRED_FIELDS if row.get(key) in (None, '')]
+        if missing:
+            report.error(number, 'Missing required fields: %s' % ', '.join(missing))
+            continue
+
+        try:
+            document = model(
+                user_id=user_id,
+                title=row['title'],
+                amount=row['amount'],
+                category=row['category'],
+                date=row['date'],
+                description=row.get('description') or '',
+                currency=row.get('currency')
+            ).to_dict()
+        except (TypeError, ValueError) as e:
+            report.error(number, str(e))
+            continue
+
+        yield number, document
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        # Set when the import stopped early; rows inserted before it are kept
+        self.fatal = None
+
+    def error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    def to_dict(self):
+        report = {'inserted': self.inserted, 'failed': self.failed, 'errors': self.errors,
+                  'errors_truncated': self.failed > len(self.errors)}
+        if self.fatal is not None:
+            report['fatal_error'] = self.fatal
+        return report
+
+
+def insert_batch(collection, kind, user_id, batch, report):
+    numbers = [number for number, _ in batch]
+    documents = [document for _, document in batch]
+    failed = set()
+    stamp(user_id, documents)
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Unordered inserts keep going past a bad row; map failures back to rows
+        for error in e.details.get('writeErrors', []):
+            failed.add(error['index'])
+            report.error(numbers[error['index']], error.get('errmsg', 'Write failed'))
+
+    inserted = [document for index, document in enumerate(documents) if index not in failed]
+    report.inserted += len(inserted)
+    if inserted:
+        record_changes(kind, user_id, added=inserted)
+
+
+def import_transactions(stream, fmt, kind, user_id, collection, batch_size):
+    """Stream rows from `stream` into `collection` in unordered batches.
+
+    Memory use is bounded by one batch plus the capped error list, regardless
+    of the size of the upload. Earlier batches are already committed when
+    something fails mid-stream, so the error is returned in the report
+    (`fatal`) along with what was inserted rather than raised.
+    """
+    report = ImportReport()
+    documents = build_documents(read_rows(stream, fmt), kind, user_id, report)
+    try:
+        for batch in batched(documents, batch_size):
+            insert_batch(collection, kind, user_id, batch, report)
+    except Exception as e:
+        if not report.inserted:
+            raise
+        report.fatal = str(e)
+    return report
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from database import summary_versions_collection
+
+# Per-user data versions live in Mongo ({_id: user_id, version}) so every
+# web worker and CLI job sees the same one; the backends only hold bodies.
+VERSION_PROJECTION = {'version': 1}
+VERSION_INCREMENT = {'$inc': {'version': 1}}
+
+
+def version_of(document):
+    return document['version'] if document else 0
+
+
+class LRUCache:
+    """In-process cache bounded by entry count, with a per-entry TTL."""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class RedisCache:
+    """Cache backend for anything that speaks the redis-py API.
+
+    Only get, set(ex=) and delete are used, so a small dict-backed fake
+    is enough to exercise it locally (tests/test_cache.py). Evictions happen inside Redis
+    (maxmemory-policy) and are not counted here.
+    """
+
+    def __init__(self, client, ttl=300, prefix='finance-tracker:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+class SummaryCache:
+    """Caches serialized per-user payloads under a per-user version.
+
+    Writers call bump(user_id) (record_changes does); entries stored under
+    an older version are simply never read again and age out through the
+    TTL or LRU bound.
+    """
+
+    def __init__(self, backend, namespace='summary', versions=summary_versions_collection):
+        self.backend = backend
+        self.versions = versions
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def version(self, user_id):
+        if self.backend is None:
+            return 0
+        return version_of(self.versions.find_one({'_id': user_id}, VERSION_PROJECTION))
+
+    def bump(self, user_id, session=None):
+        # Bumped whatever this process's backend: other workers may cache
+        self.versions.update_one({'_id': user_id}, VERSION_INCREMENT, upsert=True, session=session)
+
+    def key(self, user_id, version, variant):
+        key = '%s:%s:%d' % (self.namespace, user_id, version)
+        return key + ':' + variant if variant else key
+
+    def get(self, user_id, version, variant=None):
+        """Return (etag, body) or None; `variant` tells apart payloads of the same data."""
+        if self.backend is None:
+            return None
+        raw = self.backend.get(self.key(user_id, version, variant))
+        self._count(raw is not None)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b' ')
+        return etag.decode('ascii'), body
+
+    def set(self, user_id, version, etag, body, variant=None):
+        if self.backend is not None:
+            self.backend.set(self.key(user_id, version, variant), etag.encode('ascii') + b' ' + body)
+
+    def stats(self):
+        stats = {'enabled': self.backend is not None, 'hits': self.hits, 'misses': self.misses}
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def create_backend(kind=None):
+    kind = kind or Config.SUMMARY_CACHE_BACKEND
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return LRUCache(Config.SUMMARY_CACHE_SIZE, Config.SUMMARY_CACHE_TTL)
+    if kind == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('SUMMARY_CACHE_BACKEND=redis requires the redis package')
+        return RedisCache(redis.Redis.from_url(Config.REDIS_URL), Config.SUMMARY_CACHE_TTL)
+    raise ValueError('Unknown SUMMARY_CACHE_BACKEND: %s' % kind)
+
+
+summary_cache = SummaryCache(create_backend())
@@ -0,0 +1,34 @@
+from database import monthly_rollups_collection, month_revisions_collection, search_index_collection
+from services.rollups import rollup_operations, revision_operations
+from services.cache import summary_cache
+from services.search import search_operations
+
+DERIVED_COLLECTIONS = {'monthly_rollups': monthly_rollups_collection,
+                       'month_revisions': month_revisions_collection,
+                       'search_index': search_index_collection}
+
+
+def change_operations(kind, user_id, removed=(), added=()):
+    """(collection name, bulk operations) pairs that propagate a write to derived data.
+
+    `removed` holds documents as they were before the write (deleted rows and
+    the old version of updated rows); `added` holds the new versions, with
+    their _id. Collections with nothing to write are left out.
+    """
+    plans = (('monthly_rollups', rollup_operations(user_id, kind, removed, added)),
+             ('month_revisions', revision_operations(user_id, removed, added)),
+             ('search_index', search_operations(kind, removed, added)))
+    return [(name, operations) for name, operations in plans if operations]
+
+
+def record_changes(kind, user_id, removed=(), added=(), session=None):
+    """Propagate a write on the incomes/expenses collections to derived data.
+
+    Inside a transaction the rollups, search index and summary version join
+    it, so cached summaries turn stale exactly at commit.
+    """
+    for name, operations in change_operations(kind, user_id, removed, added):
+        DERIVED_COLLECTIONS[name].bulk_write(operations, ordered=False, session=session)
+
+    # Cached summaries for this user are now stale, in every process
+    summary_cache.bump(user_id, session)
@@ -0,0 +1,71 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_body(data, encoding, level, quality):
+    if encoding == 'br':
+        return brotli.compress(data, quality=quality)
+    return gzip.compress(data, compresslevel=level)
+
+
+def compress_stream(chunks, encoding, level, quality):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=quality)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def init_app(app, min_size=1024, level=6, quality=4):
+    """Compress JSON/CSV responses for clients that accept gzip or brotli.
+
+    Buffered bodies smaller than `min_size` bytes are sent as is; streamed
+    bodies are compressed chunk by chunk as they are produced.
+    """
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.iter_encoded(), encoding, level, quality)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress_body(data, encoding, level, quality))
+
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ from the representation the ETag names
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
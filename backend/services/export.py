@@ -0,0 +1,159 @@
+import csv
+import heapq
+import io
+import logging
+import zlib
+from itertools import islice
+import numpy as np
+from config import Config
+from services.listing import build_query
+from models.dates import format_date
+from services.serialization import dumps
+from datetime import datetime
+
+EXPORT_COLUMNS = ('date', 'type', 'title', 'category', 'amount', 'currency', 'base_amount', 'description', 'id',
+                  'created_at')
+EXPORT_FIELDS = {'date': 1, 'title': 1, 'category': 1, 'amount': 1, 'currency': 1, 'description': 1,
+                 'created_at': 1}
+# Rows are buffered into chunks of roughly this size before being sent
+CHUNK_SIZE = 64 * 1024
+# Rows converted to the base currency per vectorized call
+CONVERT_BATCH_SIZE = 1000
+
+logger = logging.getLogger('finance_tracker.export')
+
+
+def sort_key(doc):
+    # Strings sort before dates, as in BSON, while legacy string dates remain
+    date = doc['date']
+    return isinstance(date, datetime), date, doc['_id']
+
+
+def transaction_stream(collection, kind, user_id, options):
+    """Oldest-first rows for one collection, read in Config.EXPORT_BATCH_SIZE batches."""
+    cursor = collection.find(build_query(user_id, options), EXPORT_FIELDS)
+    cursor = cursor.sort([('date', 1), ('_id', 1)]).batch_size(Config.EXPORT_BATCH_SIZE)
+    try:
+        for doc in cursor:
+            doc['type'] = kind
+            yield doc
+    finally:
+        cursor.close()
+
+
+def merge_by_date(*streams, reverse=False):
+    """K-way merge of already date-ordered streams without materializing them."""
+    return heapq.merge(*streams, key=sort_key, reverse=reverse)
+
+
+def with_base_amounts(docs, convert, batch_size=CONVERT_BATCH_SIZE):
+    """Set base_amount on every document, converting a batch at a time."""
+    docs = iter(docs)
+    while True:
+        batch = list(islice(docs, batch_size))
+        if not batch:
+            return
+        values = convert([doc['amount'] for doc in batch], [doc.get('currency') for doc in batch],
+                         [doc['date'] for doc in batch])
+        for doc, value in zip(batch, values):
+            # Left blank when the currency has no rates
+            doc['base_amount'] = None if np.isnan(value) else round(float(value), 2)
+            yield doc
+
+
+def export_row(doc):
+    created_at = doc.get('created_at')
+    return {
+        'date': format_date(doc['date']),
+        'type': doc['type'],
+        'title': doc.get('title', ''),
+        'category': doc.get('category', ''),
+        'amount': doc.get('amount'),
+        # Blank for rows in the owner's base currency
+        'currency': doc.get('currency') or '',
+        'base_amount': doc.get('base_amount'),
+        'description': doc.get('description', ''),
+        'id': str(doc['_id']),
+        'created_at': created_at.isoformat() if created_at else ''
+    }
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    sent = False
+    try:
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue().encode('utf-8')
+                sent = True
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        if not sent:
+            raise
+        logger.exception('CSV export failed')
+        # The status is already sent; a trailing comment row marks the file incomplete
+        buffer.write('# error: %s\r\n' % e)
+    yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(rows):
+    chunk = []
+    size = 0
+    sent = False
+    try:
+        for row in rows:
+            line = dumps(row) + b'\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield b''.join(chunk)
+                sent = True
+                chunk = []
+                size = 0
+    except Exception as e:
+        if not sent:
+            raise
+        logger.exception('NDJSON export failed')
+        # The status is already sent; a trailing error line marks the file incomplete
+        chunk.append(dumps({'error': str(e)}) + b'\n')
+    yield b''.join(chunk)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+ENCODERS = {'csv': (encode_csv, 'text/csv'), 'ndjson': (encode_ndjson, 'application/x-ndjson')}
+
+
+def export_chunks(streams, fmt, compress=False, convert=None):
+    encoder, _ = ENCODERS[fmt]
+    docs = merge_by_date(*streams)
+    if convert is not None:
+        docs = with_base_amounts(docs, convert)
+    rows = (export_row(doc) for doc in docs)
+    chunks = encoder(rows)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return prefetched(chunks)
+
+
+def prefetched(chunks):
+    """Produce the first chunk now, so errors reading the first batches raise
+    before the response starts; later ones end the file with an error marker."""
+    first = next(chunks)
+
+    def generate():
+        yield first
+        yield from chunks
+
+    return generate()
@@ -0,0 +1,46 @@
+from itertools import islice
+from services.listing import parse_list_args, find_page, split_list
+from services.export import merge_by_date
+from services.archive import with_archive
+
+FEED_TYPES = ('income', 'expense')
+
+
+def parse_feed_args(args):
+    """The list parameters plus ?type=income|expense (comma-separated)."""
+    options = parse_list_args(args)
+    options['types'] = FEED_TYPES
+    if args.get('type'):
+        types = split_list(args['type'])
+        unknown = [kind for kind in types if kind not in FEED_TYPES]
+        if unknown:
+            raise ValueError('Unknown type: %s' % ', '.join(unknown))
+        options['types'] = tuple(types)
+    return options
+
+
+def tagged(cursor, kind):
+    for doc in cursor:
+        doc['type'] = kind
+        yield doc
+
+
+def merged_page(collections, user_id, options, buckets=None):
+    """Newest-first rows across collections, merged from one indexed cursor each.
+
+    `collections` maps type to collection. The same (date, _id) keyset applies
+    to every cursor since ObjectIds are unique across collections, so each
+    side reads at most one page plus one row. With `buckets`, archived rows
+    are merged into each side.
+    """
+    cursors = [(kind, find_page(collections[kind], user_id, options)) for kind in options['types']]
+    if buckets is not None:
+        cursors = [(kind, with_archive(cursor, buckets, user_id, kind, options)) for kind, cursor in cursors]
+    try:
+        merged = merge_by_date(*(tagged(cursor, kind) for kind, cursor in cursors), reverse=True)
+        if options.get('limit'):
+            merged = islice(merged, options['limit'] + 1)
+        yield from merged
+    finally:
+        for _, cursor in cursors:
+            cursor.close()
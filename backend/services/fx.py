@@ -0,0 +1,217 @@
+import csv
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from config import Config
+from database import fx_rates_collection
+from models.currency import parse_currency
+from models.dates import parse_date
+from services.profiles import load_profile, profile_currency
+
+# fx_rates holds one document per currency, {_id: 'USD', dates, rates,
+# version}: rates[i] units of the currency buy one FX_PIVOT_CURRENCY from
+# dates[i] on, the shape of the ECB reference rates. Every load bumps the
+# version of the currencies it touched, and the highest version is the
+# version of the whole table.
+
+
+def day_numbers(dates):
+    """Days since the epoch for BSON dates, legacy 'YYYY-MM-DD' strings or datetime64 arrays."""
+    if isinstance(dates, np.ndarray):
+        return dates.astype('datetime64[D]').astype(np.int64)
+    values = [value[:10] if isinstance(value, str) else value for value in dates]
+    return np.array(values, dtype='datetime64[D]').astype(np.int64)
+
+
+class RateTable:
+    """Every currency's rates as two sorted arrays, looked up by binary search."""
+
+    def __init__(self, documents, pivot, version=0):
+        self.pivot = pivot
+        self.version = version
+        self.series = {}
+        for document in documents:
+            days = day_numbers(document['dates'])
+            order = np.argsort(days, kind='stable')
+            self.series[document['_id']] = (days[order], np.asarray(document['rates'], dtype=np.float64)[order])
+
+    def currencies(self):
+        return sorted(set(self.series) | {self.pivot})
+
+    def rates(self, currency, days):
+        """The rate in effect on each day: the latest one published on or before it.
+
+        Days before a currency's first rate use that first rate; currencies
+        without any rates get NaN.
+        """
+        if currency == self.pivot:
+            return np.ones(len(days))
+        series = self.series.get(currency)
+        if series is None:
+            return np.full(len(days), np.nan)
+        dates, rates = series
+        index = np.searchsorted(dates, days, side='right') - 1
+        return rates[np.maximum(index, 0)]
+
+    def convert(self, amounts, currencies, dates, base):
+        """Amounts in `base`, one vectorized lookup per currency present.
+
+        A None currency means the amount already is in the base currency.
+        Amounts in currencies without rates come back as NaN.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        result = amounts.copy()
+        codes = np.array(list(currencies), dtype=object)
+        foreign = np.array([code is not None and code != base for code in codes], dtype=bool)
+        if not foreign.any():
+            return result
+
+        codes = codes[foreign]
+        values = amounts[foreign]
+        if isinstance(dates, np.ndarray):
+            days = day_numbers(dates[foreign])
+        else:
+            days = day_numbers([value for value, flag in zip(dates, foreign) if flag])
+        base_rates = self.rates(base, days)
+        converted = np.empty(len(values))
+        for code in set(codes):
+            mask = codes == code
+            converted[mask] = values[mask] / self.rates(code, days[mask]) * base_rates[mask]
+        result[foreign] = converted
+        return result
+
+    def missing(self, currencies):
+        """Codes among `currencies` that cannot be converted."""
+        return sorted({code for code in currencies if code is not None and code != self.pivot
+                       and code not in self.series})
+
+    def converter(self, base):
+        return Converter(self, base)
+
+
+class Converter:
+    """A RateTable bound to one base currency, as passed to summaries and exports."""
+
+    def __init__(self, table, base):
+        self.table = table
+        self.base = base
+        # Anything converted with this converter may be cached under this key
+        self.key = '%s:%d' % (base, table.version)
+
+    def __call__(self, amounts, currencies, dates):
+        return self.table.convert(amounts, currencies, dates, self.base)
+
+    def missing(self, currencies):
+        codes = [code for code in currencies if code is not None and code != self.base]
+        # Converting anything into the base currency needs its rates too
+        return self.table.missing(codes + [self.base]) if codes else []
+
+
+VERSION_PROJECTION = {'version': 1}
+VERSION_SORT = [('version', -1)]
+
+
+def latest_version(document):
+    return document['version'] if document else 0
+
+
+class Rates:
+    """This process's RateTable, reloaded once a newer version has been loaded.
+
+    The version is checked at most every `refresh` seconds, so a load
+    reaches every worker within that time.
+    """
+
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self.loads = 0
+        self._table = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def fresh(self):
+        """The table, or None when its version is due for a check."""
+        if self._table is not None and time.monotonic() - self._checked < self.refresh:
+            return self._table
+        return None
+
+    def stale(self, version):
+        return self._table is None or self._table.version != version
+
+    def install(self, version, documents=None):
+        """Keep the current table under `version`, or replace it with `documents`."""
+        if documents is not None:
+            self._table = RateTable(documents, Config.FX_PIVOT_CURRENCY, version)
+            self.loads += 1
+        self._checked = time.monotonic()
+        return self._table
+
+    def table(self):
+        with self._lock:
+            table = self.fresh()
+            if table is not None:
+                return table
+            version = latest_version(fx_rates_collection.find_one({}, VERSION_PROJECTION, sort=VERSION_SORT))
+            documents = None
+            if self.stale(version):
+                documents = fx_rates_collection.find({}, {'dates': 1, 'rates': 1})
+            return self.install(version, documents)
+
+    def stats(self):
+        table = self._table
+        return {
+            'version': table.version if table else None,
+            'currencies': len(table.series) if table else 0,
+            'loads': self.loads,
+        }
+
+
+def base_currency(user_id):
+    return profile_currency(load_profile(user_id))
+
+
+def user_converter(user_id):
+    return rates.table().converter(base_currency(user_id))
+
+
+def read_rates(stream):
+    """(currency, date, rate) rows from a date,currency,rate CSV file."""
+    for number, row in enumerate(csv.DictReader(stream), start=2):
+        try:
+            currency = parse_currency(row.get('currency'))
+            rate = float(row.get('rate'))
+            if currency is None or not rate > 0:
+                raise ValueError('currency and a positive rate are required')
+            yield currency, parse_date(row.get('date')), rate
+        except (TypeError, ValueError) as e:
+            raise ValueError('Line %d: %s' % (number, e))
+
+
+def load_rates(rows):
+    """Merge rates into fx_rates under a new table version; returns
+    (currencies, rates) written. Later rows win for the same day."""
+    incoming = {}
+    for currency, date, rate in rows:
+        incoming.setdefault(currency, {})[date] = rate
+    if not incoming:
+        return 0, 0
+
+    version = latest_version(fx_rates_collection.find_one({}, VERSION_PROJECTION, sort=VERSION_SORT)) + 1
+    written = 0
+    for currency, series in incoming.items():
+        stored = fx_rates_collection.find_one({'_id': currency}) or {'dates': [], 'rates': []}
+        merged = dict(zip(stored['dates'], stored['rates']))
+        merged.update(series)
+        dates = sorted(merged)
+        fx_rates_collection.replace_one(
+            {'_id': currency},
+            {'dates': dates, 'rates': [merged[date] for date in dates], 'version': version,
+             'updated_at': datetime.utcnow()},
+            upsert=True
+        )
+        written += len(series)
+    return len(incoming), written
+
+
+rates = Rates(Config.FX_REFRESH_SECONDS)
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+import bcrypt
+from config import Config
+
+
+class HasherBusy(Exception):
+    """The hashing pool is saturated; the request should be retried later."""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed_password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def hash_cost(hashed_password):
+    # bcrypt hashes look like $2b$<cost>$<salt+hash>
+    try:
+        return int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt off the request thread on a bounded worker pool.
+
+    At most `max_pending` hashes may be queued or running; beyond that
+    callers get HasherBusy immediately instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers, max_pending, timeout, rounds, pool='process'):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rounds = rounds
+        self.pool = pool
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._pending = 0
+        self._executor = None
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # A pool inherited through fork() is unusable, so each process builds its own
+        if self._executor is None or self._owner_pid != os.getpid():
+            executor_class = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+            self._owner_pid = os.getpid()
+        return self._executor
+
+    def _replace(self, broken):
+        """A new pool in place of one that lost a worker (OOM kill, segfault).
+
+        A broken ProcessPoolExecutor rejects every later submit, so without
+        this each login would fail until the process restarted.
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+            executor = self._get_executor()
+        broken.shutdown(wait=False)
+        return executor
+
+    def _release(self, started):
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def submit(self, fn, *args):
+        """Queue work on the pool and return its concurrent.futures.Future."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy('Password hashing queue is full')
+            self._pending += 1
+            executor = self._get_executor()
+
+        started = time.perf_counter()
+        try:
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenExecutor:
+                future = self._replace(executor).submit(fn, *args)
+        except Exception:
+            self._release(started)
+            raise
+        # The slot is freed when the work finishes, even if the caller gave up
+        future.add_done_callback(lambda _: self._release(started))
+        return future
+
+    def _timed_out(self):
+        with self._lock:
+            self.timed_out += 1
+        return HasherBusy('Password hashing timed out')
+
+    def _run(self, fn, *args):
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise self._timed_out()
+
+    async def _run_async(self, fn, *args):
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, hashed_password):
+        return self._run(_check, password, hashed_password)
+
+    async def hash_async(self, password):
+        return await self._run_async(_hash, password, self.rounds)
+
+    async def verify_async(self, password, hashed_password):
+        return await self._run_async(_check, password, hashed_password)
+
+    def needs_rehash(self, hashed_password):
+        # Only upgrade: lowering BCRYPT_ROUNDS must not weaken stored hashes
+        cost = hash_cost(hashed_password)
+        return cost is None or cost < self.rounds
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pool': self.pool,
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'queue_depth': self._pending,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'restarts': self.restarts,
+                'avg_latency_ms': round(self.total_latency / self.completed * 1000, 2) if self.completed else 0,
+                'max_latency_ms': round(self.max_latency * 1000, 2)
+            }
+
+
+hasher = PasswordHasher(
+    workers=Config.HASH_WORKERS,
+    max_pending=Config.HASH_MAX_PENDING,
+    timeout=Config.HASH_TIMEOUT,
+    rounds=Config.BCRYPT_ROUNDS,
+    pool=Config.HASH_POOL
+)
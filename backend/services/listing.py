@@ -0,0 +1,226 @@
+from itertools import chain, islice
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, current_app, stream_with_context
+from config import Config
+from models.dates import parse_date, format_date, date_range
+from services.serialization import dumps, to_columns
+
+LIST_FIELDS = ('user_id', 'title', 'amount', 'currency', 'category', 'date', 'description', 'created_at')
+LIST_FORMATS = ('rows', 'columns')
+# Documents encoded per chunk written to the response
+STREAM_BATCH_SIZE = 100
+
+
+def parse_list_args(args):
+    """Read ?limit=&after=&fields=&category=&from=&to=&format= from a request's query string.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    options = {'limit': None, 'after': None, 'fields': None, 'categories': None,
+               'date_from': args.get('from'), 'date_to': args.get('to'),
+               'format': args.get('format', 'rows')}
+
+    if options['format'] not in LIST_FORMATS:
+        raise ValueError('format must be rows or columns')
+
+    if 'limit' in args:
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1 or limit > Config.MAX_PAGE_SIZE:
+            raise ValueError('limit must be between 1 and %d' % Config.MAX_PAGE_SIZE)
+        options['limit'] = limit
+
+    if args.get('after'):
+        options['after'] = parse_cursor(args['after'])
+
+    if args.get('fields'):
+        fields = split_list(args['fields'])
+        unknown = [field for field in fields if field not in LIST_FIELDS]
+        if unknown:
+            raise ValueError('Unknown fields: %s' % ', '.join(unknown))
+        options['fields'] = fields
+
+    if args.get('category'):
+        options['categories'] = split_list(args['category'])
+
+    # Columns are built in memory, so that format always pages
+    if options['format'] == 'columns' and options['limit'] is None:
+        options['limit'] = Config.MAX_PAGE_SIZE
+
+    return options
+
+
+def split_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_cursor(value):
+    # Cursors look like "<date>,<_id>" and point at the last row of the previous page
+    date, sep, oid = value.rpartition(',')
+    if not sep or not date:
+        raise ValueError('after must be "<date>,<id>"')
+    try:
+        return parse_date(date), ObjectId(oid)
+    except InvalidId:
+        raise ValueError('after contains an invalid id')
+
+
+def make_cursor(doc):
+    date = doc['date']
+    return '%s,%s' % (date.isoformat() if hasattr(date, 'isoformat') else date, doc['_id'])
+
+
+def build_query(user_id, options):
+    query = {'user_id': user_id}
+
+    condition = date_range(options.get('date_from'), options.get('date_to'))
+    if condition:
+        query['date'] = condition
+
+    if options.get('categories'):
+        query['category'] = {'$in': options['categories']}
+
+    if options.get('after'):
+        date, oid = options['after']
+        query['$or'] = [
+            {'date': {'$lt': date}},
+            {'date': date, '_id': {'$lt': oid}}
+        ]
+
+    return query
+
+
+def build_projection(options):
+    if not options.get('fields'):
+        return None
+    # date and _id are always returned because the page cursor is built from them
+    projection = {field: 1 for field in options['fields']}
+    projection['date'] = 1
+    return projection
+
+
+def find_page(collection, user_id, options):
+    """Return a cursor over one page, newest first, served by the
+    (user_id, date, _id) index. One extra row is fetched to detect a next page."""
+    cursor = collection.find(build_query(user_id, options), build_projection(options))
+    cursor = cursor.sort([('date', -1), ('_id', -1)])
+    if options.get('limit'):
+        cursor = cursor.limit(options['limit'] + 1)
+    return cursor
+
+
+def serialize_document(doc):
+    # ObjectIds and datetimes are left to the encoder; `date` keeps its
+    # date-only form for rows without a time
+    if 'date' in doc:
+        doc['date'] = format_date(doc['date'])
+    return doc
+
+
+def columns_body(key, docs, next_cursor):
+    columns, count = to_columns(docs)
+    return dumps({key: columns, 'count': count, 'next_cursor': next_cursor})
+
+
+def stream_page(key, cursor, limit=None, fmt='rows'):
+    """Stream a {key: [...], next_cursor: ...} JSON body in batches of documents.
+
+    With fmt='columns' the page is sent as {key: {field: [values...]}, count: n}.
+    The first batch (or the whole columns page) is read before the response
+    starts, so query errors still reach the route's error handling. A later
+    failure cannot change the 200 status; the body then ends with an "error"
+    member in place of next_cursor.
+    """
+    rows = iter(cursor)
+    if fmt == 'columns':
+        try:
+            docs = list(islice(rows, limit + 1)) if limit else list(rows)
+        finally:
+            cursor.close()
+        return Response(page_body(key, docs, limit), mimetype='application/json')
+    try:
+        head = list(islice(rows, STREAM_BATCH_SIZE))
+    except Exception:
+        cursor.close()
+        raise
+
+    def generate():
+        page = PageEncoder(key, limit)
+        yield page.start()
+        try:
+            for doc in chain(head, rows):
+                chunk = page.add(doc)
+                if chunk is None:
+                    break
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            current_app.logger.exception('Streaming %s failed', key)
+            yield page.end(error=e)
+            return
+        finally:
+            cursor.close()
+        yield page.end()
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+class PageEncoder:
+    """Encodes a streamed {key: [...], next_cursor: ...} page a batch at a time.
+
+    Holds no I/O, so the WSGI and ASGI streams only differ in how they read
+    their cursors: send start(), then add(doc) for each document until it
+    returns None (the page is full), then end().
+    """
+
+    def __init__(self, key, limit=None):
+        self.key = key
+        self.limit = limit
+        self.docs = []
+        self.count = 0
+        self.sent = False
+        self.last = None
+        self.has_more = False
+
+    def start(self):
+        return b'{"%s":[' % self.key.encode('utf-8')
+
+    def add(self, doc):
+        """The chunk to send now (b'' until a batch fills up), or None when
+        `doc` is past the limit and the page has a next one."""
+        if self.limit and self.count == self.limit:
+            self.has_more = True
+            return None
+        self.count += 1
+        self.last = serialize_document(doc)
+        self.docs.append(self.last)
+        if len(self.docs) == STREAM_BATCH_SIZE:
+            return self.flush()
+        return b''
+
+    def flush(self):
+        if not self.docs:
+            return b''
+        chunk = (b',' if self.sent else b'') + b','.join(dumps(doc) for doc in self.docs)
+        self.sent = True
+        self.docs = []
+        return chunk
+
+    def end(self, error=None):
+        """The rest of the body; after a failure it carries "error" instead of next_cursor."""
+        if error is not None:
+            return self.flush() + b'],"error":%s}' % dumps(str(error))
+        next_cursor = make_cursor(self.last) if self.has_more else None
+        return self.flush() + b'],"next_cursor":%s}' % dumps(next_cursor)
+
+
+def page_body(key, docs, limit=None):
+    """Columns body for rows already read, `limit` + 1 of them when there is a next page."""
+    has_more = bool(limit) and len(docs) > limit
+    if has_more:
+        docs = docs[:limit]
+    docs = [serialize_document(doc) for doc in docs]
+    return columns_body(key, docs, make_cursor(docs[-1]) if has_more else None)
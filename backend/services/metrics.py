@@ -0,0 +1,267 @@
+import hmac
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+# Commands kept per request for the slow-request log
+MAX_TRACED_COMMANDS = 100
+
+logger = logging.getLogger('finance_tracker.metrics')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by a label tuple, rendered as Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._sources = []
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).get(labels)
+            if histogram is None:
+                histogram = self._histograms[name][labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def add_source(self, prefix, collect, counters=()):
+        """Export every numeric value of `collect()` as a <prefix>_<key> gauge.
+
+        Keys listed in `counters` only ever grow; they are exported as
+        <prefix>_<key>_total counters so rate() works on them.
+        """
+        self._sources.append((prefix, collect, frozenset(counters)))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(series.items()):
+                    lines.append('%s%s %s' % (name, format_labels(labels), value))
+
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append('%s_bucket%s %d' % (
+                            name, format_labels(labels + (('le', str(bound)),)), cumulative))
+                    lines.append('%s_sum%s %s' % (name, format_labels(labels), histogram.sum))
+                    lines.append('%s_count%s %d' % (name, format_labels(labels), histogram.count))
+
+        for prefix, collect, counters in self._sources:
+            for key, value in sorted(collect().items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if key in counters:
+                    name = '%s_%s_total' % (prefix, key)
+                    lines.append('# TYPE %s counter' % name)
+                else:
+                    name = '%s_%s' % (prefix, key)
+                    lines.append('# TYPE %s gauge' % name)
+                lines.append('%s %s' % (name, value))
+
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind):
+        kind, text = self._help.get(name, (kind, ''))
+        if text:
+            lines.append('# HELP %s %s' % (name, text))
+        lines.append('# TYPE %s %s' % (name, kind))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for key, value in labels)
+
+
+registry = MetricsRegistry()
+registry.describe('http_request_duration_seconds', 'histogram', 'Request latency by route.')
+registry.describe('http_response_size_bytes', 'histogram', 'Response body size by route.')
+registry.describe('http_requests_total', 'counter', 'Requests by route and status code.')
+registry.describe('http_request_mongo_round_trips', 'histogram', 'MongoDB commands issued per request.')
+registry.describe('mongo_command_duration_seconds', 'histogram', 'MongoDB command latency.')
+registry.describe('mongo_documents_returned_total', 'counter', 'Documents returned by MongoDB commands.')
+registry.describe('mongo_command_failures_total', 'counter', 'Failed MongoDB commands.')
+
+
+class RequestTrace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.round_trips = 0
+        self.commands = []
+
+
+_current = threading.local()
+
+
+def current_trace():
+    return getattr(_current, 'trace', None)
+
+
+def returned_documents(reply):
+    cursor = reply.get('cursor') if isinstance(reply, dict) else None
+    if cursor:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+    return 0
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records every MongoDB command; pass it to MongoClient(event_listeners=...).
+
+    pymongo calls listeners on the thread that issued the command, so the
+    current request's trace is found through a thread-local.
+    """
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get('collection', '')
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, documents, failed):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), '')
+        duration = event.duration_micros / 1e6
+        labels = (('command', event.command_name), ('collection', collection))
+
+        registry.observe('mongo_command_duration_seconds', labels, duration, LATENCY_BUCKETS)
+        if documents:
+            registry.inc('mongo_documents_returned_total', labels, documents)
+        if failed:
+            registry.inc('mongo_command_failures_total', labels)
+
+        trace = current_trace()
+        if trace is not None:
+            trace.round_trips += 1
+            if len(trace.commands) < MAX_TRACED_COMMANDS:
+                trace.commands.append({'command': event.command_name, 'collection': collection,
+                                       'ms': round(duration * 1000, 2), 'documents': documents,
+                                       'failed': failed})
+
+    def succeeded(self, event):
+        self._finish(event, returned_documents(event.reply), False)
+
+    def failed(self, event):
+        self._finish(event, 0, True)
+
+
+command_listener = CommandMetricsListener()
+
+
+def _record_request(route, method, status, size, trace, slow_request_ms):
+    duration = time.perf_counter() - trace.started
+    labels = (('method', method), ('route', route))
+
+    registry.observe('http_request_duration_seconds', labels, duration, LATENCY_BUCKETS)
+    registry.inc('http_requests_total', labels + (('status', str(status)),))
+    registry.observe('http_request_mongo_round_trips', labels, trace.round_trips, COUNT_BUCKETS)
+    if size is not None:
+        registry.observe('http_response_size_bytes', labels, size, SIZE_BUCKETS)
+
+    if slow_request_ms and duration * 1000 >= slow_request_ms:
+        logger.warning('Slow request %s', json.dumps({
+            'method': method, 'route': route, 'status': status,
+            'ms': round(duration * 1000, 2), 'round_trips': trace.round_trips,
+            'commands': trace.commands
+        }))
+
+
+def _counting(iterable, counter):
+    for chunk in iterable:
+        counter[0] += len(chunk)
+        yield chunk
+
+
+def init_app(app, slow_request_ms=None):
+    """Time every request, count its Mongo round trips and serve /metrics."""
+    from flask import request, Response
+
+    @app.before_request
+    def start_trace():
+        _current.trace = RequestTrace()
+
+    @app.after_request
+    def finish_trace(response):
+        trace = current_trace()
+        if trace is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        status = response.status_code
+
+        # Streamed bodies are still being produced, so measure them when closed
+        size = [0]
+        if response.is_streamed:
+            response.response = _counting(response.response, size)
+        else:
+            size[0] = response.calculate_content_length()
+
+        def finish():
+            _record_request(route, method, status, size[0], trace, slow_request_ms)
+            if current_trace() is trace:
+                _current.trace = None
+
+        response.call_on_close(finish)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        denied = check_token(app.config, request.headers.get('Authorization'))
+        if denied:
+            return denied
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def check_token(config, authorization):
+    """None when a request may read process-wide stats, else an error response.
+
+    They need `Authorization: Bearer <METRICS_TOKEN>`; without a token they
+    are only served when METRICS_PUBLIC is set.
+    """
+    token = config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest((authorization or '').encode('utf-8'), ('Bearer %s' % token).encode('utf-8')):
+            return {'error': 'Unauthorized'}, 401
+        return None
+    if config.get('METRICS_PUBLIC'):
+        return None
+    return {'error': 'Not found'}, 404
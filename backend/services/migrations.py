@@ -0,0 +1,104 @@
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from models.dates import parse_date
+from services.cache import summary_cache
+
+
+def date_checkpoint_id(collection):
+    return 'dates:%s' % collection.name
+
+
+def migrate_string_dates(collection, checkpoints, batch_size=1000, pause=0, restart=False,
+                         progress=None):
+    """Convert string `date` fields to BSON dates in small batches.
+
+    Safe to run while the app is serving: each update only applies if the
+    document still holds the string it was read with. The last processed _id
+    is checkpointed after every batch, so an interrupted run resumes where it
+    stopped. Unparseable dates are counted and skipped. Summary cache versions
+    of the owners of converted rows are bumped, and a run that reaches the end
+    marks the checkpoint completed.
+    """
+    checkpoint_id = date_checkpoint_id(collection)
+    if restart:
+        checkpoints.delete_one({'_id': checkpoint_id})
+    state = checkpoints.find_one({'_id': checkpoint_id}) or {}
+
+    query = {'date': {'$type': 'string'}}
+    if state.get('last_id'):
+        query['_id'] = {'$gt': state['last_id']}
+
+    remaining = collection.count_documents(query)
+    converted = state.get('converted', 0)
+    failed = state.get('failed', 0)
+    done = 0
+
+    while True:
+        batch = list(collection.find(query, {'date': 1, 'user_id': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        users = set()
+        for doc in batch:
+            try:
+                value = parse_date(doc['date'])
+            except ValueError:
+                failed += 1
+                continue
+            operations.append(UpdateOne(
+                {'_id': doc['_id'], 'date': doc['date']},
+                {'$set': {'date': value}}
+            ))
+            users.add(doc.get('user_id'))
+        if operations:
+            result = collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+            # Cached summaries were built from the string-dated rows
+            for user_id in users:
+                summary_cache.bump(user_id)
+
+        done += len(batch)
+        query['_id'] = {'$gt': batch[-1]['_id']}
+        checkpoints.update_one(
+            {'_id': checkpoint_id},
+            {'$set': {'last_id': batch[-1]['_id'], 'converted': converted, 'failed': failed,
+                      'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        if progress:
+            progress(collection.name, done, remaining, converted, failed)
+        if pause:
+            time.sleep(pause)
+
+    checkpoints.update_one(
+        {'_id': checkpoint_id},
+        {'$set': {'converted': converted, 'failed': failed, 'completed_at': datetime.utcnow()}},
+        upsert=True
+    )
+    return converted, failed
+
+
+def pending_date_migrations(collections, checkpoints):
+    """Names of the collections whose string dates are not migrated yet.
+
+    Date filters and page cursors compare against BSON dates only, so rows
+    still holding strings are left out of listings until migrated. A
+    collection without a completed checkpoint is probed once; when it holds
+    no string dates (new installs) its checkpoint is marked completed.
+    """
+    pending = []
+    for collection in collections:
+        checkpoint_id = date_checkpoint_id(collection)
+        if checkpoints.find_one({'_id': checkpoint_id, 'completed_at': {'$exists': True}}, {'_id': 1}):
+            continue
+        if collection.find_one({'date': {'$type': 'string'}}, {'_id': 1}):
+            pending.append(collection.name)
+            continue
+        checkpoints.update_one(
+            {'_id': checkpoint_id},
+            {'$set': {'completed_at': datetime.utcnow()}},
+            upsert=True
+        )
+    return pending
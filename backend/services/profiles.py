@@ -0,0 +1,148 @@
+import threading
+from bson import ObjectId
+from config import Config
+from database import users_collection
+from services.cache import LRUCache
+from models.currency import parse_currency
+from services.avatars import AVATAR_URL_PREFIX, normalize_picture, public_picture
+
+# Everything a profile response shows; never the password hash
+PROFILE_PROJECTION = {'email': 1, 'name': 1, 'profile_picture': 1, 'phone_number': 1, 'base_currency': 1}
+# Copied into access tokens at login so /verify can answer without a lookup
+PROFILE_CLAIMS = ('email', 'name', 'profile_picture')
+VERIFY_MODES = ('cache', 'stateless')
+
+
+def profile_claims(user):
+    picture = user.get('profile_picture')
+    # Legacy inline images would ride along on every request; those users
+    # fall back to the cached lookup until `avatars migrate` has run
+    if picture and not picture.startswith(AVATAR_URL_PREFIX):
+        return {}
+    return {field: user.get(field) for field in PROFILE_CLAIMS}
+
+
+def profile_currency(profile):
+    return (profile or {}).get('base_currency') or Config.BASE_CURRENCY
+
+
+def public_user(user, host_url, details=False):
+    """The user as sent to clients; `details` adds what only the profile shows."""
+    user_data = {
+        'id': str(user['_id']),
+        'email': user['email'],
+        'name': user['name'],
+        'profile_picture': public_picture(user.get('profile_picture'), host_url)
+    }
+    if details:
+        user_data['phone_number'] = user.get('phone_number')
+        user_data['base_currency'] = profile_currency(user)
+    return user_data
+
+
+# Validation shared by the WSGI and ASGI auth routes. Both decode inline
+# pictures and write thumbnails, so the ASGI app runs them on a thread.
+
+def signup_profile(data):
+    """Optional signup fields, validated; raises ValueError on bad input."""
+    return {
+        'profile_picture': normalize_picture(data.get('profile_picture', None)),
+        'phone_number': data.get('phone_number', None),
+        'base_currency': parse_currency(data.get('base_currency'))
+    }
+
+
+def profile_update(data):
+    """The $set document for a profile update; raises ValueError on bad input."""
+    update_fields = {}
+    if 'name' in data and data['name']:
+        update_fields['name'] = data['name']
+    if 'phone_number' in data:
+        update_fields['phone_number'] = data['phone_number']
+    if 'profile_picture' in data:
+        update_fields['profile_picture'] = normalize_picture(data['profile_picture'])
+    if 'base_currency' in data:
+        update_fields['base_currency'] = parse_currency(data['base_currency'])
+    if not update_fields:
+        raise ValueError('No fields to update')
+    return update_fields
+
+
+def claims_profile(user_id, claims):
+    """A profile built from token claims, or None for tokens issued without them."""
+    if not all(field in claims for field in PROFILE_CLAIMS):
+        return None
+    return {'_id': user_id, **{field: claims[field] for field in PROFILE_CLAIMS}}
+
+
+class ProfileCache:
+    """Projected user documents keyed by user_id.
+
+    Entries are dropped by the profile and password endpoints of this
+    process; other workers see a change once the TTL expires. Every hit and
+    every stateless /verify answer is a users read that did not happen.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stateless = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, user_id):
+        if self.backend is None:
+            self._count('misses')
+            return None
+        profile = self.backend.get(user_id)
+        self._count('hits' if profile is not None else 'misses')
+        return profile
+
+    def set(self, user_id, profile):
+        if self.backend is not None and profile is not None:
+            self.backend.set(user_id, profile)
+
+    def invalidate(self, user_id):
+        if self.backend is not None:
+            self.backend.delete(str(user_id))
+
+    def answered_from_claims(self):
+        self._count('stateless')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'enabled': self.backend is not None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stateless': self.stateless,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'db_reads_saved': self.hits + self.stateless,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def verify_mode():
+    if Config.AUTH_VERIFY_MODE not in VERIFY_MODES:
+        raise ValueError('Unknown AUTH_VERIFY_MODE %r' % Config.AUTH_VERIFY_MODE)
+    return Config.AUTH_VERIFY_MODE
+
+
+def load_profile(user_id):
+    """The user's profile from the cache, or one projected read of users."""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        profile = users_collection.find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+        profile_cache.set(user_id, profile)
+    return profile
+
+
+profile_cache = ProfileCache(
+    LRUCache(Config.PROFILE_CACHE_SIZE, Config.PROFILE_CACHE_TTL) if Config.PROFILE_CACHE_SIZE > 0 else None
+)
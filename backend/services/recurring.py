@@ -0,0 +1,145 @@
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import incomes_collection, expenses_collection, recurring_rules_collection
+from models.income import Income
+from models.expense import Expense
+from services.changes import record_changes
+from services.sync import stamp
+from services.schedule import next_occurrence, occurrences
+
+COLLECTIONS = {'income': incomes_collection, 'expense': expenses_collection}
+MODELS = {'income': Income, 'expense': Expense}
+DUPLICATE_KEY = 11000
+
+
+def transaction_document(rule, when):
+    document = MODELS[rule['type']](
+        user_id=rule['user_id'],
+        title=rule['title'],
+        amount=rule['amount'],
+        category=rule['category'],
+        date=when,
+        description=rule.get('description', ''),
+        currency=rule.get('currency')
+    ).to_dict()
+    # The unique (rule_id, occurrence_date) key makes re-runs harmless, and
+    # stays put if the user later edits the transaction's own date
+    document['rule_id'] = rule['_id']
+    document['occurrence_date'] = when
+    return document
+
+
+def insert_occurrences(kind, documents):
+    """Insert one collection's occurrences; returns (inserted, duplicates, failed rule ids)."""
+    for user_id in {document['user_id'] for document in documents}:
+        stamp(user_id, [document for document in documents if document['user_id'] == user_id])
+
+    rejected = set()
+    duplicates = 0
+    failed_rules = set()
+    try:
+        COLLECTIONS[kind].insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            rejected.add(error['index'])
+            if error.get('code') == DUPLICATE_KEY:
+                duplicates += 1  # an earlier or concurrent run already wrote it
+            else:
+                failed_rules.add(documents[error['index']]['rule_id'])
+
+    inserted = [document for index, document in enumerate(documents) if index not in rejected]
+    by_user = {}
+    for document in inserted:
+        by_user.setdefault(document['user_id'], []).append(document)
+    for user_id, added in by_user.items():
+        record_changes(kind, user_id, added=added)
+    return len(inserted), duplicates, failed_rules
+
+
+def materialize_chunk(ids, through, limit):
+    """Write due occurrences for the rules in `ids` and advance them.
+
+    Runs in a pool worker. Transactions are inserted before the rules move
+    forward, so a crash in between only leaves duplicates for the unique
+    key to reject on the next run.
+    """
+    rules = list(recurring_rules_collection.find(
+        {'_id': {'$in': ids}, 'active': True, 'next_date': {'$lte': through}}
+    ))
+    documents = {kind: [] for kind in COLLECTIONS}
+    advances = {}
+    for rule in rules:
+        last = None
+        for index, when in occurrences(rule, through, limit):
+            documents[rule['type']].append(transaction_document(rule, when))
+            last = index
+        if last is not None:
+            advances[rule['_id']] = (rule['next_index'], last + 1, next_occurrence(rule, last + 1))
+
+    totals = Counter(rules=len(rules))
+    for kind, batch in documents.items():
+        if not batch:
+            continue
+        inserted, duplicates, failed_rules = insert_occurrences(kind, batch)
+        totals.update(created=inserted, duplicates=duplicates, failed=len(failed_rules))
+        for rule_id in failed_rules:
+            advances.pop(rule_id, None)  # retried on the next run
+
+    now = datetime.utcnow()
+    operations = [
+        # Matching the index read keeps a concurrent run from moving a rule backwards
+        UpdateOne({'_id': rule_id, 'next_index': old},
+                  {'$set': {'next_index': new, 'next_date': when, 'materialized_at': now}})
+        for rule_id, (old, new, when) in advances.items()
+    ]
+    if operations:
+        recurring_rules_collection.bulk_write(operations, ordered=False)
+    return totals
+
+
+def due_rule_chunks(through, chunk_size):
+    """_ids of due rules in lists of `chunk_size`, read from the index only."""
+    cursor = recurring_rules_collection.find(
+        {'active': True, 'next_date': {'$lte': through}}, {'_id': 1}
+    ).batch_size(chunk_size)
+    ids = (rule['_id'] for rule in cursor)
+    while True:
+        chunk = list(islice(ids, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def materialize_due(through, chunk_size=1000, workers=1, limit=400, progress=None):
+    """Materialize every rule due by `through`, `chunk_size` rules at a time.
+
+    With several workers chunks run on a process pool; at most two chunks
+    per worker are queued, so memory stays flat however many rules are due.
+    Rules more than `limit` occurrences behind catch up over later runs.
+    """
+    totals = Counter()
+
+    def collect(result):
+        totals.update(result)
+        if progress:
+            progress(totals)
+
+    chunks = due_rule_chunks(through, chunk_size)
+    if workers <= 1:
+        for ids in chunks:
+            collect(materialize_chunk(ids, through, limit))
+        return totals
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for ids in chunks:
+            pending.append(pool.submit(materialize_chunk, ids, through, limit))
+            if len(pending) >= workers * 2:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+    return totals
@@ -0,0 +1,486 @@
+import csv
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from PIL import Image, ImageDraw, ImageFont
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import Config
+from database import (incomes_collection, expenses_collection, transaction_buckets_collection,
+                      month_revisions_collection, report_jobs_collection)
+from services.archive import archived_stream
+from services.export import EXPORT_COLUMNS, transaction_stream, merge_by_date, with_base_amounts, export_row
+from services.fx import rates, user_converter
+
+REPORT_FORMATS = {'csv': 'text/csv', 'pdf': 'application/pdf'}
+PERIOD_PATTERN = re.compile(r'^\d{4}(-(0[1-9]|1[0-2]))?$')
+JOB_FIELDS = ('period', 'format', 'currency', 'status', 'rows', 'size', 'error', 'created_at', 'started_at',
+              'finished_at')
+
+# PDF pages are A4 at 100 dpi, drawn in black and white
+PAGE_SIZE = (827, 1169)
+PAGE_MARGIN = 60
+LINE_HEIGHT = 15
+LEDGER_COLUMNS = (('date', 0, 10), ('type', 85, 7), ('title', 150, 28), ('category', 370, 14), ('amount', 480, 12),
+                  ('currency', 570, 3), ('base_amount', 615, 12))
+
+# A report covers one month ('YYYY-MM') or one year ('YYYY'). Jobs are
+# documents in report_jobs; the file they produce is cached until a write
+# touches one of its months, which bumps that month's revision (see
+# services.rollups.revision_operations) and so the period's revision, or
+# until the user's base currency or the FX rate table changes.
+
+
+class ReportLimit(Exception):
+    """The user already has as many reports in progress as allowed."""
+
+
+class ReportsBusy(Exception):
+    """The report queue is full; the request should be retried later."""
+
+
+def period_months(period):
+    if not period or not PERIOD_PATTERN.match(period):
+        raise ValueError('period must be YYYY-MM or YYYY')
+    if len(period) == 7:
+        return [period]
+    return ['%s-%02d' % (period, month) for month in range(1, 13)]
+
+
+def period_options(period):
+    """Listing options for the period's days, for the export streams."""
+    months = period_months(period)
+    year, number = int(months[-1][:4]), int(months[-1][5:7])
+    last_day = datetime(year + number // 12, number % 12 + 1, 1) - timedelta(days=1)
+    return {'date_from': months[0] + '-01', 'date_to': last_day.strftime('%Y-%m-%d')}
+
+
+def period_revision(user_id, period):
+    """Sum of the period's month revisions; it grows with every write to the period."""
+    counters = month_revisions_collection.find(
+        {'user_id': user_id, 'month': {'$in': period_months(period)}}, {'revision': 1}
+    )
+    return sum(counter['revision'] for counter in counters)
+
+
+def report_filename(job):
+    return '%s.%s' % (job['_id'], job['format'])
+
+
+def report_path(job):
+    return os.path.join(Config.REPORT_FOLDER, report_filename(job))
+
+
+# Statement data
+
+def ledger_rows(user_id, period, convert):
+    """The period's rows oldest first, hot and archived, formatted like an export.
+
+    Read from the primary: a lagging secondary could miss writes the
+    report's revision already counts, and the stale file would be cached.
+    """
+    options = period_options(period)
+    streams = (
+        transaction_stream(incomes_collection, 'income', user_id, options),
+        transaction_stream(expenses_collection, 'expense', user_id, options),
+        archived_stream(transaction_buckets_collection, 'income', user_id, options),
+        archived_stream(transaction_buckets_collection, 'expense', user_id, options)
+    )
+    return (export_row(doc) for doc in with_base_amounts(merge_by_date(*streams), convert))
+
+
+class Statement:
+    """Totals per category and per month in the base currency, accumulated
+    while the ledger streams by."""
+
+    def __init__(self, period, currency):
+        self.period = period
+        self.currency = currency
+        self.rows = 0
+        # Rows in currencies without rates, left out of the totals
+        self.unconverted = 0
+        self.categories = {}
+        self.months = {month: {'income': 0.0, 'expense': 0.0, 'count': 0} for month in period_months(period)}
+
+    def add(self, row):
+        kind, amount = row['type'], row['base_amount']
+        self.rows += 1
+        if amount is None:
+            self.unconverted += 1
+            return
+        total, count = self.categories.get((kind, row['category']), (0.0, 0))
+        self.categories[(kind, row['category'])] = (total + amount, count + 1)
+        month = self.months.get(row['date'][:7])
+        if month is not None:
+            month[kind] += amount
+            month['count'] += 1
+
+    def totals(self):
+        income = sum(month['income'] for month in self.months.values())
+        expense = sum(month['expense'] for month in self.months.values())
+        totals = [('Currency', self.currency), ('Income', money(income)), ('Expenses', money(expense)),
+                  ('Net', money(income - expense)), ('Transactions', self.rows)]
+        if self.unconverted:
+            totals.append(('Without FX rates', self.unconverted))
+        return totals
+
+    def category_rows(self):
+        # Income first, then largest categories first
+        ordered = sorted(self.categories.items(), key=lambda item: (item[0][0] != 'income', -item[1][0]))
+        return [(kind, category, money(total), count) for (kind, category), (total, count) in ordered]
+
+    def month_rows(self):
+        return [(month, money(row['income']), money(row['expense']), money(row['income'] - row['expense']),
+                 row['count'])
+                for month, row in self.months.items()]
+
+
+def money(value):
+    return round(value, 2)
+
+
+def write_csv(path, user_id, period, convert):
+    """Summary tables followed by the full ledger.
+
+    The ledger is spooled to a temporary file while the totals accumulate,
+    so memory stays flat however many rows the period holds.
+    """
+    statement = Statement(period, convert.base)
+    with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as spool:
+        ledger = csv.DictWriter(spool, fieldnames=EXPORT_COLUMNS)
+        ledger.writeheader()
+        for row in ledger_rows(user_id, period, convert):
+            statement.add(row)
+            ledger.writerow(row)
+        spool.seek(0)
+
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Statement', period])
+            writer.writerows(statement.totals())
+            writer.writerow([])
+            writer.writerow(['By category'])
+            writer.writerow(['type', 'category', 'total', 'count'])
+            writer.writerows(statement.category_rows())
+            writer.writerow([])
+            writer.writerow(['By month'])
+            writer.writerow(['month', 'income', 'expense', 'net', 'count'])
+            writer.writerows(statement.month_rows())
+            writer.writerow([])
+            writer.writerow(['Ledger'])
+            handle.flush()
+            shutil.copyfileobj(spool, handle)
+    return statement.rows
+
+
+class PdfPages:
+    """Fixed-layout text pages rendered with Pillow."""
+
+    def __init__(self, title):
+        self.title = title
+        self.font = ImageFont.load_default()
+        self.pages = []
+        self.draw = None
+        self.y = 0
+
+    def new_page(self):
+        page = Image.new('1', PAGE_SIZE, 1)
+        self.pages.append(page)
+        self.draw = ImageDraw.Draw(page)
+        self.draw.text((PAGE_MARGIN, PAGE_MARGIN - 2 * LINE_HEIGHT), '%s - page %d' % (self.title, len(self.pages)),
+                       font=self.font, fill=0)
+        self.y = PAGE_MARGIN
+
+    def line(self, cells=(), gap=0):
+        if self.draw is None or self.y + LINE_HEIGHT > PAGE_SIZE[1] - PAGE_MARGIN:
+            self.new_page()
+        for x, text in cells:
+            self.draw.text((PAGE_MARGIN + x, self.y), str(text), font=self.font, fill=0)
+        self.y += LINE_HEIGHT + gap
+
+    def table(self, heading, header, rows, offsets):
+        self.line([(0, heading)], gap=4)
+        self.line(zip(offsets, header))
+        for row in rows:
+            self.line(zip(offsets, row))
+        self.line()
+
+    def save(self, path):
+        if not self.pages:
+            self.new_page()
+        self.pages[0].save(path, 'PDF', save_all=True, append_images=self.pages[1:], resolution=100)
+
+
+def clip(value, width):
+    text = '' if value is None else str(value)
+    return text if len(text) <= width else text[:width - 1] + '~'
+
+
+def write_pdf(path, user_id, period, convert):
+    """Summary tables, then the ledger up to REPORT_PDF_MAX_ROWS rows.
+
+    Pages are held in memory until saved, hence the cap; the CSV report
+    always carries the full ledger.
+    """
+    statement = Statement(period, convert.base)
+    ledger = []
+    for row in ledger_rows(user_id, period, convert):
+        statement.add(row)
+        if len(ledger) < Config.REPORT_PDF_MAX_ROWS:
+            ledger.append(row)
+
+    pages = PdfPages('Statement %s' % period)
+    pages.table('Summary', ('', 'amount'), statement.totals(), (0, 160))
+    pages.table('By category', ('type', 'category', 'total', 'count'), statement.category_rows(), (0, 90, 300, 420))
+    pages.table('By month', ('month', 'income', 'expense', 'net', 'count'), statement.month_rows(),
+                (0, 90, 210, 330, 450))
+
+    pages.new_page()
+    pages.line([(0, 'Ledger')], gap=4)
+    pages.line([(x, field) for field, x, _ in LEDGER_COLUMNS])
+    for row in ledger:
+        pages.line([(x, clip(row[field], width)) for field, x, width in LEDGER_COLUMNS])
+    if statement.rows > len(ledger):
+        pages.line()
+        pages.line([(0, '%d more rows are in the CSV report' % (statement.rows - len(ledger)))])
+    pages.save(path)
+    return statement.rows
+
+
+WRITERS = {'csv': write_csv, 'pdf': write_pdf}
+
+
+# Jobs
+
+def finish(job, fields):
+    """Record a job's outcome; False when it had already been expired."""
+    result = report_jobs_collection.update_one(
+        {'_id': job['_id'], 'active': True},
+        {'$set': {**fields, 'finished_at': datetime.utcnow()}, '$unset': {'active': ''}}
+    )
+    return result.matched_count == 1
+
+
+def drop_superseded(job):
+    """Delete older finished versions of the same report and their files."""
+    query = {'user_id': job['user_id'], 'period': job['period'], 'format': job['format'],
+             'status': 'done', 'created_at': {'$lt': job['created_at']}}
+    for old in report_jobs_collection.find(query, {'format': 1}):
+        remove_file(old)
+    report_jobs_collection.delete_many(query)
+
+
+def remove_file(job):
+    try:
+        os.remove(report_path(job))
+    except FileNotFoundError:
+        pass
+
+
+def run_job(job_id):
+    """Generate one queued report. Runs in a pool worker."""
+    job = report_jobs_collection.find_one_and_update(
+        {'_id': job_id, 'status': 'queued', 'active': True},
+        {'$set': {'status': 'running', 'started_at': datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        return None
+
+    os.makedirs(Config.REPORT_FOLDER, exist_ok=True)
+    path = report_path(job)
+    tmp_path = path + '.tmp'
+    try:
+        convert = rates.table().converter(job['currency'])
+        rows = WRITERS[job['format']](tmp_path, job['user_id'], job['period'], convert)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        finish(job, {'status': 'failed', 'error': str(e)})
+        return 'failed'
+
+    if not finish(job, {'status': 'done', 'rows': rows, 'size': os.path.getsize(path)}):
+        # Expired while running; its slot has been given away
+        remove_file(job)
+        return 'expired'
+    drop_superseded(job)
+    return 'done'
+
+
+class ReportRunner:
+    """Per-process pool running report jobs (see run_job).
+
+    Job state lives in Mongo, so the limits hold across every web worker;
+    the pool only bounds how many reports this process builds at once.
+    """
+
+    def __init__(self, workers, pool='process'):
+        self.workers = workers
+        self.pool = pool
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._executor = None
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # A pool inherited through fork() is unusable, so each process builds its own
+        if self._executor is None or self._owner_pid != os.getpid():
+            executor_class = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+            self._owner_pid = os.getpid()
+        return self._executor
+
+    def _replace(self, broken):
+        """A new pool in place of one that lost a worker (OOM kill, segfault),
+        which would otherwise reject every later submit."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+            executor = self._get_executor()
+        broken.shutdown(wait=False)
+        return executor
+
+    def _done(self, job, future):
+        error = future.exception()
+        with self._lock:
+            if error is None and future.result() == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+        if error is not None:
+            # The worker died before recording anything (e.g. a broken pool)
+            finish(job, {'status': 'failed', 'error': str(error) or error.__class__.__name__})
+
+    def submit(self, job):
+        with self._lock:
+            self.submitted += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(run_job, job['_id'])
+        except BrokenExecutor:
+            future = self._replace(executor).submit(run_job, job['_id'])
+        future.add_done_callback(lambda done: self._done(job, done))
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pool': self.pool,
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'restarts': self.restarts,
+            }
+
+
+def expire_stale():
+    """Fail jobs queued or running for longer than REPORT_JOB_TIMEOUT, e.g.
+    ones whose web worker exited, so they stop holding limit slots."""
+    cutoff = datetime.utcnow() - timedelta(seconds=Config.REPORT_JOB_TIMEOUT)
+    report_jobs_collection.update_many(
+        {'active': True, 'created_at': {'$lt': cutoff}},
+        {'$set': {'status': 'failed', 'error': 'Report timed out', 'finished_at': datetime.utcnow()},
+         '$unset': {'active': ''}}
+    )
+
+
+def current_job(key):
+    """The newest queued, running or finished job for a report at one revision."""
+    job = report_jobs_collection.find_one({**key, 'status': {'$in': ['queued', 'running', 'done']}},
+                                          sort=[('created_at', -1)])
+    if job is not None and job['status'] == 'done' and not os.path.exists(report_path(job)):
+        return None
+    return job
+
+
+def limit_error(user_id, own):
+    """ReportLimit or ReportsBusy when the active jobs, `own` of them this
+    request's, leave no room for it; otherwise None."""
+    if report_jobs_collection.count_documents({'user_id': user_id, 'active': True}) - own \
+            >= Config.REPORT_MAX_PER_USER:
+        return ReportLimit('At most %d reports can be in progress at once' % Config.REPORT_MAX_PER_USER)
+    if report_jobs_collection.count_documents({'active': True}) - own >= Config.REPORT_MAX_PENDING:
+        return ReportsBusy('Report queue is full')
+    return None
+
+
+def request_report(user_id, period, fmt):
+    """Return (job, created) for a report of the user's current data.
+
+    A finished report of the same data, or one already being built, is
+    returned as is; otherwise a job is queued within the per-user and global
+    limits (ReportLimit, ReportsBusy).
+    """
+    period_months(period)
+    if fmt not in REPORT_FORMATS:
+        raise ValueError('format must be csv or pdf')
+
+    convert = user_converter(user_id)
+    key = {'user_id': user_id, 'period': period, 'format': fmt, 'revision': period_revision(user_id, period),
+           'currency': convert.base, 'fx_version': convert.table.version}
+    job = current_job(key)
+    if job is not None:
+        return job, False
+
+    expire_stale()
+    error = limit_error(user_id, 0)
+    if error is not None:
+        raise error
+
+    job = {**key, 'status': 'queued', 'active': True, 'created_at': datetime.utcnow()}
+    try:
+        report_jobs_collection.insert_one(job)
+    except DuplicateKeyError:
+        # An identical request won the race
+        return current_job(key), False
+    # Counted again with the new job in place: concurrent requests can all
+    # pass the check above, but each one that then sees too many backs out
+    error = limit_error(user_id, 1)
+    if error is not None:
+        report_jobs_collection.delete_one({'_id': job['_id']})
+        raise error
+    try:
+        report_runner.submit(job)
+    except Exception as e:
+        # Don't leave a job nobody will run holding a limit slot
+        finish(job, {'status': 'failed', 'error': str(e) or e.__class__.__name__})
+        raise
+    return job, True
+
+
+def find_job(user_id, job_id):
+    return report_jobs_collection.find_one({'_id': job_id, 'user_id': user_id})
+
+
+def recent_jobs(user_id, limit=20):
+    return report_jobs_collection.find({'user_id': user_id}).sort('created_at', -1).limit(limit)
+
+
+def job_response(job):
+    response = {'id': str(job['_id'])}
+    response.update({field: job.get(field) for field in JOB_FIELDS})
+    if job['status'] == 'done':
+        response['download_url'] = '/api/reports/%s/download' % job['_id']
+    return response
+
+
+def prune(days):
+    """Delete finished jobs older than `days` and their files; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = {'active': {'$exists': False}, 'created_at': {'$lt': cutoff}}
+    for job in report_jobs_collection.find(query, {'format': 1}):
+        remove_file(job)
+    return report_jobs_collection.delete_many(query).deleted_count
+
+
+report_runner = ReportRunner(workers=Config.REPORT_WORKERS, pool=Config.REPORT_POOL)
@@ -0,0 +1,206 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from pymongo import UpdateOne, DeleteOne
+
+KINDS = ('income', 'expense')
+
+
+def month_key(value):
+    """Return the 'YYYY-MM' bucket for a transaction date."""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m')
+    return str(value)[:7]
+
+
+def rollup_key(user_id, kind, month, category, currency=None):
+    # Counters are kept per currency (None: the owner's base currency) and
+    # converted when read; documents from before currencies match None too
+    return {'user_id': user_id, 'month': month, 'kind': kind, 'category': category, 'currency': currency}
+
+
+def rollup_deltas(removed=(), added=()):
+    """Net (total, count) change per (month, category, currency) for a set of writes."""
+    deltas = {}
+    for sign, docs in ((-1, removed), (1, added)):
+        for doc in docs:
+            key = (month_key(doc['date']), doc['category'], doc.get('currency'))
+            total, count = deltas.get(key, (0, 0))
+            deltas[key] = (total + sign * doc['amount'], count + sign)
+    return {key: delta for key, delta in deltas.items() if delta != (0, 0)}
+
+
+def rollup_operations(user_id, kind, removed=(), added=()):
+    return [
+        UpdateOne(
+            rollup_key(user_id, kind, month, category, currency),
+            {'$inc': {'total': total, 'count': count}},
+            upsert=True
+        )
+        for (month, category, currency), (total, count) in rollup_deltas(removed, added).items()
+    ]
+
+
+def revision_operations(user_id, removed=(), added=()):
+    """Bump the revision of every month a write touched.
+
+    Unlike the counters this also moves on edits that leave totals alone
+    (a new title, say), so anything derived from a month's rows, such as a
+    generated report, can tell it is stale.
+    """
+    months = {month_key(doc['date']) for docs in (removed, added) for doc in docs}
+    return [UpdateOne({'user_id': user_id, 'month': month}, {'$inc': {'revision': 1}}, upsert=True)
+            for month in sorted(months)]
+
+
+def month_expression():
+    # Legacy documents may still hold 'YYYY-MM-DD' strings until `flask dates migrate` runs
+    return {'$cond': [
+        {'$eq': [{'$type': '$date'}, 'date']},
+        {'$dateToString': {'format': '%Y-%m', 'date': '$date'}},
+        {'$substrCP': ['$date', 0, 7]}
+    ]}
+
+
+def month_match(month):
+    """Query for transactions dated in 'YYYY-MM', BSON or legacy string dates."""
+    year, number = int(month[:4]), int(month[5:7])
+    start = datetime(year, number, 1)
+    end = datetime(year + number // 12, number % 12 + 1, 1)
+    return {'$or': [{'date': {'$gte': start, '$lt': end}},
+                    {'date': {'$regex': '^%s' % month}}]}
+
+
+def expected_rollups(collection, kind, user_id=None, month=None):
+    """Recompute rollups from raw transactions, keyed like the stored documents."""
+    match = {'user_id': user_id} if user_id else {}
+    if month:
+        match.update(month_match(month))
+    pipeline = [{'$match': match}] if match else []
+    pipeline.append({'$group': {
+        '_id': {'user_id': '$user_id', 'month': month_expression(), 'category': '$category',
+                'currency': {'$ifNull': ['$currency', None]}},
+        'total': {'$sum': '$amount'},
+        'count': {'$sum': 1}
+    }})
+
+    expected = {}
+    for row in collection.aggregate(pipeline, allowDiskUse=True):
+        key = (row['_id']['user_id'], kind, row['_id']['month'], row['_id']['category'], row['_id']['currency'])
+        expected[key] = (row['total'], row['count'])
+    return expected
+
+
+def add_archived(expected, buckets, kind=None, user_id=None, month=None):
+    """Add the precomputed category totals of archive buckets to expected rollups."""
+    query = {'user_id': user_id} if user_id else {}
+    if kind:
+        query['kind'] = kind
+    if month:
+        query['month'] = month
+    for bucket in buckets.find(query, {'user_id': 1, 'kind': 1, 'month': 1, 'by_category': 1}):
+        for row in bucket['by_category']:
+            key = (bucket['user_id'], bucket['kind'], bucket['month'], row['category'], row.get('currency'))
+            total, count = expected.get(key, (0, 0))
+            expected[key] = (total + row['total'], count + row['count'])
+    return expected
+
+
+def stored_rollups(rollups_collection, user_id=None, kind=None, month=None):
+    query = {'user_id': user_id} if user_id else {}
+    if kind:
+        query['kind'] = kind
+    if month:
+        query['month'] = month
+    stored = {}
+    for row in rollups_collection.find(query):
+        key = (row['user_id'], row['kind'], row['month'], row['category'], row.get('currency'))
+        stored[key] = (row['_id'], row['total'], row['count'])
+    return stored
+
+
+def find_drift(expected, stored, tolerance=0.005):
+    """Yield (key, expected, stored) for every rollup that does not match raw data."""
+    for key in set(expected) | set(stored):
+        want_total, want_count = expected.get(key, (0, 0))
+        have = stored.get(key)
+        have_total, have_count = (have[1], have[2]) if have else (0, 0)
+        if want_count != have_count or abs(want_total - have_total) > tolerance:
+            yield key, (want_total, want_count), (have_total, have_count)
+
+
+def repair_operations(expected, stored):
+    operations = []
+    for key, (want_total, want_count), _ in find_drift(expected, stored):
+        user_id, kind, month, category, currency = key
+        if want_count == 0:
+            operations.append(DeleteOne({'_id': stored[key][0]}))
+        else:
+            operations.append(UpdateOne(
+                rollup_key(user_id, kind, month, category, currency),
+                {'$set': {'total': want_total, 'count': want_count}},
+                upsert=True
+            ))
+    return operations
+
+
+def month_range(months, today=None):
+    """The last `months` calendar months, oldest first, as 'YYYY-MM' strings."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1
+    return ['%04d-%02d' % (i // 12, i % 12 + 1) for i in range(index - months + 1, index + 1)]
+
+
+def rate_date(month, today=None):
+    """The day a month's counters are converted at: its last day, or today
+    while the month is still running."""
+    year, number = int(month[:4]), int(month[5:7])
+    last = date(year + number // 12, number % 12 + 1, 1) - timedelta(days=1)
+    return min(last, today or date.today())
+
+
+def in_base_currency(rows, convert, today=None):
+    """Rollup rows summed across currencies into the base currency.
+
+    Returns (rows, missing): one row per (month, kind, category), converted
+    in one vectorized call, and the codes without rates, whose totals are
+    left out (their rows still count).
+    """
+    rows = list(rows)
+    values = convert([row['total'] for row in rows], [row.get('currency') for row in rows],
+                     [rate_date(row['month'], today) for row in rows])
+    merged = {}
+    for row, value in zip(rows, values):
+        key = (row['month'], row['kind'], row['category'])
+        entry = merged.get(key)
+        if entry is None:
+            entry = merged[key] = {'month': row['month'], 'kind': row['kind'], 'category': row['category'],
+                                   'total': 0.0, 'count': 0}
+        entry['count'] += row['count']
+        if not np.isnan(value):
+            entry['total'] += float(value)
+    return list(merged.values()), convert.missing({row.get('currency') for row in rows})
+
+
+def build_trends(rows, months):
+    series = {month: {'month': month, 'income': 0, 'expense': 0,
+                      'income_count': 0, 'expense_count': 0,
+                      'categories': {'income': {}, 'expense': {}}}
+              for month in months}
+
+    for row in rows:
+        entry = series.get(row['month'])
+        if entry is None or row['count'] <= 0:
+            continue
+        kind = row['kind']
+        entry[kind] += row['total']
+        entry[kind + '_count'] += row['count']
+        entry['categories'][kind][row['category']] = round(row['total'], 2)
+
+    trends = []
+    for month in months:
+        entry = series[month]
+        entry['income'] = round(entry['income'], 2)
+        entry['expense'] = round(entry['expense'], 2)
+        entry['balance'] = round(entry['income'] - entry['expense'], 2)
+        trends.append(entry)
+    return trends
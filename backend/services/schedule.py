@@ -0,0 +1,95 @@
+import calendar
+from datetime import timedelta
+import numpy as np
+from models.dates import format_date
+
+def add_months(value, months):
+    """Same day `months` later, clamped to the end of shorter months."""
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def occurrence_date(rule, index):
+    # Every occurrence is computed from `start`, so month-end clamping never drifts
+    step = index * rule['interval']
+    if rule['frequency'] == 'daily':
+        return rule['start'] + timedelta(days=step)
+    if rule['frequency'] == 'weekly':
+        return rule['start'] + timedelta(weeks=step)
+    if rule['frequency'] == 'monthly':
+        return add_months(rule['start'], step)
+    return add_months(rule['start'], 12 * step)
+
+
+def next_occurrence(rule, index):
+    """Date of occurrence `index`, or None when the rule has ended before it."""
+    if rule.get('count') is not None and index >= rule['count']:
+        return None
+    value = occurrence_date(rule, index)
+    if rule.get('until') is not None and value > rule['until']:
+        return None
+    return value
+
+
+def occurrences(rule, through, limit):
+    """(index, date) of the rule's unwritten occurrences up to `through`, at most `limit`."""
+    index = rule['next_index']
+    while limit > 0:
+        value = next_occurrence(rule, index)
+        if value is None or value > through:
+            return
+        yield index, value
+        index += 1
+        limit -= 1
+
+
+def upcoming(rules, through, convert, limit=100, per_rule=100):
+    """Occurrences not yet written up to `through`, soonest first. Nothing is stored.
+
+    Totals are in convert.base; amounts in currencies without rates are
+    left out of them and their codes listed under missing_rates.
+    """
+    projected = []
+    dates = []
+    for rule in rules:
+        for _, when in occurrences(rule, through, per_rule):
+            projected.append({
+                'rule_id': str(rule['_id']),
+                'type': rule['type'],
+                'title': rule['title'],
+                'amount': rule['amount'],
+                'currency': rule.get('currency'),
+                'category': rule['category'],
+                'date': format_date(when),
+            })
+            dates.append(when)
+
+    totals = {'income': 0.0, 'expense': 0.0}
+    if projected:
+        values = convert([occurrence['amount'] for occurrence in projected],
+                         [occurrence['currency'] for occurrence in projected], dates)
+        for occurrence, value in zip(projected, values):
+            # Left blank when the currency has no rates
+            occurrence['base_amount'] = None if np.isnan(value) else round(float(value), 2)
+            if occurrence['base_amount'] is not None:
+                totals[occurrence['type']] += occurrence['base_amount']
+    projected.sort(key=lambda occurrence: occurrence['date'])  # YYYY-MM-DD sorts by date
+
+    return {
+        'occurrences': projected[:limit],
+        'total_income': round(totals['income'], 2),
+        'total_expense': round(totals['expense'], 2),
+        'currency': convert.base,
+        'missing_rates': convert.missing({occurrence['currency'] for occurrence in projected}),
+        'count': len(projected),
+    }
+
+
+def serialize_rule(rule):
+    rule['_id'] = str(rule['_id'])
+    for field in ('start', 'until', 'next_date'):
+        rule[field] = format_date(rule.get(field))
+    return rule
@@ -0,0 +1,192 @@
+import re
+from itertools import chain, islice
+from pymongo import InsertOne, ReplaceOne, DeleteOne
+from config import Config
+from models.dates import format_date
+
+SEARCH_TYPES = ('all', 'income', 'expense')
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+# Prefixes are stored up to this length; longer query words match on it and
+# are then ranked on the full word
+MAX_PREFIX = 15
+MAX_WORDS = 64
+MAX_QUERY_WORDS = 8
+# Field weights for (exact word, prefix) matches
+WEIGHTS = {'title': (4.0, 3.0), 'category': (2.0, 1.5), 'description': (1.0, 0.5)}
+
+
+def words(text):
+    return TOKEN_PATTERN.findall(str(text or '').lower())
+
+
+def search_terms(document):
+    """Every prefix of every word in title, category and description."""
+    unique = []
+    seen = set()
+    for field in WEIGHTS:
+        for word in words(document.get(field)):
+            if word not in seen:
+                seen.add(word)
+                unique.append(word)
+    terms = set()
+    for word in unique[:MAX_WORDS]:
+        terms.update(word[:length] for length in range(1, min(len(word), MAX_PREFIX) + 1))
+    return sorted(terms)
+
+
+def search_entry(kind, document):
+    # Results are served from the entry alone, so it carries the listed fields
+    return {
+        '_id': document['_id'],
+        'user_id': document['user_id'],
+        'type': kind,
+        'title': document.get('title'),
+        'amount': document.get('amount'),
+        'category': document.get('category'),
+        'description': document.get('description', ''),
+        'date': document.get('date'),
+        'terms': search_terms(document),
+    }
+
+
+def search_operations(kind, removed=(), added=()):
+    """Index writes mirroring a write on incomes/expenses (see record_changes)."""
+    previous = {document['_id'] for document in removed}
+    current = {document['_id'] for document in added}
+    operations = [DeleteOne({'_id': doc_id}) for doc_id in previous - current]
+    for document in added:
+        entry = search_entry(kind, document)
+        if document['_id'] in previous:
+            operations.append(ReplaceOne({'_id': document['_id']}, entry, upsert=True))
+        else:
+            operations.append(InsertOne(entry))
+    return operations
+
+
+def parse_search_args(args):
+    query = (args.get('q') or '').strip()
+    tokens = words(query)[:MAX_QUERY_WORDS]
+    if not tokens:
+        raise ValueError('q must contain at least one word')
+
+    kind = args.get('type', 'all')
+    if kind not in SEARCH_TYPES:
+        raise ValueError('type must be all, income or expense')
+
+    try:
+        limit = int(args.get('limit', 20))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if limit < 1 or limit > Config.MAX_PAGE_SIZE:
+        raise ValueError('limit must be between 1 and %d' % Config.MAX_PAGE_SIZE)
+    if offset < 0 or offset >= Config.SEARCH_CANDIDATES:
+        raise ValueError('offset must be between 0 and %d' % (Config.SEARCH_CANDIDATES - 1))
+
+    return {'tokens': tokens, 'type': kind, 'limit': limit, 'offset': offset}
+
+
+def build_search_query(user_id, options):
+    query = {'user_id': user_id,
+             'terms': {'$all': sorted({token[:MAX_PREFIX] for token in options['tokens']})}}
+    if options['type'] != 'all':
+        query['type'] = options['type']
+    return query
+
+
+def score(entry, tokens):
+    fields = {field: words(entry.get(field)) for field in WEIGHTS}
+    total = 0.0
+    for token in tokens:
+        best = 0.0
+        for field, (exact, prefix) in WEIGHTS.items():
+            for word in fields[field]:
+                if word == token:
+                    best = max(best, exact)
+                elif word.startswith(token):
+                    best = max(best, prefix)
+        total += best
+    return total
+
+
+def rank(entries, tokens):
+    """Best matches first; entries arrive newest first, which breaks ties."""
+    scored = [(score(entry, tokens), entry) for entry in entries]
+    scored.sort(key=lambda pair: -pair[0])
+    return scored
+
+
+def search(collection, user_id, options):
+    """One page of ranked matches.
+
+    The newest SEARCH_CANDIDATES matches are read from the (user_id, terms,
+    date) index and ranked in memory, which keeps typeahead cheap however
+    many rows a short prefix matches.
+    """
+    cursor = collection.find(build_search_query(user_id, options), {'terms': 0, 'user_id': 0}) \
+        .sort([('date', -1), ('_id', -1)]).limit(Config.SEARCH_CANDIDATES)
+    ranked = rank(list(cursor), options['tokens'])
+
+    start, end = options['offset'], options['offset'] + options['limit']
+    results = []
+    for value, entry in ranked[start:end]:
+        entry['_id'] = str(entry['_id'])
+        entry['date'] = format_date(entry['date'])
+        entry['score'] = value
+        results.append(entry)
+    return {
+        'results': results,
+        'next_offset': end if end < len(ranked) else None,
+        'truncated': len(ranked) == Config.SEARCH_CANDIDATES,
+    }
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def archived_documents(buckets, kind, user_id=None):
+    query = {'kind': kind, 'user_id': user_id} if user_id else {'kind': kind}
+    for bucket in buckets.find(query, {'user_id': 1, 'entries': 1}).batch_size(1):
+        for entry in bucket['entries']:
+            yield {**entry, 'user_id': bucket['user_id']}
+
+
+def reindex(collections, index, user_id=None, batch_size=1000, progress=None, buckets=None):
+    """Rebuild search entries from the transactions, then drop entries whose
+    transaction is gone. Safe while serving: entries are replaced in place.
+
+    With `buckets`, archived transactions are indexed and kept as well.
+    """
+    query = {'user_id': user_id} if user_id else {}
+    indexed = pruned = 0
+    fields = {'user_id': 1, 'title': 1, 'amount': 1, 'category': 1, 'description': 1, 'date': 1}
+    for kind, collection in collections.items():
+        done = 0
+        documents = collection.find(query, fields).batch_size(batch_size)
+        if buckets is not None:
+            documents = chain(documents, archived_documents(buckets, kind, user_id))
+        for batch in batched(documents, batch_size):
+            index.bulk_write([ReplaceOne({'_id': document['_id']}, search_entry(kind, document), upsert=True)
+                              for document in batch], ordered=False)
+            done += len(batch)
+            if progress:
+                progress(kind, done)
+        indexed += done
+
+        entries = index.find({**query, 'type': kind}, {'_id': 1}).batch_size(batch_size)
+        for batch in batched((entry['_id'] for entry in entries), batch_size):
+            alive = {document['_id'] for document in collection.find({'_id': {'$in': batch}}, {'_id': 1})}
+            if buckets is not None and len(alive) < len(batch):
+                missing = [doc_id for doc_id in batch if doc_id not in alive]
+                for bucket in buckets.find({'entries._id': {'$in': missing}}, {'entries._id': 1}):
+                    alive.update(entry['_id'] for entry in bucket['entries'])
+            orphans = [doc_id for doc_id in batch if doc_id not in alive]
+            if orphans:
+                pruned += index.delete_many({'_id': {'$in': orphans}}).deleted_count
+    return indexed, pruned
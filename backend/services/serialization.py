@@ -0,0 +1,70 @@
+from datetime import date, datetime
+import orjson
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+
+def default(value):
+    # orjson handles datetime natively; only BSON types need help
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+
+def dumps(value):
+    """Encode straight to bytes; ObjectIds become strings, datetimes ISO 8601.
+
+    Non-string keys are stringified like the standard library does: user
+    categories key the summary breakdowns and may be numbers or null.
+    """
+    return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _stdlib_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify and flask.json.
+
+    Calls with explicit options (indent, sort_keys...) fall back to the
+    standard library with the same ObjectId/datetime handling.
+    """
+
+    default = staticmethod(_stdlib_default)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def to_columns(docs):
+    """Turn a list of documents into {field: [values...]}, None where a
+    document lacks a field. Repeated keys are sent once per page."""
+    columns = {}
+    count = 0
+    for doc in docs:
+        for field, value in doc.items():
+            column = columns.get(field)
+            if column is None:
+                column = columns[field] = [None] * count
+            column.append(value)
+        count += 1
+        for column in columns.values():
+            if len(column) < count:
+                column.append(None)
+    return columns, count
@@ -0,0 +1,187 @@
+from datetime import datetime
+import numpy as np
+from models.dates import format_date
+
+RECENT_LIMIT = 5
+# Archive buckets carry their totals; only their newest few entries are read
+BUCKET_PROJECTION = {'kind': 1, 'by_category': 1, 'daily': 1, 'entries': {'$slice': RECENT_LIMIT}}
+EMPTY_FACET = {'totals': [], 'by_category': [], 'foreign': [], 'recent': []}
+
+
+def in_base(base):
+    # Rows without a currency are in the user's base currency
+    return {'currency': {'$in': [None, base]}}
+
+
+def summary_pipeline(user_id, base):
+    """Totals, category sums and the most recent entries in a single round trip.
+
+    Amounts in other currencies are summed per (category, currency, day)
+    instead, ready to be converted at each day's rate.
+    """
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$facet': {
+            'totals': [
+                {'$match': in_base(base)},
+                {'$group': {'_id': None, 'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}}
+            ],
+            'by_category': [
+                {'$match': in_base(base)},
+                {'$group': {'_id': '$category', 'total': {'$sum': '$amount'}}}
+            ],
+            'foreign': [
+                {'$match': {'currency': {'$nin': [None, base]}}},
+                {'$group': {
+                    '_id': {'category': '$category', 'currency': '$currency', 'date': '$date'},
+                    'total': {'$sum': '$amount'},
+                    'count': {'$sum': 1}
+                }}
+            ],
+            'recent': [
+                # _id breaks ties like the keyset listing, so equal dates keep one order
+                {'$sort': {'date': -1, '_id': -1}},
+                {'$limit': RECENT_LIMIT}
+            ]
+        }}
+    ]
+
+
+def summarize_collection(collection, user_id, base):
+    result = list(collection.aggregate(summary_pipeline(user_id, base)))
+    return result[0] if result else dict(EMPTY_FACET)
+
+
+def newest(doc):
+    # BSON order: dates sort after legacy string dates
+    return isinstance(doc['date'], datetime), doc['date'], doc['_id']
+
+
+def buckets_by_kind(buckets):
+    grouped = {'income': [], 'expense': []}
+    for bucket in buckets:
+        grouped[bucket['kind']].append(bucket)
+    return grouped
+
+
+def with_archived(facet, buckets, user_id, base):
+    """Fold one kind's archive buckets into its summary facet."""
+    if not buckets:
+        return facet
+    totals = facet['totals'][0] if facet['totals'] else {'total': 0, 'count': 0}
+    categories = {row['_id']: row['total'] for row in facet['by_category']}
+    foreign = list(facet.get('foreign', []))
+    recent = list(facet['recent'])
+    total, count = totals['total'], totals['count']
+    for bucket in buckets:
+        for row in bucket['by_category']:
+            if row.get('currency') in (None, base):
+                total += row['total']
+                count += row['count']
+                categories[row['category']] = categories.get(row['category'], 0) + row['total']
+        foreign.extend({'_id': {'category': row['category'], 'currency': row['currency'], 'date': row['date']},
+                        'total': row['total'], 'count': row['count']}
+                       for row in bucket.get('daily', ()) if row['currency'] != base)
+        recent.extend({**entry, 'user_id': user_id} for entry in bucket['entries'])
+    recent.sort(key=newest, reverse=True)
+    return {
+        'totals': [{'total': total, 'count': count}],
+        'by_category': [{'_id': category, 'total': value} for category, value in categories.items()],
+        'foreign': foreign,
+        'recent': recent[:RECENT_LIMIT]
+    }
+
+
+def converted(facet, convert):
+    """Fold a facet's foreign-currency sums into its totals, in the base currency.
+
+    Every group is converted in one vectorized call; groups in currencies
+    without rates are counted but left out of the amounts, and their codes
+    are listed under 'missing'.
+    """
+    groups = facet.get('foreign', [])
+    totals = facet['totals'][0] if facet['totals'] else {'total': 0, 'count': 0}
+    total, count = totals['total'], totals['count']
+    categories = {row['_id']: row['total'] for row in facet['by_category']}
+    values = convert([group['total'] for group in groups], [group['_id']['currency'] for group in groups],
+                     [group['_id']['date'] for group in groups])
+    for group, value in zip(groups, values):
+        count += group['count']
+        if np.isnan(value):
+            continue
+        total += value
+        category = group['_id']['category']
+        categories[category] = categories.get(category, 0) + value
+
+    recent = facet['recent']
+    amounts = convert([row['amount'] for row in recent], [row.get('currency') for row in recent],
+                      [row['date'] for row in recent])
+    for row, value in zip(recent, amounts):
+        row['base_amount'] = None if np.isnan(value) else round(float(value), 2)
+
+    return {
+        'totals': [{'total': float(total), 'count': count}],
+        'by_category': [{'_id': category, 'total': float(value)} for category, value in categories.items()],
+        'recent': recent,
+        'missing': convert.missing({group['_id']['currency'] for group in groups})
+    }
+
+
+def shape_summary(income_facet, expense_facet, base):
+    income_totals = income_facet['totals'][0] if income_facet['totals'] else {'total': 0, 'count': 0}
+    expense_totals = expense_facet['totals'][0] if expense_facet['totals'] else {'total': 0, 'count': 0}
+
+    recent_incomes = income_facet['recent']
+    recent_expenses = expense_facet['recent']
+
+    # Convert ObjectId to string
+    for income in recent_incomes:
+        income['_id'] = str(income['_id'])
+        income['date'] = format_date(income['date'])
+        income['type'] = 'income'
+
+    for expense in recent_expenses:
+        expense['_id'] = str(expense['_id'])
+        expense['date'] = format_date(expense['date'])
+        expense['type'] = 'expense'
+
+    return {
+        'currency': base,
+        # Currencies whose amounts are left out of the totals for lack of rates
+        'missing_rates': sorted(set(income_facet.get('missing', [])) | set(expense_facet.get('missing', []))),
+        'summary': {
+            'total_income': income_totals['total'],
+            'total_expense': expense_totals['total'],
+            'balance': income_totals['total'] - expense_totals['total'],
+            'income_count': income_totals['count'],
+            'expense_count': expense_totals['count']
+        },
+        'recent_transactions': {
+            'incomes': recent_incomes,
+            'expenses': recent_expenses
+        },
+        'category_breakdown': {
+            'income': {row['_id']: row['total'] for row in income_facet['by_category']},
+            'expense': {row['_id']: row['total'] for row in expense_facet['by_category']}
+        }
+    }
+
+
+def assemble_summary(income_facet, expense_facet, buckets, user_id, convert):
+    """The dashboard summary in convert.base from both collections' facets and
+    the user's archive buckets, however they were read."""
+    base = convert.base
+    archived = buckets_by_kind(buckets)
+    return shape_summary(
+        converted(with_archived(income_facet, archived['income'], user_id, base), convert),
+        converted(with_archived(expense_facet, archived['expense'], user_id, base), convert),
+        base
+    )
+
+
+def build_summary(user_id, incomes, expenses, buckets, convert):
+    """The dashboard summary in convert.base, the user's base currency."""
+    base = convert.base
+    return assemble_summary(summarize_collection(incomes, user_id, base),
+                            summarize_collection(expenses, user_id, base),
+                            buckets.find({'user_id': user_id}, BUCKET_PROJECTION), user_id, convert)
@@ -0,0 +1,161 @@
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+from pymongo import ReturnDocument
+from database import (incomes_collection, expenses_collection, tombstones_collection,
+                      sync_counters_collection)
+from services.listing import serialize_document
+from config import Config
+
+COLLECTIONS = {'income': incomes_collection, 'expense': expenses_collection}
+
+
+class TokenExpired(Exception):
+    """The client's token predates compacted tombstones; it must resync."""
+
+
+# Write side: every income/expense write takes the next number from a
+# per-user counter and stamps it as `seq` with `updated_at`; deletes leave a
+# tombstone carrying its own `seq`.
+
+def allocation(count):
+    """The counter update reserving `count` sequence numbers."""
+    return {'$inc': {'seq': count}}
+
+
+def first_allocated(counter, count):
+    # The counter is read back after the increment
+    return counter['seq'] - count + 1
+
+
+def allocate(user_id, count=1, session=None):
+    """Reserve `count` consecutive sequence numbers and return the first."""
+    counter = sync_counters_collection.find_one_and_update(
+        {'_id': user_id}, allocation(count),
+        upsert=True, return_document=ReturnDocument.AFTER, session=session
+    )
+    return first_allocated(counter, count)
+
+
+def apply_stamps(documents, first):
+    now = datetime.utcnow()
+    for offset, document in enumerate(documents):
+        document['seq'] = first + offset
+        document['updated_at'] = now
+    return documents
+
+
+def stamp(user_id, documents, session=None):
+    """Stamp new documents (or $set dicts) in place before they are written."""
+    if documents:
+        apply_stamps(documents, allocate(user_id, len(documents), session))
+    return documents
+
+
+def tombstone_documents(kind, user_id, ids, first):
+    return apply_stamps([{'user_id': user_id, 'type': kind, 'doc_id': doc_id} for doc_id in ids], first)
+
+
+def record_deletes(kind, user_id, ids, session=None):
+    if ids:
+        first = allocate(user_id, len(ids), session)
+        tombstones_collection.insert_many(tombstone_documents(kind, user_id, ids, first), session=session)
+
+
+# Read side
+
+def parse_token(value):
+    try:
+        token = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('since must be a sync token')
+    if token < 0:
+        raise ValueError('since must be a sync token')
+    return token
+
+
+def settle_cutoff():
+    # Sequence numbers are reserved just before the write, so a slow write can
+    # land after a faster one with a higher number. Tokens never move past rows
+    # younger than this, which re-sends them once instead of skipping the slow one.
+    return datetime.utcnow() - timedelta(seconds=Config.SYNC_SETTLE_SECONDS)
+
+
+def compacted_through(user_id):
+    counter = sync_counters_collection.find_one({'_id': user_id}, {'compacted_through': 1})
+    return (counter or {}).get('compacted_through', 0)
+
+
+def current_token(user_id):
+    """A starting token: the newest settled sequence number across all sources."""
+    cutoff = settle_cutoff()
+    token = compacted_through(user_id)
+    for collection in (*COLLECTIONS.values(), tombstones_collection):
+        # Walks the (user_id, seq) index down from the newest row
+        row = collection.find_one(
+            {'user_id': user_id, 'seq': {'$gt': token}, 'updated_at': {'$lte': cutoff}},
+            {'seq': 1}, sort=[('seq', -1)]
+        )
+        if row:
+            token = row['seq']
+    return token
+
+
+def tagged(cursor, kind):
+    for doc in cursor:
+        doc['type'] = kind
+        yield doc
+
+
+def changed_rows(user_id, since, limit):
+    """Rows and tombstones with seq > since in sequence order, at most limit + 1."""
+    query = {'user_id': user_id, 'seq': {'$gt': since}}
+    streams = [tagged(collection.find(query).sort('seq', 1).limit(limit + 1), kind)
+               for kind, collection in COLLECTIONS.items()]
+    streams.append(tombstones_collection.find(query).sort('seq', 1).limit(limit + 1))
+    return list(islice(heapq.merge(*streams, key=lambda row: row['seq']), limit + 1))
+
+
+def build_sync(rows, since, limit, cutoff):
+    has_more = len(rows) > limit
+    token = since
+    settled = True
+    changes, deleted = [], []
+    for row in rows[:limit]:
+        settled = settled and row['updated_at'] <= cutoff
+        if settled:
+            token = row['seq']
+        if 'doc_id' in row:
+            deleted.append({'id': str(row['doc_id']), 'type': row['type']})
+        else:
+            changes.append(serialize_document(row))
+    # Rows past an unsettled one are all newer still and come with the next sync
+    return {'changes': changes, 'deleted': deleted, 'token': str(token),
+            'has_more': has_more and settled}
+
+
+def sync_changes(user_id, since, limit):
+    """Changes and deletions since `since`, oldest first, plus the next token."""
+    if since < compacted_through(user_id):
+        raise TokenExpired()
+    cutoff = settle_cutoff()
+    return build_sync(changed_rows(user_id, since, limit), since, limit, cutoff)
+
+
+def compact_tombstones(days):
+    """Delete tombstones older than `days`, remembering per user how far
+    compaction reached so older tokens are refused instead of missing deletes."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    horizons = tombstones_collection.aggregate([
+        {'$match': {'updated_at': {'$lt': cutoff}}},
+        {'$group': {'_id': '$user_id', 'seq': {'$max': '$seq'}}}
+    ])
+    removed = 0
+    for horizon in horizons:
+        sync_counters_collection.update_one(
+            {'_id': horizon['_id']}, {'$max': {'compacted_through': horizon['seq']}}, upsert=True
+        )
+        removed += tombstones_collection.delete_many(
+            {'user_id': horizon['_id'], 'seq': {'$lte': horizon['seq']}}
+        ).deleted_count
+    return removed
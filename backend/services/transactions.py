@@ -0,0 +1,47 @@
+from models.income import Income
+from models.expense import Expense
+from models.dates import parse_date
+from models.currency import parse_currency
+
+MODELS = {'income': Income, 'expense': Expense}
+UPDATABLE_FIELDS = ('title', 'amount', 'currency', 'category', 'date', 'description')
+
+# Validation shared by every income/expense write path (the WSGI routes, the
+# ASGI twin and batches), so they only differ in how they talk to MongoDB.
+
+
+def build_create(kind, user_id, data):
+    """The document for a new transaction; raises ValueError on bad input."""
+    if not isinstance(data, dict):
+        raise ValueError('data must be an object')
+    model = MODELS[kind]
+    if not all(key in data for key in model.REQUIRED_FIELDS):
+        raise ValueError('Missing required fields')
+    return model(
+        user_id=user_id,
+        title=data['title'],
+        amount=data['amount'],
+        category=data['category'],
+        date=data['date'],
+        description=data.get('description', ''),
+        currency=data.get('currency')
+    ).to_dict()
+
+
+def build_update(data):
+    """The $set document for an update of the given fields, coerced like creates."""
+    if not isinstance(data, dict):
+        raise ValueError('data must be an object')
+    update = {}
+    for field in UPDATABLE_FIELDS:
+        if field in data:
+            update[field] = data[field]
+    if 'amount' in update:
+        update['amount'] = float(update['amount'])
+    if 'currency' in update:
+        update['currency'] = parse_currency(update['currency'])
+    if 'date' in update:
+        update['date'] = parse_date(update['date'])
+    if not update:
+        raise ValueError('No fields to update')
+    return update
@@ -0,0 +1,109 @@
+import unittest
+from services.cache import RedisCache, SummaryCache
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the slice of the redis-py API RedisCache uses.
+
+    Time is driven by the test through `now`, so expiry needs no sleeping.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.data = {}
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.now:
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        self.data[key] = (value, self.now + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+class FakeVersions:
+    """The two summary_versions calls SummaryCache makes."""
+
+    def __init__(self):
+        self.documents = {}
+
+    def find_one(self, query, projection=None):
+        return self.documents.get(query['_id'])
+
+    def update_one(self, query, update, upsert=False, session=None):
+        document = self.documents.setdefault(query['_id'], {'_id': query['_id'], 'version': 0})
+        document['version'] += update['$inc']['version']
+
+
+class RedisCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeRedis()
+        self.cache = RedisCache(self.client, ttl=300, prefix='test:')
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', b'body')
+        self.assertEqual(self.cache.get('a'), b'body')
+        self.assertIn('test:a', self.client.data)
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set('a', b'body')
+        self.client.now += 299
+        self.assertEqual(self.cache.get('a'), b'body')
+        self.client.now += 1
+        self.assertIsNone(self.cache.get('a'))
+
+
+class SummaryCacheOnRedisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeRedis()
+        self.versions = FakeVersions()
+        self.cache = SummaryCache(RedisCache(self.client, ttl=300), versions=self.versions)
+
+    def test_round_trip(self):
+        version = self.cache.version('u1')
+        self.assertEqual(version, 0)
+        self.assertIsNone(self.cache.get('u1', version))
+        self.cache.set('u1', version, '"etag"', b'{"total": 1}')
+        self.assertEqual(self.cache.get('u1', version), ('"etag"', b'{"total": 1}'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_variants_are_kept_apart(self):
+        self.cache.set('u1', 0, '"a"', b'a', variant='json')
+        self.assertIsNone(self.cache.get('u1', 0, variant='csv'))
+        self.assertEqual(self.cache.get('u1', 0, variant='json'), ('"a"', b'a'))
+
+    def test_bump_hides_older_entries(self):
+        self.cache.set('u1', self.cache.version('u1'), '"old"', b'old')
+        self.cache.bump('u1')
+        version = self.cache.version('u1')
+        self.assertEqual(version, 1)
+        self.assertIsNone(self.cache.get('u1', version))
+        # Other users keep their entries
+        self.cache.set('u2', self.cache.version('u2'), '"x"', b'x')
+        self.cache.bump('u1')
+        self.assertEqual(self.cache.get('u2', 0), ('"x"', b'x'))
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set('u1', 0, '"a"', b'a')
+        self.client.now += 300
+        self.assertIsNone(self.cache.get('u1', 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
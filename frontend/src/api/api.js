@@ -34,17 +34,44 @@ export const changePassword = (data) => api.put('/auth/change-password', data);
 
 // Income APIs
 export const createIncome = (data) => api.post('/income/', data);
-export const getIncomes = () => api.get('/income/');
+export const getIncomes = (params) => api.get('/income/', { params });
 export const updateIncome = (id, data) => api.put(`/income/${id}`, data);
 export const deleteIncome = (id) => api.delete(`/income/${id}`);
 
 // Expense APIs
 export const createExpense = (data) => api.post('/expense/', data);
-export const getExpenses = () => api.get('/expense/');
+export const getExpenses = (params) => api.get('/expense/', { params });
 export const updateExpense = (id, data) => api.put(`/expense/${id}`, data);
 export const deleteExpense = (id) => api.delete(`/expense/${id}`);
 
+// Incomes and expenses merged newest first; pass next_cursor as `after` for the next page
+export const getTransactions = (params) => api.get('/transactions', { params });
+
+// Ranked prefix search for typeahead; pass next_offset as `offset` for more
+export const searchTransactions = (q, params) => api.get('/transactions/search', { params: { q, ...params } });
+
+// Delta sync: omit `since` to get a starting token
+export const getSync = (since) => api.get('/sync', { params: since ? { since } : {} });
+
+// Batched creates/updates/deletes across incomes and expenses
+export const batchTransactions = (operations, transaction = false) =>
+  api.post('/transactions/batch', { operations, transaction });
+
 // Dashboard APIs
 export const getDashboardSummary = () => api.get('/dashboard/summary');
+export const getTrends = (months) => api.get('/dashboard/trends', { params: { months } });
+// Occurrences recurring rules will produce in the next `days` days (not stored yet)
+export const getUpcoming = (days) => api.get('/dashboard/upcoming', { params: { days } });
+
+// Budget APIs: utilization per category for a 'YYYY-MM' month (default current)
+export const getBudgets = (month) => api.get('/budgets', { params: month ? { month } : {} });
+export const setBudget = (category, amount) => api.put(`/budgets/${encodeURIComponent(category)}`, { amount });
+export const deleteBudget = (category) => api.delete(`/budgets/${encodeURIComponent(category)}`);
+
+// Recurring rule APIs
+export const getRecurringRules = () => api.get('/recurring');
+export const createRecurringRule = (data) => api.post('/recurring', data);
+export const updateRecurringRule = (id, data) => api.put(`/recurring/${id}`, data);
+export const deleteRecurringRule = (id) => api.delete(`/recurring/${id}`);
 
 export default api;
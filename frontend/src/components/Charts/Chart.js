@@ -18,7 +18,7 @@ import {
 } from 'recharts';
 import './Chart.css';
 
-const Chart = ({ summary, incomes = [], expenses = [] }) => {
+const Chart = ({ summary, trends = [] }) => {
   const COLORS = {
     income: ['#11998e', '#38ef7d', '#20bf6b', '#26de81', '#2bcbba'],
     expense: ['#eb3349', '#f45c43', '#fc5c65', '#fd79a8', '#fdcb6e'],
@@ -48,34 +48,19 @@ const Chart = ({ summary, incomes = [], expenses = [] }) => {
     },
   ];
 
-  // Prepare trend data (last 6 months or available data)
+  // Prepare trend data from the server-side monthly rollups (last 6 months)
   const prepareTrendData = () => {
-    const allTransactions = [
-      ...incomes.map(i => ({ ...i, type: 'income' })),
-      ...expenses.map(e => ({ ...e, type: 'expense' }))
-    ];
-
-    // Group by month
-    const monthlyData = {};
-    
-    allTransactions.forEach(transaction => {
-      const date = new Date(transaction.date);
-      const monthYear = `${date.toLocaleString('default', { month: 'short' })} ${date.getFullYear()}`;
-      
-      if (!monthlyData[monthYear]) {
-        monthlyData[monthYear] = { month: monthYear, Income: 0, Expense: 0 };
-      }
-      
-      if (transaction.type === 'income') {
-        monthlyData[monthYear].Income += transaction.amount;
-      } else {
-        monthlyData[monthYear].Expense += transaction.amount;
-      }
-    });
-
-    return Object.values(monthlyData)
-      .sort((a, b) => new Date(a.month) - new Date(b.month))
-      .slice(-6); // Last 6 months
+    return trends
+      .filter(entry => entry.income_count > 0 || entry.expense_count > 0)
+      .map(entry => {
+        const [year, month] = entry.month.split('-').map(Number);
+        const date = new Date(year, month - 1, 1);
+        return {
+          month: `${date.toLocaleString('default', { month: 'short' })} ${year}`,
+          Income: entry.income,
+          Expense: entry.expense,
+        };
+      });
   };
 
   const trendData = prepareTrendData();
@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import { deleteIncome, deleteExpense } from '../../api/api';
 import './TransactionList.css';
 
-const TransactionList = ({ incomes, expenses, onRefresh }) => {
+const TransactionList = ({ transactions, hasMore, onLoadMore, onRefresh }) => {
   const [activeTab, setActiveTab] = useState('all');
   const [loading, setLoading] = useState(null);
 
@@ -59,11 +59,8 @@ const TransactionList = ({ incomes, expenses, onRefresh }) => {
     return emojiMap[type][category] || '💵';
   };
 
-  // Combine and sort transactions
-  const allTransactions = [
-    ...incomes.map((item) => ({ ...item, type: 'income' })),
-    ...expenses.map((item) => ({ ...item, type: 'expense' })),
-  ].sort((a, b) => new Date(b.date) - new Date(a.date));
+  // Already merged and sorted newest first by the server
+  const allTransactions = transactions;
 
   const getFilteredTransactions = () => {
     if (activeTab === 'income') {
@@ -142,6 +139,12 @@ const TransactionList = ({ incomes, expenses, onRefresh }) => {
           ))}
         </div>
       )}
+
+      {hasMore && (
+        <button onClick={onLoadMore} className="btn-load-more">
+          Load more
+        </button>
+      )}
     </div>
   );
 };
@@ -1,17 +1,31 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../../context/AuthContext';
-import { getDashboardSummary, getIncomes, getExpenses } from '../../api/api';
+import { getDashboardSummary, getTrends, getTransactions, getSync, getUpcoming } from '../../api/api';
 import IncomeForm from '../../components/Forms/IncomeForm';
 import ExpenseForm from '../../components/Forms/ExpenseForm';
 import TransactionList from '../../components/Transactions/TransactionList';
 import Chart from '../../components/Charts/Chart';
 import './Dashboard.css';
 
+const PAGE_SIZE = 50;
+const UPCOMING_DAYS = 30;
+
+const byNewest = (a, b) => new Date(b.date) - new Date(a.date) || (a._id < b._id ? 1 : -1);
+
+// Fold a sync page into the loaded rows: upsert changed rows, drop deleted ones
+const applySync = (rows, { changes, deleted }) => {
+  const removed = new Set([...deleted.map((d) => d.id), ...changes.map((c) => c._id)]);
+  return [...rows.filter((row) => !removed.has(row._id)), ...changes].sort(byNewest);
+};
+
 const Dashboard = () => {
   const [summary, setSummary] = useState(null);
-  const [incomes, setIncomes] = useState([]);
-  const [expenses, setExpenses] = useState([]);
+  const [trends, setTrends] = useState([]);
+  const [upcoming, setUpcoming] = useState(null);
+  const [transactions, setTransactions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [syncToken, setSyncToken] = useState(null);
   const [showIncomeForm, setShowIncomeForm] = useState(false);
   const [showExpenseForm, setShowExpenseForm] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -24,15 +38,21 @@ const Dashboard = () => {
 
   const fetchData = async () => {
     try {
-      const [summaryRes, incomesRes, expensesRes] = await Promise.all([
+      // Take the sync position before reading, so nothing written meanwhile is missed
+      const syncRes = await getSync();
+      const [summaryRes, trendsRes, transactionsRes, upcomingRes] = await Promise.all([
         getDashboardSummary(),
-        getIncomes(),
-        getExpenses(),
+        getTrends(6),
+        getTransactions({ limit: PAGE_SIZE }),
+        getUpcoming(UPCOMING_DAYS),
       ]);
       
       setSummary(summaryRes.data);
-      setIncomes(incomesRes.data.incomes);
-      setExpenses(expensesRes.data.expenses);
+      setTrends(trendsRes.data.trends);
+      setUpcoming(upcomingRes.data);
+      setTransactions(transactionsRes.data.transactions);
+      setNextCursor(transactionsRes.data.next_cursor);
+      setSyncToken(syncRes.data.token);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -40,6 +60,42 @@ const Dashboard = () => {
     }
   };
 
+  // After a local change, fetch only what changed since the last sync
+  const refreshData = async () => {
+    if (!syncToken) {
+      return fetchData();
+    }
+    try {
+      const [summaryRes, trendsRes] = await Promise.all([getDashboardSummary(), getTrends(6)]);
+      setSummary(summaryRes.data);
+      setTrends(trendsRes.data.trends);
+
+      let token = syncToken;
+      let page;
+      do {
+        page = (await getSync(token)).data;
+        setTransactions((current) => applySync(current, page));
+        token = page.token;
+      } while (page.has_more);
+      setSyncToken(token);
+    } catch (error) {
+      if (error.response?.status === 410) {
+        return fetchData();
+      }
+      console.error('Error syncing data:', error);
+    }
+  };
+
+  const loadMoreTransactions = async () => {
+    try {
+      const response = await getTransactions({ limit: PAGE_SIZE, after: nextCursor });
+      setTransactions((current) => [...current, ...response.data.transactions]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Error fetching transactions:', error);
+    }
+  };
+
   const handleLogout = () => {
     logoutUser();
     navigate('/login');
@@ -47,12 +103,12 @@ const Dashboard = () => {
 
   const handleIncomeAdded = () => {
     setShowIncomeForm(false);
-    fetchData();
+    refreshData();
   };
 
   const handleExpenseAdded = () => {
     setShowExpenseForm(false);
-    fetchData();
+    refreshData();
   };
 
   if (loading) {
@@ -134,21 +190,32 @@ const Dashboard = () => {
               <span className="count">Net amount</span>
             </div>
           </div>
+
+          <div className="card card-upcoming">
+            <div className="card-content">
+              <h3>Next {UPCOMING_DAYS} Days</h3>
+              <p className="amount">
+                Rs. {((upcoming?.total_income || 0) - (upcoming?.total_expense || 0)).toFixed(2)}
+              </p>
+              <span className="count">{upcoming?.count || 0} recurring transactions due</span>
+            </div>
+          </div>
         </div>
 
         {/* Main Content Grid */}
         <div className="dashboard-grid">
           {/* Left Column - Charts */}
           <div className="charts-section">
-            <Chart summary={summary} incomes={incomes} expenses={expenses} />
+            <Chart summary={summary} trends={trends} />
           </div>
 
           {/* Right Sidebar - Transactions */}
           <div className="transactions-sidebar">
             <TransactionList
-              incomes={incomes}
-              expenses={expenses}
-              onRefresh={fetchData}
+              transactions={transactions}
+              hasMore={Boolean(nextCursor)}
+              onLoadMore={loadMoreTransactions}
+              onRefresh={refreshData}
             />
           </div>
         </div>
@@ -82,6 +82,10 @@ const Profile = () => {
       const response = await updateProfile(profileData);
       setMessage(response.data.message);
       setUser(response.data.user);
+      // The new token carries the updated name and picture
+      if (response.data.token) {
+        localStorage.setItem('token', response.data.token);
+      }
       
       setTimeout(() => {
         setMessage('');